@@ -0,0 +1,166 @@
+"""
+Single-flight request coalescing for expensive per-user reads.
+
+Concurrent identical requests (same user, same URL, same data version) share one
+computation: the first caller runs the view and the others wait for its result.
+Nothing is cached past the in-flight computation except, with the cross-process
+backend, a short-lived published result for followers in other workers.
+
+The data version is a per-user counter in the default cache, bumped after every
+committed write that touches the user's transactions (see core.signals). Writes
+that bypass model signals (bulk_create, update) must call bump_data_version().
+With several worker processes, configure a shared cache so they see the same
+versions and locks.
+"""
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from . import metrics
+
+DATA_VERSION_KEY = 'core:data_version:{user_id}'
+
+
+def get_data_version(user_id):
+    key = DATA_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed with the clock so a version evicted from the cache never comes back lower
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(user_ids):
+    """Invalidate in-flight and published results for these users"""
+    for user_id in set(user_ids):
+        key = DATA_VERSION_KEY.format(user_id=user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution, within this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        """Return (result, shared): shared is True when another caller's execution was reused"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class CacheSingleFlight:
+    """
+    Cross-process single-flight on top of the default cache.
+
+    The caller that wins `cache.add()` on the lock key computes and publishes the
+    result for `result_ttl` seconds; the others poll for it. If the leader dies or
+    takes longer than `timeout`, waiters compute the result themselves.
+    """
+
+    poll_interval = 0.02
+
+    def __init__(self, timeout, result_ttl):
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+
+    def do(self, key, function, publish=lambda result: True):
+        lock_key = f'{key}:lock'
+        result_key = f'{key}:result'
+        deadline = time.monotonic() + self.timeout
+        while True:
+            result = cache.get(result_key)
+            if result is not None:
+                return result, True
+            if cache.add(lock_key, 1, timeout=self.timeout):
+                try:
+                    result = function()
+                    if publish(result):
+                        cache.set(result_key, result, timeout=self.result_ttl)
+                    return result, False
+                finally:
+                    cache.delete(lock_key)
+            if time.monotonic() >= deadline:
+                return function(), False
+            time.sleep(self.poll_interval)
+
+
+local_flight = SingleFlight()
+
+
+def coalescing_key(request):
+    user_id = request.user.pk
+    path = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    return f'core:coalesce:{user_id}:{path}:{get_data_version(user_id)}'
+
+
+def coalesced(view_method):
+    """
+    Coalesce concurrent calls of an APIView GET handler whose response depends only
+    on the authenticated user, the URL and the user's data.
+
+    Waiters get a fresh Response built from the leader's data and status code.
+    Enabled by REQUEST_COALESCING_ENABLED; REQUEST_COALESCING_BACKEND = "cache"
+    extends it across processes through the default cache.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not settings.REQUEST_COALESCING_ENABLED or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+
+        def compute():
+            response = view_method(self, request, *args, **kwargs)
+            return response.data, response.status_code
+
+        key = coalescing_key(request)
+        if settings.REQUEST_COALESCING_BACKEND == 'cache':
+            flight = CacheSingleFlight(settings.REQUEST_COALESCING_TIMEOUT, settings.REQUEST_COALESCING_RESULT_TTL)
+            # Only successful results are published to other processes
+            run = lambda: flight.do(key, compute, publish=lambda result: result[1] == 200)
+        else:
+            run = lambda: (compute(), False)
+        # Threads of this process share one execution (or one cache poller) per key
+        ((data, status_code), shared_across_processes), shared = local_flight.do(key, run)
+
+        view = request.resolver_match.url_name if getattr(request, 'resolver_match', None) else 'unmatched'
+        metrics.coalesced_requests.inc(view, 'shared' if shared or shared_across_processes else 'computed')
+        return Response(data, status=status_code)
+
+    return wrapper
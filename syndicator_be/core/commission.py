@@ -0,0 +1,131 @@
+"""
+Commission arithmetic for splitwise entries.
+
+interest_after_commission() and commission_deducted() work on a single entry and
+are shared by the Splitwise model methods; commission_columns() is the same
+arithmetic over whole columns of entries with NumPy, for the listing and
+reporting code. All three produce the exact same numbers (including int 0 vs
+float results once converted with CommissionColumns.tolist()).
+commission_expressions() states the rules as SQL for database aggregates.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+
+def interest_after_commission(principal_amount, interest_amount, commission_flag, commission_rate, is_risk_taker):
+    """Interest a split earns once the risk taker's commission is taken out"""
+    if not commission_flag:
+        return principal_amount * interest_amount / 100
+
+    # If this entry is for the risk taker, they don't pay commission to themselves
+    if is_risk_taker:
+        return principal_amount * interest_amount / 100
+
+    # Calculate actual interest amount for this syndicator
+    actual_interest_amount = principal_amount * interest_amount / 100
+    commission_amount = (commission_rate / 100) * actual_interest_amount
+    return max(0, actual_interest_amount - commission_amount)
+
+
+def commission_deducted(principal_amount, interest_amount, commission_flag, commission_rate, is_risk_taker):
+    """Commission the risk taker takes out of a split's interest"""
+    if not commission_flag:
+        return 0
+
+    # Risk taker doesn't pay commission to themselves
+    if is_risk_taker:
+        return 0
+
+    actual_interest_amount = principal_amount * interest_amount / 100
+    commission_amount = (commission_rate / 100) * actual_interest_amount
+    return commission_amount
+
+
+@dataclass(frozen=True)
+class CommissionColumns:
+    interest_after_commission: np.ndarray
+    commission_deducted: np.ndarray
+    # Entries the commission applies to (flag set and not the risk taker's own split)
+    pays_commission: np.ndarray
+    # Entries whose interest after commission was clamped to 0
+    clamped: np.ndarray
+
+    def __len__(self):
+        return len(self.commission_deducted)
+
+    def tolist(self):
+        """
+        (interest_after_commission, commission_deducted) as (nested) Python lists, with
+        int 0 wherever the per-entry functions return int 0, so rendered output matches
+        """
+        after = self.interest_after_commission.astype(object)
+        after[self.clamped] = 0
+        deducted = self.commission_deducted.astype(object)
+        deducted[~self.pays_commission] = 0
+        return after.tolist(), deducted.tolist()
+
+
+def commission_columns(principal_amount, interest_amount, commission_flag, commission_rate, is_risk_taker):
+    """
+    interest_after_commission() and commission_deducted() for many entries at once.
+
+    Arguments are equal-length sequences or arrays (scalars broadcast), one item per
+    entry. The operations run in the same order as the per-entry functions, so each
+    float64 result is bit-for-bit the value they return.
+    """
+    principal_amount = np.asarray(principal_amount, dtype=np.float64)
+    interest_amount = np.asarray(interest_amount, dtype=np.float64)
+    commission_rate = np.asarray(commission_rate, dtype=np.float64)
+    pays_commission = np.asarray(commission_flag, dtype=bool) & ~np.asarray(is_risk_taker, dtype=bool)
+    pays_commission, principal_amount, interest_amount, commission_rate = np.broadcast_arrays(
+        pays_commission, principal_amount, interest_amount, commission_rate
+    )
+
+    actual_interest_amount = principal_amount * interest_amount / 100
+    commission_amount = (commission_rate / 100) * actual_interest_amount
+    remaining = actual_interest_amount - commission_amount
+    clamped = pays_commission & ~(remaining > 0)
+    return CommissionColumns(
+        interest_after_commission=np.where(
+            pays_commission, np.where(clamped, 0.0, remaining), actual_interest_amount
+        ),
+        commission_deducted=np.where(pays_commission, commission_amount, 0.0),
+        pays_commission=pays_commission,
+        clamped=clamped,
+    )
+
+
+def commission_scenarios(principal_amount, interest_amount, is_risk_taker, commission_rates):
+    """
+    The splits of one transaction under each of `commission_rates`, in one pass:
+    CommissionColumns of shape (len(splits), len(commission_rates)). A rate of 0 is
+    evaluated as commission turned off, like a transaction without risk_taker_flag.
+    """
+    commission_rates = np.asarray(commission_rates, dtype=np.float64).reshape(1, -1)
+    return commission_columns(
+        np.asarray(principal_amount, dtype=np.float64).reshape(-1, 1),
+        np.asarray(interest_amount, dtype=np.float64).reshape(-1, 1),
+        commission_rates > 0,
+        commission_rates,
+        np.asarray(is_risk_taker, dtype=bool).reshape(-1, 1),
+    )
+
+
+def commission_expressions():
+    """
+    (interest, commission_deducted, interest_after_commission) of a Splitwise row as
+    database expressions, for aggregating commission in SQL
+    """
+    interest = F('principal_amount') * F('interest_amount') / Value(100.0)
+    pays_commission = Q(transaction_id__risk_taker_flag=True) & ~Q(syndicator_id=F('transaction_id__risk_taker_id'))
+    commission_amount = F('transaction_id__risk_taker_commission') / Value(100.0) * interest
+    commission = Case(When(pays_commission, then=commission_amount), default=Value(0.0), output_field=FloatField())
+    after_commission = Case(
+        When(pays_commission, then=Greatest(interest - commission_amount, Value(0.0))),
+        default=interest,
+        output_field=FloatField()
+    )
+    return interest, commission, after_commission
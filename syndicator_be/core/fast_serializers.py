@@ -0,0 +1,190 @@
+"""
+values()-based serialization for the hot read endpoints.
+
+PortfolioReader builds exactly what PortfolioSerializer(many=True).data builds
+(nested SplitwiseSerializer entries included), but from values_list() tuples
+instead of model instances and per-row DRF field objects, with the commission
+figures of every split computed in one vectorized pass. The serializers stay the reference
+implementation: keep this module in step with them, the parity tests in
+core/tests.py compare rendered output byte for byte.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from .commission import commission_columns
+from .models import Splitwise
+from .serializers import PortfolioSerializer
+
+# DRF's own field for dates so DATE_FORMAT handling matches
+_date_field = serializers.DateField()
+
+
+def _identity(value):
+    return value
+
+
+# Conversion marker for datetime columns: their DRF field depends on the timezone
+# active for the request, so serialize() builds it per call (see datetime_field())
+FORMAT_DATETIME = object()
+
+
+def datetime_field():
+    """
+    DRF DateTimeField pinned to the active timezone, so DATETIME_FORMAT and timezone
+    handling match the serializers without looking the timezone up for every value.
+    """
+    return serializers.DateTimeField(default_timezone=timezone.get_current_timezone() if settings.USE_TZ else None)
+
+
+# Output field -> (values() column, conversion the equivalent DRF field applies).
+# PrimaryKeyRelatedField and JSONField hand the raw value to the renderer.
+TRANSACTION_COLUMNS = {
+    'transaction_id': ('transaction_id', str),
+    'risk_taker_id': ('risk_taker_id', _identity),
+    'risk_taker_username': ('risk_taker_id__username', str),
+    'risk_taker_name': ('risk_taker_id__name', str),
+    'syndicators': ('syndicators', _identity),
+    'total_principal_amount': ('total_principal_amount', float),
+    'total_interest': ('total_interest', float),
+    'commission_flag': ('risk_taker_flag', bool),
+    'commission_rate': ('risk_taker_commission', float),
+    'created_at': ('created_at', FORMAT_DATETIME),
+    'start_date': ('start_date', _date_field.to_representation),
+    'end_date': ('end_date', _date_field.to_representation),
+    'lender_name': ('lender_name', str),
+    'month_period_of_loan': ('month_period_of_loan', int),
+}
+
+# Transaction columns the commission figures read
+COMMISSION_COLUMNS = ('risk_taker_flag', 'risk_taker_commission', 'risk_taker_id')
+
+SPLIT_COLUMNS = (
+    'transaction_id', 'syndicator_id', 'principal_amount', 'interest_amount',
+    'splitwise_id', 'syndicator_id__username', 'syndicator_id__name', 'syndicator_id__email', 'created_at',
+)
+
+
+def _str_or_none(value):
+    return None if value is None else str(value)
+
+
+class PortfolioReader:
+    """
+    Fast equivalent of PortfolioSerializer for read-only listings.
+
+    `fetch()` turns a Transactions queryset into row tuples whose first item is the
+    transaction pk; `serialize()` loads the splits of those rows in one query and
+    returns the same list of dicts the serializer would. `fields` restricts the
+    output like PortfolioSerializer's `fields` argument.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = [
+            name for name in PortfolioSerializer.Meta.fields
+            if fields is None or name in fields
+        ]
+        self.include_splits = 'splitwise_entries' in self.fields
+        self.needs_splits = self.include_splits or 'total_commission_earned' in self.fields
+
+        columns = ['transaction_id']
+        for name in self.fields:
+            if name in TRANSACTION_COLUMNS and TRANSACTION_COLUMNS[name][0] not in columns:
+                columns.append(TRANSACTION_COLUMNS[name][0])
+        if self.needs_splits:
+            columns.extend(column for column in COMMISSION_COLUMNS if column not in columns)
+        self.columns = columns
+        self.index = {column: position for position, column in enumerate(columns)}
+
+    def fetch(self, queryset):
+        return list(queryset.values_list(*self.columns))
+
+    def serialize(self, rows):
+        format_datetime = datetime_field().to_representation
+        splits = self.load_splits(rows, format_datetime) if self.needs_splits else {}
+        flag_index = self.index.get('risk_taker_flag')
+        converters = []
+        for name in self.fields:
+            if name in TRANSACTION_COLUMNS:
+                column, convert = TRANSACTION_COLUMNS[name]
+                converters.append(
+                    (name, self.index[column], format_datetime if convert is FORMAT_DATETIME else convert)
+                )
+
+        serialized = []
+        for row in rows:
+            data = {}
+            for name, position, convert in converters:
+                value = row[position]
+                data[name] = None if value is None else convert(value)
+            if self.needs_splits:
+                entries = splits.get(row[0], ())
+                if 'total_commission_earned' in self.fields:
+                    data['total_commission_earned'] = self.total_commission_earned(row[flag_index], entries)
+                if self.include_splits:
+                    data['splitwise_entries'] = [entry[2] for entry in entries]
+                # Keep the serializer's key order
+                data = {name: data[name] for name in self.fields}
+            serialized.append(data)
+        return serialized
+
+    def total_commission_earned(self, commission_flag, entries):
+        """Same summation as PortfolioSerializer.get_total_commission_earned"""
+        if not commission_flag:
+            return 0
+
+        total_commission = 0
+        for is_risk_taker, deducted, _ in entries:
+            if not is_risk_taker:
+                total_commission += deducted
+        return total_commission
+
+    def load_splits(self, rows, format_datetime):
+        """Transaction pk -> [(is_risk_taker, commission_deducted, rendered entry or None)] in pk order"""
+        transactions = {
+            row[0]: (
+                row[self.index['risk_taker_flag']],
+                row[self.index['risk_taker_commission']],
+                row[self.index['risk_taker_id']],
+            )
+            for row in rows
+        }
+        columns = SPLIT_COLUMNS if self.include_splits else SPLIT_COLUMNS[:4]
+        queryset = Splitwise.objects.filter(transaction_id__in=list(transactions)).order_by('pk')
+
+        split_rows = list(queryset.values_list(*columns))
+        commission_flags = []
+        commission_rates = []
+        is_risk_taker = []
+        for split in split_rows:
+            commission_flag, commission_rate, risk_taker_id = transactions[split[0]]
+            commission_flags.append(commission_flag)
+            commission_rates.append(commission_rate)
+            is_risk_taker.append(split[1] == risk_taker_id)
+        interest_after, deducted = commission_columns(
+            [split[2] for split in split_rows], [split[3] for split in split_rows],
+            commission_flags, commission_rates, is_risk_taker
+        ).tolist()
+
+        splits = defaultdict(list)
+        for position, split in enumerate(split_rows):
+            transaction_id, syndicator_id, principal_amount, interest_amount = split[:4]
+            entry = None
+            if self.include_splits:
+                entry = {
+                    'splitwise_id': str(split[4]),
+                    'syndicator_id': syndicator_id,
+                    'syndicator_username': _str_or_none(split[5]),
+                    'syndicator_name': _str_or_none(split[6]),
+                    'syndicator_email': _str_or_none(split[7]),
+                    'principal_amount': float(principal_amount),
+                    'original_interest': float(interest_amount),
+                    'interest_after_commission': interest_after[position],
+                    'commission_deducted': deducted[position],
+                    'is_risk_taker': is_risk_taker[position],
+                    'created_at': format_datetime(split[8]),
+                }
+            splits[transaction_id].append((is_risk_taker[position], deducted[position], entry))
+        return splits
@@ -0,0 +1,121 @@
+"""
+Idempotency-Key support for write endpoints.
+
+A request carrying an `Idempotency-Key` header claims (user, key) by inserting an
+IdempotencyKey row, runs the view, and stores the response in the same database
+transaction as the view's writes. Retries with the same key and payload within
+IDEMPOTENCY_KEY_TTL get the stored response back without running the view again;
+a retry that arrives while the first request is still running waits for it.
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+POLL_INTERVAL = 0.05
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{request.method}\n{request.path}\n{payload}".encode()).hexdigest()
+
+
+def claim(user, key, fingerprint):
+    """Return (record, created); an expired or abandoned record is replaced"""
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user_id=user, key=key, fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+                ), True
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(user_id=user, key=key).first()
+        if record is None:
+            continue  # Released by its owner in the meantime
+        abandoned = (
+            record.response_status is None
+            and record.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        )
+        if record.expires_at <= now or abandoned:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            continue
+        return record, False
+
+
+def replay(record):
+    return Response(record.response_body, status=record.response_status, headers={REPLAYED_HEADER: 'true'})
+
+
+def idempotent(view_method):
+    """
+    Make an APIView write handler honour the Idempotency-Key header. Requests
+    without the header are handled as before.
+
+    5xx responses aren't stored, so the client can retry them. Reusing a key for a
+    different payload is a 422; a duplicate still waiting after
+    IDEMPOTENCY_WAIT_TIMEOUT seconds gets a 409.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return view_method(self, request, *args, **kwargs)
+        if not key or len(key) > 255:
+            return Response({
+                "error": f"{IDEMPOTENCY_HEADER} must be between 1 and 255 characters"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+        while True:
+            record, created = claim(request.user, key, fingerprint)
+            if created:
+                break
+            if record.fingerprint != fingerprint:
+                return Response({
+                    "error": f"{IDEMPOTENCY_HEADER} was already used for a different request"
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.response_status is not None:
+                return replay(record)
+            if time.monotonic() >= deadline:
+                return Response({
+                    "error": f"A request with this {IDEMPOTENCY_HEADER} is still being processed"
+                }, status=status.HTTP_409_CONFLICT)
+            # The first request is still running: wait for its response (or for it to give the key up)
+            time.sleep(POLL_INTERVAL)
+
+        stored = False
+        try:
+            with transaction.atomic():
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code < 500:
+                    # Committed together with the view's writes
+                    IdempotencyKey.objects.filter(pk=record.pk).update(
+                        response_status=response.status_code,
+                        response_body=response.data
+                    )
+                    stored = True
+        finally:
+            if not stored:
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+        return response
+
+    return wrapper
@@ -0,0 +1,322 @@
+"""
+Bulk import of historical transactions from CSV or JSON Lines files.
+
+Rows follow the create_transaction payload: total_principal_amount,
+total_interest_amount, start_date, end_date, month_period_of_loan, lender_name,
+risk_taker_flag, risk_taker_commission and syndicate_details, plus an optional
+risk_taker username. In CSV files syndicate_details is either a JSON object or
+"username:principal:interest" entries separated by ";".
+
+Rows are validated with the same rules as CreateTransactionView, but users and
+friendships are looked up once per batch instead of once per syndicator, and the
+valid rows are written with bulk_create. Invalid rows are reported by line number
+and skipped; the rest of the file is still imported.
+"""
+import csv
+import io
+import json
+import math
+from dataclasses import dataclass, field
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q
+
+from .coalescing import bump_data_version
+from .models import CustomUser, FriendRequest, Splitwise, Transactions
+
+FORMATS = ('csv', 'jsonl')
+LENDER_NAME_MAX_LENGTH = Transactions._meta.get_field('lender_name').max_length
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    created: int = 0
+    splits_created: int = 0
+    errors: list = field(default_factory=list)  # [{"line": n, "error": "..."}]
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "splitwise_entries_created": self.splits_created,
+            "error_count": len(self.errors),
+            "errors": self.errors,
+        }
+
+
+def detect_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension)
+
+
+def read_rows(binary_file, file_format):
+    """Yield (line number, raw row dict) from an uploaded or opened binary file"""
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            row = RowError(f"Invalid JSON: {e.msg}")
+        if not isinstance(row, (dict, RowError)):
+            row = RowError("Each line must be a JSON object")
+        yield line_number, row
+
+
+def _number(row, name, required=True, default=None):
+    value = row.get(name)
+    if value is None or value == '':
+        if required:
+            raise RowError(f"{name} is required")
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{name} must be a number")
+    if not math.isfinite(number):
+        raise RowError(f"{name} must be a finite number")
+    if number < 0:
+        raise RowError(f"{name} can't be negative")
+    return number
+
+
+def _integer(row, name):
+    try:
+        return int(row.get(name))
+    except (TypeError, ValueError):
+        raise RowError(f"{name} must be an integer")
+
+
+def _date(row, name):
+    value = row.get(name)
+    if not value:
+        raise RowError(f"{name} is required")
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise RowError(f"{name} must be a YYYY-MM-DD date")
+
+
+def _syndicate_details(value):
+    if value is None or value == '':
+        return {}
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('{'):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                raise RowError("syndicate_details is not valid JSON")
+        else:
+            details = {}
+            for entry in filter(None, (part.strip() for part in value.split(';'))):
+                parts = entry.split(':')
+                if len(parts) != 3:
+                    raise RowError("syndicate_details entries must look like username:principal:interest")
+                details[parts[0]] = {'principal_amount': parts[1], 'interest': parts[2]}
+            value = details
+    if not isinstance(value, dict):
+        raise RowError("syndicate_details must be an object keyed by username")
+
+    details = {}
+    for username, split in value.items():
+        if not isinstance(split, dict):
+            raise RowError(f"syndicate_details for {username} must be an object")
+        details[username] = (
+            _number(split, 'principal_amount', required=False, default=0),
+            _number(split, 'interest', required=False, default=0),
+        )
+    return details
+
+
+def parse_row(row):
+    """Validate a row on its own; user and friendship checks happen per batch"""
+    if isinstance(row, RowError):
+        raise row
+
+    lender_name = row.get('lender_name')
+    lender_name = None if lender_name in (None, '') else str(lender_name)
+    if lender_name is not None and len(lender_name) > LENDER_NAME_MAX_LENGTH:
+        raise RowError(f"lender_name can be at most {LENDER_NAME_MAX_LENGTH} characters")
+    parsed = {
+        'risk_taker': str(row['risk_taker']) if row.get('risk_taker') else None,
+        'total_principal_amount': _number(row, 'total_principal_amount'),
+        'total_interest_amount': _number(row, 'total_interest_amount'),
+        'start_date': _date(row, 'start_date'),
+        'end_date': _date(row, 'end_date'),
+        'month_period_of_loan': _integer(row, 'month_period_of_loan'),
+        'lender_name': lender_name,
+        'risk_taker_flag': str(row.get('risk_taker_flag', False)).lower() in ("true", "1", "yes"),
+        'risk_taker_commission': _number(row, 'risk_taker_commission', required=False, default=0),
+        'syndicate_details': _syndicate_details(row.get('syndicate_details')),
+    }
+
+    if parsed['risk_taker_flag'] and not 0 < parsed['risk_taker_commission'] <= 100:
+        raise RowError("risk_taker_commission must be between 0 and 100 when risk_taker_flag is true")
+    if not parsed['risk_taker_flag']:
+        parsed['risk_taker_commission'] = 0
+
+    total_interest_amount = parsed['total_interest_amount']
+    for username, (principal_amount, interest_amount) in parsed['syndicate_details'].items():
+        if abs(total_interest_amount - interest_amount) > 0.01:
+            raise RowError(
+                f"Interest amount for {username} ({interest_amount}) must equal total_interest_amount "
+                f"({total_interest_amount}). All syndicators must have the same interest amount."
+            )
+    if parsed['syndicate_details']:
+        total_splitwise_principal = sum(principal for principal, _ in parsed['syndicate_details'].values())
+        if abs(parsed['total_principal_amount'] - total_splitwise_principal) > 0.01:
+            raise RowError(
+                f"Total principal amount ({parsed['total_principal_amount']}) does not match sum of "
+                f"splitwise principal amounts ({total_splitwise_principal})"
+            )
+    return parsed
+
+
+class TransactionImporter:
+    """
+    Import rows on behalf of `risk_taker`. With `allow_risk_taker_column`, a row's
+    risk_taker username overrides it (management command); otherwise rows naming
+    someone else are rejected (API).
+    """
+
+    def __init__(self, risk_taker=None, allow_risk_taker_column=False, batch_size=1000, dry_run=False):
+        self.risk_taker = risk_taker
+        self.allow_risk_taker_column = allow_risk_taker_column
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+    def run(self, rows):
+        result = ImportResult()
+        batch = []
+        for line_number, row in rows:
+            result.rows += 1
+            try:
+                batch.append((line_number, parse_row(row)))
+            except RowError as e:
+                result.errors.append({"line": line_number, "error": str(e)})
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch, result)
+                batch = []
+        if batch:
+            self.import_batch(batch, result)
+        result.errors.sort(key=lambda error: error["line"])
+        return result
+
+    def import_batch(self, batch, result):
+        usernames = set()
+        for _, row in batch:
+            usernames.update(row['syndicate_details'])
+            if row['risk_taker']:
+                usernames.add(row['risk_taker'])
+        users = {user.username: user for user in CustomUser.objects.filter(username__in=usernames)}
+        if self.risk_taker is not None:
+            users.setdefault(self.risk_taker.username, self.risk_taker)
+
+        risk_takers = {}
+        for line_number, row in batch:
+            risk_takers[line_number] = self.resolve_risk_taker(row, users)
+        friendships = self.accepted_friendships({
+            user.pk for user in risk_takers.values() if isinstance(user, CustomUser)
+        })
+
+        transactions = []
+        splits = []
+        affected_user_ids = set()
+        for line_number, row in batch:
+            risk_taker = risk_takers[line_number]
+            try:
+                if isinstance(risk_taker, RowError):
+                    raise risk_taker
+                new_transaction, new_splits = self.build(row, risk_taker, users, friendships)
+            except RowError as e:
+                result.errors.append({"line": line_number, "error": str(e)})
+                continue
+            transactions.append(new_transaction)
+            splits.extend(new_splits)
+            affected_user_ids.add(risk_taker.pk)
+            affected_user_ids.update(split.syndicator_id_id for split in new_splits)
+
+        if not self.dry_run and transactions:
+            with transaction.atomic():
+                Transactions.objects.bulk_create(transactions, batch_size=self.batch_size)
+                Splitwise.objects.bulk_create(splits, batch_size=self.batch_size)
+                # bulk_create skips the signals that keep request coalescing consistent
+                transaction.on_commit(lambda: bump_data_version(affected_user_ids))
+        result.created += len(transactions)
+        result.splits_created += len(splits)
+
+    def resolve_risk_taker(self, row, users):
+        username = row['risk_taker']
+        if username is None or (self.risk_taker is not None and username == self.risk_taker.username):
+            return self.risk_taker or RowError("risk_taker is required")
+        if not self.allow_risk_taker_column:
+            return RowError("risk_taker must be the authenticated user")
+        return users.get(username) or RowError(f"Risk taker not found: {username}")
+
+    def accepted_friendships(self, user_ids):
+        """Pairs (a, b) of accepted friends, in both directions, for everyone friends with `user_ids`"""
+        pairs = set()
+        if not user_ids:
+            return pairs
+        accepted = FriendRequest.objects.filter(
+            Q(user_id__in=user_ids) | Q(requested_id__in=user_ids), status='accepted'
+        ).values_list('user_id', 'requested_id')
+        for user_id, requested_id in accepted:
+            pairs.add((user_id, requested_id))
+            pairs.add((requested_id, user_id))
+        return pairs
+
+    def build(self, row, risk_taker, users, friendships):
+        syndicate_details = row['syndicate_details']
+        missing_usernames = [username for username in syndicate_details if username not in users]
+        if missing_usernames:
+            raise RowError(f"Users not found: {', '.join(missing_usernames)}")
+        non_friends = [
+            username for username in syndicate_details
+            if username != risk_taker.username and (risk_taker.pk, users[username].pk) not in friendships
+        ]
+        if non_friends:
+            raise RowError(f"Syndicator(s) {', '.join(non_friends)} are not accepted friends.")
+
+        if syndicate_details:
+            members = [(users[username], amounts) for username, amounts in syndicate_details.items()]
+        else:
+            # Same as a solo create_transaction: one split for the risk taker
+            members = [(risk_taker, (row['total_principal_amount'], row['total_interest_amount']))]
+
+        new_transaction = Transactions(
+            risk_taker_id=risk_taker,
+            syndicators=[{'user_id': str(user.user_id), 'username': user.username} for user, _ in members],
+            total_principal_amount=row['total_principal_amount'],
+            total_interest=row['total_interest_amount'],
+            risk_taker_flag=row['risk_taker_flag'],
+            risk_taker_commission=row['risk_taker_commission'],
+            start_date=row['start_date'],
+            end_date=row['end_date'],
+            lender_name=row['lender_name'],
+            month_period_of_loan=row['month_period_of_loan'],
+        )
+        new_splits = [
+            Splitwise(
+                transaction_id=new_transaction,
+                syndicator_id=user,
+                principal_amount=principal_amount,
+                interest_amount=interest_amount,
+            )
+            for user, (principal_amount, interest_amount) in members
+        ]
+        return new_transaction, new_splits
@@ -0,0 +1,60 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Timings for the request being handled, or None when instrumentation is off
+_current_timings = ContextVar('request_timings', default=None)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts queries and accumulates their wall time.
+
+    Install with `connection.execute_wrapper(recorder)`; unlike connection.queries it
+    works with DEBUG off and doesn't keep the SQL text around.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class RequestTimings:
+    """Named durations (in seconds) collected while a single request is handled"""
+
+    def __init__(self):
+        self.durations = {}
+        self.queries = QueryRecorder()
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+
+
+def activate_timings(timings):
+    return _current_timings.set(timings)
+
+
+def deactivate_timings(token):
+    _current_timings.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """Add the block's duration to the current request's `name` timing; a no-op when instrumentation is off"""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
@@ -0,0 +1,96 @@
+"""
+Repayment ledger: what the risk taker has passed on to each split.
+
+Every Repayment row stores the split's running balances after it (principal still
+outstanding, interest paid so far), so a split's current balances are its latest
+row, found through the (splitwise_id, sequence) unique index instead of summing the
+history. Repayments for a whole syndicate are posted together in one INSERT.
+"""
+import math
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .coalescing import bump_data_version
+from .models import Repayment, Splitwise
+
+# A principal payment may exceed the outstanding principal by float noise only
+TOLERANCE = 0.005
+
+
+class PostingError(ValueError):
+    pass
+
+
+def with_balances(splits):
+    """
+    Annotate a Splitwise queryset with each split's current ledger position: the
+    latest sequence, outstanding_principal and interest_paid_total (the principal
+    and nothing paid for splits without repayments)
+    """
+    latest = Repayment.objects.filter(splitwise_id=OuterRef('pk')).order_by('-sequence')
+    return splits.annotate(
+        last_sequence=Coalesce(Subquery(latest.values('sequence')[:1]), 0),
+        outstanding_principal=Coalesce(Subquery(latest.values('outstanding_principal')[:1]), F('principal_amount')),
+        interest_paid_total=Coalesce(Subquery(latest.values('interest_paid_total')[:1]), 0.0),
+    )
+
+
+def post_repayments(loan, entries, paid_on):
+    """
+    Post repayments to splits of `loan` (a Transactions) on `paid_on`. `entries` are
+    (splitwise_id, principal_paid, interest_paid) tuples, at most one per split.
+    Returns the new Repayment rows; raises PostingError without writing anything if
+    an entry is invalid.
+    """
+    entries = list(entries)
+    splitwise_ids = [splitwise_id for splitwise_id, _, _ in entries]
+    if len(set(splitwise_ids)) != len(splitwise_ids):
+        raise PostingError("Each split can only be repaid once per posting")
+    for splitwise_id, principal_paid, interest_paid in entries:
+        if not (math.isfinite(principal_paid) and math.isfinite(interest_paid)):
+            raise PostingError(f"Repayment amounts for split {splitwise_id} must be finite numbers")
+        if principal_paid < 0 or interest_paid < 0:
+            raise PostingError(f"Repayment amounts for split {splitwise_id} can't be negative")
+        if principal_paid == 0 and interest_paid == 0:
+            raise PostingError(f"Repayment for split {splitwise_id} is empty")
+
+    with transaction.atomic():
+        # Locks the splits, so concurrent postings to the same split take turns
+        splits = {
+            split.pk: split for split in with_balances(
+                Splitwise.objects.select_for_update().filter(transaction_id=loan, pk__in=splitwise_ids)
+            )
+        }
+        missing = [str(splitwise_id) for splitwise_id in splitwise_ids if splitwise_id not in splits]
+        if missing:
+            raise PostingError(f"Splits not found in this transaction: {', '.join(missing)}")
+
+        repayments = []
+        for splitwise_id, principal_paid, interest_paid in entries:
+            split = splits[splitwise_id]
+            if principal_paid > split.outstanding_principal + TOLERANCE:
+                raise PostingError(
+                    f"Principal repaid for split {splitwise_id} ({principal_paid}) exceeds its outstanding "
+                    f"principal ({split.outstanding_principal})"
+                )
+            repayments.append(Repayment(
+                transaction_id=loan,
+                splitwise_id=split,
+                sequence=split.last_sequence + 1,
+                paid_on=paid_on,
+                principal_paid=principal_paid,
+                interest_paid=interest_paid,
+                outstanding_principal=max(split.outstanding_principal - principal_paid, 0),
+                interest_paid_total=split.interest_paid_total + interest_paid,
+            ))
+        Repayment.objects.bulk_create(repayments)
+
+        # bulk_create skips signals; every member of the transaction sees its ledger
+        def bump():
+            members = Splitwise.objects.filter(transaction_id=loan).values_list('syndicator_id', flat=True)
+            bump_data_version([loan.risk_taker_id_id, *members])
+
+        transaction.on_commit(bump)
+    return repayments
@@ -0,0 +1,48 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from core.commission import commission_columns, commission_deducted, interest_after_commission
+
+
+class Command(BaseCommand):
+    help = "Compare the per-entry commission functions with commission_columns() on random splits"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--splits', type=int, default=1_000_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        count = options['splits']
+        principal_amount = rng.uniform(0, 100_000, count).round(2)
+        interest_amount = rng.choice([1.0, 1.5, 2.0, 2.5], count)
+        commission_flag = rng.random(count) < 0.6
+        commission_rate = rng.choice([0.0, 5.0, 10.0, 12.5, 100.0], count)
+        is_risk_taker = rng.random(count) < 0.2
+
+        started = time.perf_counter()
+        columns = [
+            principal_amount.tolist(), interest_amount.tolist(), commission_flag.tolist(),
+            commission_rate.tolist(), is_risk_taker.tolist(),
+        ]
+        scalar = (
+            [interest_after_commission(*entry) for entry in zip(*columns)],
+            [commission_deducted(*entry) for entry in zip(*columns)],
+        )
+        scalar_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        result = commission_columns(principal_amount, interest_amount, commission_flag, commission_rate, is_risk_taker)
+        vectorized_ms = (time.perf_counter() - started) * 1000
+        vectorized = result.tolist()
+        with_lists_ms = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(f"{count} splits")
+        self.stdout.write(f"  per-entry functions        {scalar_ms:>9.2f}ms")
+        self.stdout.write(f"  commission_columns         {vectorized_ms:>9.2f}ms")
+        self.stdout.write(f"  commission_columns+tolist  {with_lists_ms:>9.2f}ms")
+        if vectorized != scalar:
+            raise CommandError("commission_columns() differs from the per-entry functions")
+        self.stdout.write(self.style.SUCCESS("Results are identical"))
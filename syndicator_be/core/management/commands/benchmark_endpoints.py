@@ -0,0 +1,234 @@
+import json
+import platform
+import resource
+import subprocess
+import time
+from datetime import date, datetime, timedelta, timezone
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import Count, Q
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.instrumentation import QueryRecorder
+from core.models import CustomUser, FriendRequest, Splitwise, Transactions
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Benchmark every core API endpoint against seeded datasets and write JSON results"
+
+    # Seeded loans start within three years before this date
+    ANCHOR_DATE = date(2025, 1, 1)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000',
+                            help="Comma-separated transaction counts to seed (users = transactions / 10)")
+        parser.add_argument('--iterations', type=int, default=30, help="Timed requests per endpoint")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per endpoint")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='bench_results.json')
+        parser.add_argument('--use-current-database', action='store_true',
+                            help="Run against the configured database instead of a throwaway test database. "
+                                 "The database is flushed before each dataset size.")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+
+        old_database_name = None
+        if not options['use_current_database']:
+            old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # APIClient sends requests as "testserver"
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                runs = [self.run_size(size, options) for size in sizes]
+        finally:
+            if old_database_name is not None:
+                connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+        report = {
+            'metadata': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'git_revision': self.git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database_vendor': connection.vendor,
+                'iterations': options['iterations'],
+                'seed': options['seed'],
+            },
+            'runs': runs,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def git_revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def run_size(self, size, options):
+        call_command('flush', interactive=False, verbosity=0)
+        call_command(
+            'seed_scale_data',
+            users=max(20, size // 10),
+            transactions=size,
+            seed=options['seed'],
+            anchor_date=self.ANCHOR_DATE,
+            stdout=StringIO(),
+        )
+        # Snapshots for portfolio/history: the 90 days up to the anchor date
+        call_command(
+            'snapshot_portfolios',
+            date=self.ANCHOR_DATE,
+            start_date=self.ANCHOR_DATE - timedelta(days=90),
+            stdout=StringIO(),
+        )
+
+        # Benchmark as the busiest risk taker: the worst case for the per-user endpoints
+        user = CustomUser.objects.annotate(loan_count=Count('risk_taker')).order_by('-loan_count').first()
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        self.stdout.write(f"dataset: {size} transactions (user {user.username})")
+        results = []
+        for name, method, request_builder in self.endpoints(user):
+            result = {'endpoint': name, **self.run_endpoint(client, method, request_builder, options)}
+            results.append(result)
+            self.stdout.write(
+                f"  {name:<30} p50={result['p50_ms']:>8.2f}ms  p95={result['p95_ms']:>8.2f}ms  "
+                f"p99={result['p99_ms']:>8.2f}ms  queries={result['queries']:>4}  "
+                f"sql={result['sql_ms']:>7.2f}ms  rss={result['peak_rss_kb']}kB"
+            )
+        return {'transactions': size, 'user': user.username, 'endpoints': results}
+
+    def endpoints(self, user):
+        """(name, method, builder) for each core.urls route; builder(i) returns (url, data)"""
+        transaction_id = Transactions.objects.filter(risk_taker_id=user).values_list('pk', flat=True).first()
+        friend_usernames = list(CustomUser.objects.exclude(pk=user.pk).values_list('username', flat=True)[:50])
+        pending_request_id = FriendRequest.objects.create(user_id=user, requested_id=CustomUser.objects.exclude(
+            pk=user.pk).first(), status='pending').pk
+        # Fresh credentials for the login endpoint; seeded users share a slow password hash
+        CustomUser.objects.create_user(username='bench_login', email='bench_login@example.com', password='benchpass123')
+        splitwise_id = Splitwise.objects.filter(transaction_id=transaction_id).values_list('pk', flat=True).first()
+        # An accepted friend to syndicate with in the simulated and imported loans
+        friend_request = FriendRequest.objects.filter(
+            Q(user_id=user) | Q(requested_id=user), status='accepted'
+        ).values_list('user_id__username', 'requested_id__username').first()
+        friend = next((username for username in friend_request or () if username != user.username), None)
+        syndicate_details = {user.username: {'principal_amount': 60000, 'interest': 2}}
+        if friend is not None:
+            syndicate_details[friend] = {'principal_amount': 40000, 'interest': 2}
+        else:
+            syndicate_details[user.username]['principal_amount'] = 100000
+        import_rows = ''.join(json.dumps({
+            'total_principal_amount': 100000, 'total_interest_amount': 2, 'start_date': '2024-01-01',
+            'end_date': '2025-01-01', 'month_period_of_loan': 12, 'lender_name': 'Bench lender',
+            'risk_taker_flag': True, 'risk_taker_commission': 10, 'syndicate_details': syndicate_details,
+        }) + '\n' for _ in range(20))
+        anchor = self.ANCHOR_DATE.isoformat()
+
+        return [
+            ('register', 'post', lambda i: (reverse('register'), {
+                'username': f'bench_register_{i}', 'email': f'bench_register_{i}@example.com', 'password': 'benchpass123'
+            })),
+            ('login', 'post', lambda i: (reverse('login'), {'username': 'bench_login', 'password': 'benchpass123'})),
+            ('portfolio', 'get', lambda i: (reverse('portfolio'), None)),
+            ('syndicate', 'get', lambda i: (reverse('syndicate'), None)),
+            ('create_friend_list', 'post', lambda i: (reverse('create_friend_list'), {
+                'mutual_friend_name': friend_usernames[i % len(friend_usernames)]
+            })),
+            ('check_friend_request_status', 'get', lambda i: (reverse('check_friend_request_status'), None)),
+            ('update_friend_request_status', 'post', lambda i: (reverse('update_friend_request_status'), {
+                'request_id': str(pending_request_id), 'status': 'pending'
+            })),
+            ('all_transaction', 'get', lambda i: (reverse('all_transaction'), None)),
+            ('create_transaction', 'post', lambda i: (reverse('create_transaction'), {
+                'total_principal_amount': 100000, 'total_interest_amount': 2, 'start_date': '2025-01-01',
+                'end_date': '2025-12-01', 'month_period_of_loan': 11, 'lender_name': 'Bench lender'
+            })),
+            ('user_splitwise', 'get', lambda i: (reverse('user_splitwise'), None)),
+            ('transaction_splitwise', 'get', lambda i: (reverse('transaction_splitwise', args=[transaction_id]), None)),
+            ('db_health_check', 'get', lambda i: (reverse('db_health_check'), None)),
+            ('portfolio_history', 'get', lambda i: (reverse('portfolio_history') + f'?until={anchor}', None)),
+            ('upcoming_cash_flows', 'get', lambda i: (reverse('upcoming_cash_flows') + f'?from={anchor}', None)),
+            ('settlement', 'get', lambda i: (reverse('settlement') + f'?from={anchor}', None)),
+            ('timeline', 'get', lambda i: (reverse('timeline'), None)),
+            ('maturity_calendar', 'get', lambda i: (reverse('maturity_calendar') + '?bucket=month&days=3660', None)),
+            ('exposure', 'get', lambda i: (reverse('exposure'), None)),
+            ('simulate_commission', 'post', lambda i: (reverse('simulate_commission'), {
+                'total_principal_amount': 100000, 'total_interest_amount': 2, 'syndicate_details': syndicate_details,
+                'rate_range': {'start': 0, 'stop': 100, 'step': 0.5},
+            })),
+            ('batch', 'post', lambda i: (reverse('batch'), {'requests': [
+                {'id': 'portfolio', 'method': 'GET', 'path': 'portfolio/'},
+                {'id': 'exposure', 'method': 'GET', 'path': 'exposure/'},
+                {'id': 'timeline', 'method': 'GET', 'path': 'timeline/'},
+            ]})),
+            ('import_transactions', 'post', lambda i: (reverse('import_transactions'), {
+                'file': SimpleUploadedFile('bench.jsonl', import_rows.encode()),
+            })),
+            ('transaction_repayments', 'get', lambda i: (
+                reverse('transaction_repayments', args=[transaction_id]), None
+            )),
+            # Interest-only, so repeated postings never exceed the outstanding principal
+            ('post_transaction_repayments', 'post', lambda i: (reverse('transaction_repayments', args=[transaction_id]), {
+                'paid_on': anchor, 'repayments': [{'splitwise_id': str(splitwise_id), 'interest_amount': 1}],
+            })),
+        ]
+
+    def send(self, client, method, url, data):
+        if data is None:
+            return getattr(client, method)(url)
+        # Uploads go as a multipart form, everything else as JSON
+        multipart = any(isinstance(value, SimpleUploadedFile) for value in data.values())
+        return getattr(client, method)(url, data, format='multipart' if multipart else 'json')
+
+    def run_endpoint(self, client, method, request_builder, options):
+        for i in range(options['warmup']):
+            url, data = request_builder(-1 - i)
+            self.send(client, method, url, data)
+
+        latencies = []
+        query_counts = []
+        sql_times = []
+        status_codes = set()
+        for i in range(options['iterations']):
+            url, data = request_builder(i)
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                started = time.perf_counter()
+                response = self.send(client, method, url, data)
+                latencies.append(time.perf_counter() - started)
+            query_counts.append(recorder.count)
+            sql_times.append(recorder.duration)
+            status_codes.add(response.status_code)
+
+        latencies.sort()
+        return {
+            'status_codes': sorted(status_codes),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'mean_ms': sum(latencies) / len(latencies) * 1000,
+            'queries': max(query_counts),
+            'sql_ms': sum(sql_times) / len(sql_times) * 1000,
+            # ru_maxrss is the process high-water mark (kB on Linux), so it only grows run to run
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
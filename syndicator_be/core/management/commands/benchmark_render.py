@@ -0,0 +1,76 @@
+import time
+from datetime import date
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Prefetch
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Splitwise, Transactions
+from core.renderers import ORJSONRenderer
+from core.serializers import PortfolioSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Command(BaseCommand):
+    help = "Compare render time and bytes on the wire for an all_transaction-sized payload"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            payload = self.build_payload(options['transactions'])
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+        self.stdout.write(f"payload: {options['transactions']} transactions")
+        renderers = (('drf JSONRenderer', JSONRenderer()), ('ORJSONRenderer', ORJSONRenderer()))
+        for name, renderer in renderers:
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                body = renderer.render(payload)
+            render_ms = (time.perf_counter() - started) / options['repeat'] * 1000
+            self.stdout.write(f"  {name:<17} render={render_ms:>8.2f}ms  bytes={len(body):>9}")
+
+        self.report_compression('identity', body, lambda content: content)
+        self.report_compression('gzip', body, compress_string)
+        if brotli is not None:
+            self.report_compression(
+                f'br (q={settings.COMPRESSION_BROTLI_QUALITY})', body,
+                lambda content: brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+            )
+        else:
+            self.stdout.write("  br                (brotli package not installed)")
+
+    def build_payload(self, count):
+        call_command('seed_scale_data', users=max(20, count // 10), transactions=count,
+                     anchor_date=date(2025, 1, 1), stdout=StringIO())
+        transactions = Transactions.objects.select_related('risk_taker_id').prefetch_related(
+            Prefetch('splitwise_entries', queryset=Splitwise.objects.select_related('syndicator_id'))
+        )[:count]
+        # Same shape as the all_transaction response
+        return {
+            "message": "Transactions retrieved successfully",
+            "transaction_counts": {"total": count},
+            "transactions": PortfolioSerializer(transactions, many=True).data,
+        }
+
+    def report_compression(self, name, body, compress):
+        started = time.perf_counter()
+        compressed = compress(body)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(
+            f"  {name:<17} encode={elapsed_ms:>8.2f}ms  bytes={len(compressed):>9}  "
+            f"ratio={len(compressed) / len(body):.3f}"
+        )
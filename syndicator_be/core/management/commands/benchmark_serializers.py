@@ -0,0 +1,60 @@
+import time
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Prefetch
+
+from core.fast_serializers import PortfolioReader
+from core.models import Splitwise, Transactions
+from core.renderers import ORJSONRenderer
+from core.serializers import PortfolioSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare PortfolioSerializer with the values()-based PortfolioReader on seeded data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            call_command('seed_scale_data', users=max(20, options['transactions'] // 10),
+                         transactions=options['transactions'], anchor_date=date(2025, 1, 1), stdout=StringIO())
+            self.run(options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+    def run(self, repeat):
+        queryset = Transactions.objects.order_by('pk')
+        renderer = ORJSONRenderer()
+
+        def serializer():
+            # Same prefetching as AllTransactionView used before the reader
+            transactions = queryset.select_related('risk_taker_id').prefetch_related(
+                Prefetch('splitwise_entries', queryset=Splitwise.objects.select_related('syndicator_id').order_by('pk'))
+            )
+            return PortfolioSerializer(transactions, many=True).data
+
+        def reader():
+            portfolio_reader = PortfolioReader()
+            return portfolio_reader.serialize(portfolio_reader.fetch(queryset))
+
+        bodies = {}
+        self.stdout.write(f"{queryset.count()} transactions, {Splitwise.objects.count()} splits")
+        for name, build in (('PortfolioSerializer', serializer), ('PortfolioReader', reader)):
+            build()  # warm up
+            started = time.perf_counter()
+            for _ in range(repeat):
+                data = build()
+            elapsed_ms = (time.perf_counter() - started) / repeat * 1000
+            bodies[name] = renderer.render(data)
+            self.stdout.write(f"  {name:<20} query+serialize={elapsed_ms:>9.2f}ms  bytes={len(bodies[name])}")
+
+        if bodies['PortfolioSerializer'] != bodies['PortfolioReader']:
+            raise CommandError("PortfolioReader output differs from PortfolioSerializer")
+        self.stdout.write(self.style.SUCCESS("Rendered output is byte-identical"))
@@ -0,0 +1,52 @@
+import time
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from core.schedule import SCHEDULE_DTYPE, uuid_bytes
+from core.settlement import settle
+
+
+class Command(BaseCommand):
+    help = "Time the settlement engine on one cycle of random installments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--loans', type=int, default=50_000)
+        parser.add_argument('--max-syndicators', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        users = uuid_bytes(uuid.UUID(bytes=rng.bytes(16)) for _ in range(options['users']))
+        loans = options['loans']
+        splits_per_loan = rng.integers(1, options['max_syndicators'] + 1, loans)
+        loan_of_split = np.repeat(np.arange(loans), splits_per_loan)
+
+        # One installment per split, about a tenth of them the last one
+        schedule = np.zeros(len(loan_of_split), dtype=SCHEDULE_DTYPE)
+        schedule['risk_taker_id'] = users[rng.integers(0, len(users), loans)][loan_of_split]
+        schedule['syndicator_id'] = users[rng.integers(0, len(users), len(schedule))]
+        principal = rng.uniform(0, 100_000, len(schedule)).round(2)
+        schedule['interest'] = principal * rng.choice([1.0, 1.5, 2.0], len(schedule)) / 100 * 0.9
+        schedule['principal'] = np.where(rng.random(len(schedule)) < 0.1, principal, 0.0)
+
+        started = time.perf_counter()
+        settlement = settle(schedule)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(f"{len(schedule)} installments, {len(settlement.user_ids)} users")
+        self.stdout.write(f"  pairwise obligations  {settlement.obligations:>9}")
+        self.stdout.write(f"  transfers             {len(settlement.transfers):>9}")
+        self.stdout.write(f"  settle                {elapsed_ms:>9.2f}ms")
+
+        remaining = settlement.balances.copy()
+        for payer, payee, amount in settlement.transfers:
+            remaining[payer] += amount
+            remaining[payee] -= amount
+        if remaining.any():
+            raise CommandError("The transfers don't settle every balance")
+        if len(settlement.transfers) >= max(np.count_nonzero(settlement.balances), 1):
+            raise CommandError("More transfers than users with a balance")
+        self.stdout.write(self.style.SUCCESS("Transfers settle every balance"))
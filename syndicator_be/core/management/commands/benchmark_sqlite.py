@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def open_connection(path, options):
+    """Open a raw sqlite3 connection configured the way Django would with these OPTIONS"""
+    kwargs = {'check_same_thread': False, 'isolation_level': None}
+    if 'timeout' in options:
+        kwargs['timeout'] = options['timeout']
+    conn = sqlite3.connect(path, **kwargs)
+    for statement in options.get('init_command', '').split(';'):
+        if statement.strip():
+            conn.execute(statement)
+    return conn
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent read/write throughput of the default and production SQLite profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200, help="Write transactions per writer")
+        parser.add_argument('--rows-per-write', type=int, default=5, help="Splitwise-like rows per write transaction")
+        parser.add_argument('--seed-rows', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        profiles = {
+            'default': {},
+            'production': settings.SQLITE_PRODUCTION_OPTIONS,
+        }
+        for name, profile_options in profiles.items():
+            result = self.run_profile(profile_options, options)
+            self.stdout.write(
+                f"{name:<11} writes/s={result['writes_per_sec']:>9.1f}  "
+                f"reads/s={result['reads_per_sec']:>9.1f}  "
+                f"read p50={result['read_p50_ms']:.2f}ms p95={result['read_p95_ms']:.2f}ms  "
+                f"lock_errors={result['lock_errors']}"
+            )
+
+    def run_profile(self, profile_options, options):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'bench.sqlite3')
+            begin = f"BEGIN {profile_options['transaction_mode']}" if 'transaction_mode' in profile_options else "BEGIN"
+
+            setup = open_connection(path, profile_options)
+            setup.execute(
+                "CREATE TABLE splitwise ("
+                "id INTEGER PRIMARY KEY, syndicator_id INTEGER, transaction_id INTEGER, "
+                "principal_amount REAL, interest_amount REAL)"
+            )
+            setup.execute("CREATE INDEX splitwise_syndicator ON splitwise (syndicator_id)")
+            setup.execute("BEGIN")
+            setup.executemany(
+                "INSERT INTO splitwise (syndicator_id, transaction_id, principal_amount, interest_amount) VALUES (?, ?, ?, ?)",
+                ((i % 500, i // 5, 1000.0, 2.0) for i in range(options['seed_rows'])),
+            )
+            setup.execute("COMMIT")
+            setup.close()
+
+            done = threading.Event()
+            lock = threading.Lock()
+            read_latencies = []
+            lock_errors = [0]
+            committed = [0]
+
+            def writer(worker):
+                conn = open_connection(path, profile_options)
+                for i in range(options['writes']):
+                    try:
+                        conn.execute(begin)
+                        conn.executemany(
+                            "INSERT INTO splitwise (syndicator_id, transaction_id, principal_amount, interest_amount) VALUES (?, ?, ?, ?)",
+                            ((j % 500, worker * 100000 + i, 500.0, 2.0) for j in range(options['rows_per_write'])),
+                        )
+                        conn.execute("COMMIT")
+                        with lock:
+                            committed[0] += 1
+                    except sqlite3.OperationalError:
+                        if conn.in_transaction:
+                            conn.execute("ROLLBACK")
+                        with lock:
+                            lock_errors[0] += 1
+                conn.close()
+
+            def reader(worker):
+                conn = open_connection(path, profile_options)
+                latencies = []
+                errors = 0
+                while not done.is_set():
+                    started = time.perf_counter()
+                    try:
+                        conn.execute(
+                            "SELECT SUM(principal_amount), SUM(principal_amount * interest_amount / 100) "
+                            "FROM splitwise WHERE syndicator_id = ?",
+                            (worker % 500,),
+                        ).fetchone()
+                    except sqlite3.OperationalError:
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - started)
+                conn.close()
+                with lock:
+                    read_latencies.extend(latencies)
+                    lock_errors[0] += errors
+
+            writers = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+            readers = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+
+            started = time.perf_counter()
+            for thread in readers + writers:
+                thread.start()
+            for thread in writers:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            done.set()
+            for thread in readers:
+                thread.join()
+
+        read_latencies.sort()
+        return {
+            'writes_per_sec': committed[0] / elapsed,
+            'reads_per_sec': len(read_latencies) / elapsed,
+            'read_p50_ms': statistics.median(read_latencies) * 1000 if read_latencies else 0,
+            'read_p95_ms': read_latencies[int(len(read_latencies) * 0.95)] * 1000 if read_latencies else 0,
+            'lock_errors': lock_errors[0],
+        }
@@ -0,0 +1,58 @@
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from core.utils import uuid7
+
+
+class Command(BaseCommand):
+    help = "Compare insert throughput and index size of uuid4 and uuid7 primary keys"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for name, generator in (('uuid4', uuid.uuid4), ('uuid7', uuid7)):
+            result = self.run_generator(generator, options['rows'], options['batch_size'])
+            self.stdout.write(
+                f"{name}  rows/s={result['rows_per_sec']:>10.1f}  "
+                f"last batch={result['last_batch_ms']:.2f}ms  "
+                f"db size={result['size_mb']:.1f}MB"
+            )
+
+    def run_generator(self, generator, rows, batch_size):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'bench.sqlite3')
+            conn = sqlite3.connect(path, isolation_level=None)
+            # Same column layout Django uses for UUIDField primary keys on SQLite
+            conn.execute(
+                "CREATE TABLE splitwise (splitwise_id char(32) NOT NULL PRIMARY KEY, "
+                "principal_amount real NOT NULL, interest_amount real NOT NULL)"
+            )
+
+            started = time.perf_counter()
+            batch_started = started
+            for offset in range(0, rows, batch_size):
+                batch_started = time.perf_counter()
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT INTO splitwise VALUES (?, ?, ?)",
+                    ((generator().hex, 1000.0, 2.0) for _ in range(min(batch_size, rows - offset))),
+                )
+                conn.execute("COMMIT")
+            finished = time.perf_counter()
+
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            conn.close()
+
+        return {
+            'rows_per_sec': rows / (finished - started),
+            'last_batch_ms': (finished - batch_started) * 1000,
+            'size_mb': page_count * page_size / (1024 * 1024),
+        }
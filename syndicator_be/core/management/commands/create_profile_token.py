@@ -0,0 +1,14 @@
+from django.core import signing
+from django.core.management.base import BaseCommand
+
+from core.middleware import RequestProfilingMiddleware
+
+
+class Command(BaseCommand):
+    help = "Print a signed X-Profile-Token header value that triggers request profiling"
+
+    def handle(self, *args, **options):
+        token = signing.TimestampSigner(salt=RequestProfilingMiddleware.TOKEN_SALT).sign(
+            RequestProfilingMiddleware.TOKEN_VALUE
+        )
+        self.stdout.write(token)
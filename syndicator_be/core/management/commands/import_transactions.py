@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importing import FORMATS, TransactionImporter, detect_format, read_rows
+from core.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Bulk-import transactions with syndicate splits from a CSV or JSONL file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--risk-taker', help="Username used for rows without a risk_taker column")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, write nothing")
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+        if file_format is None:
+            raise CommandError("Can't tell the file format from its extension; pass --format")
+
+        risk_taker = None
+        if options['risk_taker']:
+            risk_taker = CustomUser.objects.filter(username=options['risk_taker']).first()
+            if risk_taker is None:
+                raise CommandError(f"User {options['risk_taker']} does not exist")
+
+        importer = TransactionImporter(
+            risk_taker=risk_taker, allow_risk_taker_column=True,
+            batch_size=options['batch_size'], dry_run=options['dry_run']
+        )
+        started = time.perf_counter()
+        with open(options['path'], 'rb') as file:
+            result = importer.run(read_rows(file, file_format))
+        elapsed = time.perf_counter() - started
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        verb = "Validated" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result.created} of {result.rows} transactions ({result.splits_created} splitwise entries) "
+            f"in {elapsed:.1f}s; {len(result.errors)} rows rejected"
+        ))
@@ -0,0 +1,247 @@
+import calendar
+import itertools
+import random
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import CustomUser, FriendList, FriendRequest, Splitwise, Transactions
+
+# Relative frequency of syndicate sizes (number of splits per transaction)
+SYNDICATE_SIZE_WEIGHTS = {1: 25, 2: 20, 3: 17, 4: 12, 5: 9, 6: 6, 7: 4, 8: 3, 9: 2, 10: 2}
+LOAN_PERIODS = [3, 6, 9, 12, 18, 24, 36]
+INTEREST_RATES = [1.0, 1.25, 1.5, 1.75, 2.0, 2.5, 3.0]
+COMMISSION_RATES = [5, 10, 10, 15, 20, 25, 30]
+
+
+def add_months(start, months):
+    """Return the date `months` calendar months after `start`, clamped to month end"""
+    month_index = start.month - 1 + months
+    year = start.year + month_index // 12
+    month = month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+class Command(BaseCommand):
+    help = "Bulk-insert a deterministic, realistically shaped dataset for scale testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--transactions', type=int, default=100000)
+        parser.add_argument('--friends-per-user', type=int, default=3,
+                            help="Edges added per new user in the preferential-attachment friendship graph")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--anchor-date', type=date.fromisoformat, default=date.today(),
+                            help="Loans start within three years before this date (YYYY-MM-DD)")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='seed', help="Username/email prefix for generated users")
+        parser.add_argument('--password', default='testpass123', help="Password shared by every generated user")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Synthetic clock for UUIDv7 keys, so ids are reproducible and still time-ordered
+        self.clock_ms = 1_700_000_000_000
+
+        started = time.perf_counter()
+        user_ids = self.create_users(options['users'], options['prefix'], options['password'])
+        friends = self.create_friend_graph(user_ids, options['friends_per_user'])
+        split_count = self.create_transactions(user_ids, friends, options['transactions'], options['anchor_date'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(user_ids)} users, {options['transactions']} transactions and "
+            f"{split_count} splitwise entries in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def next_id(self):
+        """Deterministic UUIDv7: synthetic millisecond clock plus seeded random bits"""
+        self.clock_ms += 1
+        value = (self.clock_ms & 0xFFFFFFFFFFFF) << 80
+        value |= 0x7 << 76
+        value |= self.rng.getrandbits(12) << 64
+        value |= 0b10 << 62
+        value |= self.rng.getrandbits(62)
+        return uuid.UUID(int=value)
+
+    def create_users(self, count, prefix, password):
+        password_hash = make_password(password)
+        user_ids = []
+        batch = []
+        for i in range(count):
+            user_id = self.next_id()
+            user_ids.append(user_id)
+            batch.append(CustomUser(
+                user_id=user_id,
+                username=f"{prefix}_{i}",
+                email=f"{prefix}_{i}@example.com",
+                name=f"{prefix.title()} {i}"[:26],
+                password=password_hash,
+            ))
+            if len(batch) >= self.batch_size:
+                CustomUser.objects.bulk_create(batch)
+                batch = []
+        CustomUser.objects.bulk_create(batch)
+        self.stdout.write(f"  users: {count}")
+        return user_ids
+
+    def create_friend_graph(self, user_ids, edges_per_user):
+        """
+        Build a scale-free friendship graph with preferential attachment (Barabasi-Albert):
+        each new user befriends existing users with probability proportional to their degree.
+        """
+        friends = [set() for _ in user_ids]
+        # Every edge endpoint is appended here, so sampling from it is degree-weighted
+        endpoints = []
+        seed_size = min(edges_per_user + 1, len(user_ids))
+        for i in range(seed_size):
+            for j in range(i):
+                friends[i].add(j)
+                friends[j].add(i)
+                endpoints.extend((i, j))
+
+        for i in range(seed_size, len(user_ids)):
+            targets = set()
+            while len(targets) < edges_per_user:
+                targets.add(self.rng.choice(endpoints))
+            for j in targets:
+                friends[i].add(j)
+                friends[j].add(i)
+                endpoints.extend((i, j))
+
+        requests = []
+        request_count = 0
+        for i, neighbours in enumerate(friends):
+            for j in neighbours:
+                if i < j:
+                    sender, recipient = (i, j) if self.rng.random() < 0.5 else (j, i)
+                    requests.append(FriendRequest(
+                        request_id=self.next_id(),
+                        user_id_id=user_ids[sender],
+                        requested_id_id=user_ids[recipient],
+                        status='accepted',
+                    ))
+            # A few requests that never turned into friendships
+            if self.rng.random() < 0.2:
+                j = self.rng.randrange(len(user_ids))
+                if j != i and j not in neighbours:
+                    requests.append(FriendRequest(
+                        request_id=self.next_id(),
+                        user_id_id=user_ids[i],
+                        requested_id_id=user_ids[j],
+                        status=self.rng.choice(['pending', 'pending', 'rejected', 'canceled']),
+                    ))
+            if len(requests) >= self.batch_size:
+                request_count += len(requests)
+                FriendRequest.objects.bulk_create(requests)
+                requests = []
+        request_count += len(requests)
+        FriendRequest.objects.bulk_create(requests)
+
+        friend_list_ids = [self.next_id() for _ in user_ids]
+        for offset in range(0, len(user_ids), self.batch_size):
+            FriendList.objects.bulk_create([
+                FriendList(friend_id=friend_list_ids[i], user_id_id=user_ids[i])
+                for i in range(offset, min(offset + self.batch_size, len(user_ids)))
+            ])
+
+        through = FriendList.mutual_friends.through
+        rows = []
+        for i, neighbours in enumerate(friends):
+            for j in sorted(neighbours):
+                rows.append(through(friendlist_id=friend_list_ids[i], customuser_id=user_ids[j]))
+            if len(rows) >= self.batch_size:
+                through.objects.bulk_create(rows)
+                rows = []
+        through.objects.bulk_create(rows)
+
+        self.stdout.write(f"  friend requests: {request_count}")
+        return [sorted(neighbours) for neighbours in friends]
+
+    def create_transactions(self, user_ids, friends, count, anchor_date):
+        sizes = list(SYNDICATE_SIZE_WEIGHTS)
+        size_weights = list(itertools.accumulate(SYNDICATE_SIZE_WEIGHTS.values()))
+        # Well-connected users originate more loans; cumulative weights keep each draw O(log n)
+        user_indexes = range(len(user_ids))
+        risk_taker_weights = list(itertools.accumulate(len(neighbours) for neighbours in friends))
+
+        transactions = []
+        splits = []
+        split_count = 0
+        for _ in range(count):
+            risk_taker = self.rng.choices(user_indexes, cum_weights=risk_taker_weights)[0]
+            size = min(self.rng.choices(sizes, cum_weights=size_weights)[0], len(friends[risk_taker]) + 1)
+
+            if size == 1:
+                # Solo loan: the risk taker holds the whole principal
+                members = [risk_taker]
+            else:
+                include_risk_taker = self.rng.random() < 0.3
+                friend_count = size - 1 if include_risk_taker else size
+                members = self.sample_friends(friends[risk_taker], friend_count)
+                if include_risk_taker:
+                    members.append(risk_taker)
+
+            principal = round(self.rng.lognormvariate(11, 0.8), -3) or 1000.0
+            interest = self.rng.choice(INTEREST_RATES)
+            commission_flag = size > 1 and self.rng.random() < 0.4
+            months = self.rng.choice(LOAN_PERIODS)
+            start_date = anchor_date - timedelta(days=self.rng.randrange(3 * 365))
+
+            transaction_id = self.next_id()
+            transactions.append(Transactions(
+                transaction_id=transaction_id,
+                risk_taker_id_id=user_ids[risk_taker],
+                syndicators=[{'user_id': str(user_ids[member])} for member in members],
+                total_principal_amount=principal,
+                total_interest=interest,
+                risk_taker_flag=commission_flag,
+                risk_taker_commission=self.rng.choice(COMMISSION_RATES) if commission_flag else 0,
+                start_date=start_date,
+                end_date=add_months(start_date, months),
+                month_period_of_loan=months,
+                lender_name=f"Lender {self.rng.randrange(200)}",
+            ))
+
+            # Split the principal with random shares; the last member takes the rounding remainder
+            shares = [self.rng.random() + 0.1 for _ in members]
+            share_total = sum(shares)
+            remaining = principal
+            for index, member in enumerate(members):
+                if index == len(members) - 1:
+                    amount = round(remaining, 2)
+                else:
+                    amount = round(principal * shares[index] / share_total, 2)
+                    remaining -= amount
+                splits.append(Splitwise(
+                    splitwise_id=self.next_id(),
+                    transaction_id_id=transaction_id,
+                    syndicator_id_id=user_ids[member],
+                    principal_amount=amount,
+                    interest_amount=interest,
+                ))
+
+            if len(splits) >= self.batch_size:
+                split_count += self.flush(transactions, splits)
+                transactions = []
+                splits = []
+        split_count += self.flush(transactions, splits)
+        return split_count
+
+    def sample_friends(self, neighbours, count):
+        """Pick `count` distinct friends without copying the (possibly huge) neighbour list like random.sample does"""
+        if count >= len(neighbours):
+            return list(neighbours)
+        picked = set()
+        while len(picked) < count:
+            picked.add(self.rng.randrange(len(neighbours)))
+        return [neighbours[index] for index in sorted(picked)]
+
+    def flush(self, transactions, splits):
+        with transaction.atomic():
+            Transactions.objects.bulk_create(transactions)
+            Splitwise.objects.bulk_create(splits)
+        return len(splits)
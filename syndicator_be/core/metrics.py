@@ -0,0 +1,168 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Every metric guards its samples with its own lock, so threaded workers can record
+concurrently. Values are per process: with several worker processes each one is
+scraped (or aggregated) separately, as with any in-process Prometheus client.
+"""
+import bisect
+import threading
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for label_values, value in sorted(self.snapshot().items()):
+            yield f"{self.name}{_format_labels(self.label_names, label_values)} {_format_number(value)}"
+
+
+class Histogram:
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (non-cumulative, last is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *label_values):
+        with self._lock:
+            state = self._values.get(label_values)
+            return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(state[0]), state[1], state[2]) for key, state in self._values.items()}
+        for label_values, (bucket_counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, label_values, [('le', _format_number(upper_bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {_format_number(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        lines.extend(self._cache_hit_ratios())
+        return '\n'.join(lines) + '\n'
+
+    def _cache_hit_ratios(self):
+        # Derived gauge so dashboards don't need PromQL to read the hit ratio
+        totals = {}
+        for (cache, result), value in cache_lookups.snapshot().items():
+            hits, lookups = totals.get(cache, (0, 0))
+            totals[cache] = (hits + (value if result == 'hit' else 0), lookups + value)
+        if not totals:
+            return []
+        lines = [
+            "# HELP cache_hit_ratio Fraction of cache lookups that were hits since process start",
+            "# TYPE cache_hit_ratio gauge",
+        ]
+        for cache, (hits, lookups) in sorted(totals.items()):
+            lines.append(f'cache_hit_ratio{{cache="{_escape(cache)}"}} {_format_number(hits / lookups)}')
+        return lines
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    'http_requests_total', "HTTP requests handled, by view, method and status code",
+    ('view', 'method', 'status'),
+))
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', "Request latency in seconds, by view",
+    ('view', 'method'),
+))
+db_queries_per_request = registry.register(Histogram(
+    'db_queries_per_request', "SQL queries issued per request, by view",
+    ('view',), buckets=DEFAULT_QUERY_COUNT_BUCKETS,
+))
+cache_lookups = registry.register(Counter(
+    'cache_lookups_total', "Cache lookups by cache name and result (hit/miss)",
+    ('cache', 'result'),
+))
+coalesced_requests = registry.register(Counter(
+    'coalesced_requests_total', "Coalesced GET requests by view and whether the result was computed or shared",
+    ('view', 'result'),
+))
+
+
+def record_cache_lookup(cache, hit):
+    cache_lookups.inc(cache, 'hit' if hit else 'miss')
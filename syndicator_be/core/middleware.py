@@ -0,0 +1,266 @@
+import cProfile
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+from .instrumentation import QueryRecorder, RequestTimings, activate_timings, deactivate_timings
+
+logger = logging.getLogger('core.request_timing')
+profiling_logger = logging.getLogger('core.request_profiling')
+
+
+class MetricsMiddleware:
+    """
+    Feed the in-process metrics registry: request counts by status, latency and
+    SQL query-count histograms per view. Enabled with METRICS_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryRecorder()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        except Exception:
+            self.record(request, 500, time.perf_counter() - started, queries)
+            raise
+        self.record(request, response.status_code, time.perf_counter() - started, queries)
+        return response
+
+    def record(self, request, status_code, duration, queries):
+        # Label by URL name rather than path to keep label cardinality bounded
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.url_name if resolver_match and resolver_match.url_name else 'unmatched'
+        metrics.http_requests.inc(view, request.method, str(status_code))
+        metrics.http_request_duration.observe(duration, view, request.method)
+        metrics.db_queries_per_request.observe(queries.count, view)
+
+
+def accepts_encoding(request, coding):
+    """Whether Accept-Encoding allows `coding` (honours q=0; a q that won't parse refuses it)"""
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, *params = item.split(';')
+        if name.strip().lower() != coding:
+            continue
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    return float(value.strip()) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Negotiated response compression for large API payloads.
+
+    Prefers brotli when the client accepts it and the optional `brotli` package is
+    installed, otherwise falls back to Django's gzip handling. Responses smaller
+    than COMPRESSION_MIN_BYTES go out as-is.
+    """
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+
+        if (
+            brotli is None
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or not accepts_encoding(request, 'br')
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed_content = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+class RequestTimingMiddleware:
+    """
+    Record SQL query count, DB time, auth, view and serialization time for each request
+    and report them as Server-Timing headers plus one structured log line.
+
+    Enabled with REQUEST_TIMING_ENABLED; when off, Django drops the middleware at startup.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        request._timings = timings
+        token = activate_timings(timings)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timings.queries):
+                response = self.get_response(request)
+        finally:
+            deactivate_timings(token)
+        total = time.perf_counter() - started
+        view_started = getattr(request, '_timing_view_started', None)
+        if 'view' not in timings.durations and view_started is not None:
+            # Plain HttpResponses never reach process_template_response
+            timings.add('view', time.perf_counter() - view_started)
+
+        metrics = [
+            ('db', timings.queries.duration, f"queries={timings.queries.count}"),
+            ('auth', timings.durations.get('auth', 0.0), None),
+            ('view', timings.durations.get('view', 0.0), None),
+            ('serialize', timings.durations.get('serialize', 0.0), None),
+            ('total', total, None),
+        ]
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.2f}' + (f';desc="{description}"' if description else '')
+            for name, duration, description in metrics
+        )
+
+        logger.info(json.dumps({
+            'event': 'request_timing',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': getattr(request, '_timing_view_name', None),
+            'db_queries': timings.queries.count,
+            'db_ms': round(timings.queries.duration * 1000, 3),
+            'auth_ms': round(timings.durations.get('auth', 0.0) * 1000, 3),
+            'view_ms': round(timings.durations.get('view', 0.0) * 1000, 3),
+            'serialize_ms': round(timings.durations.get('serialize', 0.0) * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+        }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing_view_name = getattr(view_func, '__name__', None)
+        request._timing_view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; count rendering as serialization
+        request._timings.add('view', time.perf_counter() - request._timing_view_started)
+        render_started = time.perf_counter()
+        response.add_post_render_callback(
+            lambda rendered: request._timings.add('serialize', time.perf_counter() - render_started)
+        )
+        return response
+
+
+class RequestProfilingMiddleware:
+    """
+    Run a single request under a profiler when asked to, and save the result to
+    REQUEST_PROFILING_DIR so slow endpoints can be analysed against real data.
+
+    A request is profiled when it carries a valid X-Profile-Token header (see the
+    create_profile_token command) or when a staff user adds ?profile=1.
+    Enabled with REQUEST_PROFILING_ENABLED; when off, Django drops the middleware at startup.
+    """
+
+    TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+    TOKEN_SALT = 'core.request_profiling'
+    TOKEN_VALUE = 'profile'
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        if settings.REQUEST_PROFILING_PROFILER == 'pyinstrument':
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+            path = self.output_path(request, 'html')
+            with open(path, 'w') as output:
+                output.write(profiler.output_html())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            path = self.output_path(request, 'pstats')
+            profiler.dump_stats(path)
+
+        profiling_logger.info(json.dumps({'event': 'request_profiled', 'path': request.path, 'output': str(path)}))
+        response['X-Profile-Output'] = path.name
+        return response
+
+    def should_profile(self, request):
+        token = request.META.get(self.TOKEN_HEADER)
+        if token:
+            try:
+                value = signing.TimestampSigner(salt=self.TOKEN_SALT).unsign(
+                    token, max_age=settings.REQUEST_PROFILING_TOKEN_MAX_AGE
+                )
+            except signing.BadSignature:
+                return False
+            return value == self.TOKEN_VALUE
+
+        if request.GET.get('profile') in ('1', 'true'):
+            return self.is_staff_request(request)
+        return False
+
+    def is_staff_request(self, request):
+        # API clients authenticate with JWT inside the view, so check the token up front
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                authenticated = JWTAuthentication().authenticate(Request(request))
+            except (AuthenticationFailed, InvalidToken):
+                return False
+            user = authenticated[0] if authenticated else None
+        return bool(user and user.is_active and user.is_staff)
+
+    def output_path(self, request, extension):
+        directory = Path(settings.REQUEST_PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = request.path.strip('/').replace('/', '_') or 'root'
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        return directory / f"{timestamp}-{slug}-{uuid.uuid4().hex[:8]}.{extension}"
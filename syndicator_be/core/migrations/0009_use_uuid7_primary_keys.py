@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:52
+
+import core.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_transactions_month_period_of_loan'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='user_id',
+            field=models.UUIDField(default=core.utils.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='friendlist',
+            name='friend_id',
+            field=models.UUIDField(default=core.utils.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='friendrequest',
+            name='request_id',
+            field=models.UUIDField(default=core.utils.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='splitwise',
+            name='splitwise_id',
+            field=models.UUIDField(default=core.utils.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='transaction_id',
+            field=models.UUIDField(default=core.utils.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_use_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friendrequest',
+            index=models.Index(fields=['user_id', 'requested_id', 'status'], name='friendreq_sender_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendrequest',
+            index=models.Index(fields=['requested_id', 'user_id', 'status'], name='friendreq_recip_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='splitwise',
+            index=models.Index(fields=['syndicator_id', 'created_at'], name='splitwise_synd_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['risk_taker_id', 'created_at'], name='txn_risk_taker_created_idx'),
+        ),
+    ]
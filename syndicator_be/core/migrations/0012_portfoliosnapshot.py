@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:49
+
+import core.utils
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('snapshot_id', models.UUIDField(default=core.utils.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('principal_outstanding', models.FloatField(default=0)),
+                ('interest_accrued', models.FloatField(default=0)),
+                ('commission_accrued', models.FloatField(default=0)),
+                ('active_loans', models.IntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+                ('user_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='portfolio_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['computed_at'], name='snapshot_computed_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user_id', 'date'), name='snapshot_user_date_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:02
+
+import core.utils
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_portfoliosnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Repayment',
+            fields=[
+                ('repayment_id', models.UUIDField(default=core.utils.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('sequence', models.PositiveIntegerField()),
+                ('paid_on', models.DateField()),
+                ('principal_paid', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('interest_paid', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('outstanding_principal', models.FloatField()),
+                ('interest_paid_total', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('splitwise_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='repayments', to='core.splitwise')),
+                ('transaction_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='repayments', to='core.transactions')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['transaction_id', 'paid_on'], name='repayment_txn_paid_idx')],
+                'constraints': [models.UniqueConstraint(fields=('splitwise_id', 'sequence'), name='repayment_split_sequence_uniq')],
+            },
+        ),
+    ]
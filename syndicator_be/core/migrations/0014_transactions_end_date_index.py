@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_repayment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['risk_taker_id', 'end_date'], name='txn_risk_taker_end_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_transactions_end_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleSnapshotUser',
+            fields=[
+                ('user_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stale_snapshots', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('marked_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,11 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
-import uuid
+from .commission import commission_deducted, interest_after_commission
+from .utils import uuid7
 
 
 class CustomUser(AbstractUser):
-    user_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     name = models.CharField(max_length=26, blank=True, null=True)
@@ -16,7 +18,7 @@ class CustomUser(AbstractUser):
         return self.email
     
 class FriendList(models.Model):
-    friend_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    friend_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     user_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='friend_lists')
     
     # Many-to-Many relationship with CustomUser for mutual friends
@@ -35,14 +37,21 @@ class FriendRequest(models.Model):
         ('canceled', 'Canceled'),
     ]
 
-    request_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    request_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     user_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='sent_friend_requests')
     requested_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='received_friend_requests')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Friendship checks look up both directions of an accepted request
+            models.Index(fields=['user_id', 'requested_id', 'status'], name='friendreq_sender_status_idx'),
+            models.Index(fields=['requested_id', 'user_id', 'status'], name='friendreq_recip_status_idx'),
+        ]
+
 class Transactions(models.Model):
-    transaction_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    transaction_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     risk_taker_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='risk_taker')
     syndicators = models.JSONField(default=list, blank=True)
     total_principal_amount = models.FloatField(validators=[MinValueValidator(0)])
@@ -56,41 +65,128 @@ class Transactions(models.Model):
     lender_name = models.CharField(max_length=26, blank=True, null=True)
     month_period_of_loan = models.IntegerField(blank=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['risk_taker_id', 'created_at'], name='txn_risk_taker_created_idx'),
+            # Maturity calendar: a risk taker's loans ending in a date range
+            models.Index(fields=['risk_taker_id', 'end_date'], name='txn_risk_taker_end_idx'),
+        ]
+
 class Splitwise(models.Model):
-    splitwise_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    splitwise_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     transaction_id = models.ForeignKey(Transactions, on_delete=models.CASCADE, related_name='splitwise_entries')
     # NEW: Associate each split with a specific user
     syndicator_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='splitwise_entries')
     principal_amount = models.FloatField(validators=[MinValueValidator(0)])
     interest_amount = models.FloatField(validators=[MinValueValidator(0)])  # This stores ORIGINAL interest
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['syndicator_id', 'created_at'], name='splitwise_synd_created_idx'),
+        ]
     
     def get_interest_after_commission(self):
         """Calculate interest after commission deduction"""
-        if not self.transaction_id.risk_taker_flag:
-            return self.principal_amount * self.interest_amount / 100
-        
-        # If this entry is for the risk taker, they don't pay commission to themselves
-        if self.syndicator_id == self.transaction_id.risk_taker_id:
-            return self.principal_amount * self.interest_amount / 100
-        
-        # Calculate actual interest amount for this syndicator
-        actual_interest_amount = self.principal_amount * self.interest_amount / 100
-        commission_amount = (self.transaction_id.risk_taker_commission / 100) * actual_interest_amount
-        return max(0, actual_interest_amount - commission_amount)
+        transaction = self.transaction_id
+        return interest_after_commission(
+            self.principal_amount, self.interest_amount, transaction.risk_taker_flag,
+            transaction.risk_taker_commission, self.syndicator_id_id == transaction.risk_taker_id_id
+        )
     
     def get_commission_deducted(self):
         """Get the commission amount deducted from this entry"""
-        if not self.transaction_id.risk_taker_flag:
-            return 0
-        
-        # Risk taker doesn't pay commission to themselves
-        if self.syndicator_id == self.transaction_id.risk_taker_id:
-            return 0
-        
-        actual_interest_amount = self.principal_amount * self.interest_amount / 100
-        commission_amount = (self.transaction_id.risk_taker_commission / 100) * actual_interest_amount
-        return commission_amount
+        transaction = self.transaction_id
+        return commission_deducted(
+            self.principal_amount, self.interest_amount, transaction.risk_taker_flag,
+            transaction.risk_taker_commission, self.syndicator_id_id == transaction.risk_taker_id_id
+        )
+    
+    def get_outstanding_principal(self):
+        """Principal not yet repaid, from the latest Repayment row"""
+        latest = self.repayments.order_by('-sequence').values_list('outstanding_principal', flat=True).first()
+        return self.principal_amount if latest is None else latest
     
     def __str__(self):
-        return f"Split for {self.syndicator_id.username} in transaction {self.transaction_id.transaction_id}"
\ No newline at end of file
+        return f"Split for {self.syndicator_id.username} in transaction {self.transaction_id.transaction_id}"
+
+class IdempotencyKey(models.Model):
+    """Outcome of a request sent with an Idempotency-Key header, replayed to retries"""
+    idempotency_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    user_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path and body
+    # Both null while the first request is still being processed
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'key'], name='idempotency_user_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+class PortfolioSnapshot(models.Model):
+    """A user's net position at the end of one day, written by the snapshot_portfolios command"""
+    snapshot_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    user_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='portfolio_snapshots')
+    date = models.DateField()
+    # Principal of the user's splits in loans running on this date
+    principal_outstanding = models.FloatField(default=0)
+    # Interest after commission accrued on the user's splits up to this date
+    interest_accrued = models.FloatField(default=0)
+    # Commission accrued to the user as risk taker up to this date
+    commission_accrued = models.FloatField(default=0)
+    active_loans = models.IntegerField(default=0)
+    # Start of the command run that wrote the row; the next run picks up changes made since
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Also the index the history range queries use
+            models.UniqueConstraint(fields=['user_id', 'date'], name='snapshot_user_date_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['computed_at'], name='snapshot_computed_idx'),
+        ]
+
+    @property
+    def net_position(self):
+        return self.principal_outstanding + self.interest_accrued + self.commission_accrued
+
+class StaleSnapshotUser(models.Model):
+    """A user whose PortfolioSnapshot history the next snapshot_portfolios run rewrites"""
+    user_id = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='stale_snapshots')
+    # Last change to the user's transactions or splits
+    marked_at = models.DateTimeField()
+
+class Repayment(models.Model):
+    """A repayment posted to a split, with the split's running balances after it"""
+    repayment_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    transaction_id = models.ForeignKey(Transactions, on_delete=models.CASCADE, related_name='repayments')
+    splitwise_id = models.ForeignKey(Splitwise, on_delete=models.CASCADE, related_name='repayments')
+    # 1-based position in the split's ledger; the highest one holds the current balances
+    sequence = models.PositiveIntegerField()
+    paid_on = models.DateField()
+    principal_paid = models.FloatField(default=0, validators=[MinValueValidator(0)])
+    interest_paid = models.FloatField(default=0, validators=[MinValueValidator(0)])
+    # Running balances of the split after this repayment
+    outstanding_principal = models.FloatField()
+    interest_paid_total = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Also the index the latest-row lookups use
+            models.UniqueConstraint(fields=['splitwise_id', 'sequence'], name='repayment_split_sequence_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['transaction_id', 'paid_on'], name='repayment_txn_paid_idx'),
+        ]
+
+    def __str__(self):
+        return f"Repayment {self.sequence} of split {self.splitwise_id_id}"
@@ -0,0 +1,32 @@
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    JSON renderer backed by orjson.
+
+    UUIDs, dates, datetimes and floats are serialized natively; anything orjson
+    doesn't know (Decimal, lazy strings, querysets...) goes through DRF's own
+    JSONEncoder, and payloads orjson rejects outright (integers beyond 64 bits)
+    are rendered by the stock JSONRenderer. The output parses to the same value as
+    JSONRenderer's, with two differences in the bytes: floats in exponent notation
+    are shortest-form ("1e16", not "1e+16"), and NaN / Infinity render as null
+    where JSONRenderer raises.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    # UTC datetimes end in "Z" like DRF's encoder; int/float/bool/None keys become strings like json.dumps
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    _fallback = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        try:
+            return orjson.dumps(data, default=self._fallback, option=self.options)
+        except orjson.JSONEncodeError:
+            return JSONRenderer().render(data, accepted_media_type, renderer_context)
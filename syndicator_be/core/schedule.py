@@ -0,0 +1,189 @@
+"""
+Repayment schedules derived from month_period_of_loan.
+
+Each split pays its monthly interest (principal_amount * interest_amount / 100, net
+of the risk taker's commission) on the same day of the month as start_date for
+month_period_of_loan months, clamped to the end of shorter months, and returns its
+principal with the last installment. The commission deducted from each installment
+is paid to the risk taker on the same dates. Interest accrues day by day within each
+period (accrued_periods).
+
+Schedules are built for many transactions at once as NumPy structured arrays
+(one row per split and installment) and cached per transaction, which never changes
+once created; core.signals drops the cached schedule if it is edited or deleted.
+"""
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .commission import commission_columns
+from .models import Splitwise
+
+SCHEDULE_CACHE_KEY = 'core:schedule:{transaction_id}'
+
+# Columns a schedule is built from, one row per split
+SCHEDULE_SPLIT_COLUMNS = (
+    'transaction_id', 'splitwise_id', 'syndicator_id', 'principal_amount', 'interest_amount',
+    'transaction_id__risk_taker_id', 'transaction_id__risk_taker_flag',
+    'transaction_id__risk_taker_commission', 'transaction_id__start_date',
+    'transaction_id__month_period_of_loan',
+)
+
+# One row per split and installment. Ids are raw UUID bytes, so schedules pickle
+# and compare without Python objects; see uuid_bytes() / to_uuids().
+SCHEDULE_DTYPE = np.dtype([
+    ('transaction_id', 'V16'),
+    ('splitwise_id', 'V16'),
+    ('syndicator_id', 'V16'),
+    ('risk_taker_id', 'V16'),
+    ('installment', 'i4'),  # 1-based
+    ('installments', 'i4'),  # month_period_of_loan
+    ('due_date', 'datetime64[D]'),
+    ('interest', 'f8'),  # after commission, paid to the syndicator
+    ('commission', 'f8'),  # deducted from the interest, paid to the risk taker
+    ('principal', 'f8'),  # returned to the syndicator with the last installment
+])
+
+
+def uuid_bytes(values):
+    """UUIDs (or a single UUID) as V16 values comparable with schedule id columns"""
+    if isinstance(values, uuid.UUID):
+        return np.void(values.bytes)
+    return np.frombuffer(b''.join(value.bytes for value in values), dtype='V16')
+
+
+def to_uuids(values):
+    return [uuid.UUID(bytes=value.tobytes()) for value in values]
+
+
+def add_months(start_dates, months):
+    """
+    Vectorized seed_scale_data.add_months: the dates `months` calendar months after
+    `start_dates` (datetime64[D] arrays, broadcast against `months`), clamped to month end
+    """
+    start_dates = np.asarray(start_dates, dtype='datetime64[D]')
+    start_months = start_dates.astype('datetime64[M]')
+    day_of_month = (start_dates - start_months.astype('datetime64[D]')).astype(np.int64)
+    target_months = start_months.astype(np.int64) + np.asarray(months, dtype=np.int64)
+    if target_months.size == 0:
+        return target_months.astype('datetime64[D]')
+
+    # Calendar conversions are slow per element: look month starts up in a table of the months involved
+    first_month = target_months.min()
+    month_starts = np.arange(first_month, target_months.max() + 2).astype('datetime64[M]').astype('datetime64[D]')
+    month_starts = month_starts.astype(np.int64)
+    position = target_months - first_month
+    days_in_month = month_starts[position + 1] - month_starts[position]
+    return (month_starts[position] + np.minimum(day_of_month, days_in_month - 1)).astype('datetime64[D]')
+
+
+def accrued_periods(start_dates, end_dates, months, as_of):
+    """
+    Monthly interest periods each loan has accrued by `as_of`: installments already
+    due (see build_schedules) plus the elapsed part of the current period, by day
+    count. Accrual stops after `months` periods or at end_date, whichever is first.
+    `as_of` is a date or an array of dates broadcast against the loans.
+    """
+    start_dates = np.asarray(start_dates, dtype='datetime64[D]')
+    months = np.asarray(months, dtype=np.int64)
+    start_months = start_dates.astype('datetime64[M]').astype(np.int64)
+
+    def periods(as_of):
+        as_of = np.asarray(as_of, dtype='datetime64[D]')
+        # Whole periods: calendar months between the dates, less one if the day of month isn't reached yet
+        whole = as_of.astype('datetime64[M]').astype(np.int64) - start_months
+        whole = whole - (add_months(start_dates, whole) > as_of)
+        whole = np.clip(whole, 0, np.maximum(months, 0))
+
+        period_start = add_months(start_dates, whole)
+        period_days = (add_months(start_dates, whole + 1) - period_start).astype(np.float64)
+        elapsed_days = np.maximum((as_of - period_start).astype(np.float64), 0)
+        return np.where(whole < months, whole + elapsed_days / period_days, whole)
+
+    # Accrual only grows with the date, so stopping at end_date is a minimum
+    return np.minimum(periods(as_of), periods(end_dates))
+
+
+def build_schedules(splits):
+    """
+    Schedule (SCHEDULE_DTYPE rows, in split order) of every split in `splits`, tuples
+    of SCHEDULE_SPLIT_COLUMNS values, computed in one vectorized pass
+    """
+    splits = list(splits)
+    if not splits:
+        return np.empty(0, dtype=SCHEDULE_DTYPE)
+    (transaction_ids, splitwise_ids, syndicator_ids, principal_amount, interest_amount,
+     risk_taker_ids, commission_flags, commission_rates, start_dates, months) = zip(*splits)
+
+    months = np.maximum(np.asarray(months, dtype=np.int64), 0)
+    syndicator_ids = uuid_bytes(syndicator_ids)
+    risk_taker_ids = uuid_bytes(risk_taker_ids)
+    amounts = commission_columns(
+        principal_amount, interest_amount, commission_flags, commission_rates, syndicator_ids == risk_taker_ids
+    )
+
+    # Row i of the schedule is installment `installment[i]` of split `rows[i]`
+    rows = np.repeat(np.arange(len(splits)), months)
+    first_rows = np.cumsum(months) - months
+    installment = np.arange(len(rows)) - first_rows[rows] + 1
+
+    schedule = np.empty(len(rows), dtype=SCHEDULE_DTYPE)
+    schedule['transaction_id'] = uuid_bytes(transaction_ids)[rows]
+    schedule['splitwise_id'] = uuid_bytes(splitwise_ids)[rows]
+    schedule['syndicator_id'] = syndicator_ids[rows]
+    schedule['risk_taker_id'] = risk_taker_ids[rows]
+    schedule['installment'] = installment
+    schedule['installments'] = months[rows]
+    schedule['due_date'] = add_months(np.asarray(start_dates, dtype='datetime64[D]')[rows], installment)
+    schedule['interest'] = amounts.interest_after_commission[rows]
+    schedule['commission'] = amounts.commission_deducted[rows]
+    schedule['principal'] = np.where(installment == months[rows], np.asarray(principal_amount)[rows], 0.0)
+    return schedule
+
+
+def get_schedules(transaction_ids):
+    """
+    Schedule of the given transactions, in that order. Cached schedules are reused;
+    the others are built together from one Splitwise query and cached.
+    """
+    transaction_ids = list(transaction_ids)
+    keys = {transaction_id: SCHEDULE_CACHE_KEY.format(transaction_id=transaction_id) for transaction_id in transaction_ids}
+    cached = cache.get_many(keys.values())
+    schedules = {
+        transaction_id: cached[key] for transaction_id, key in keys.items() if key in cached
+    }
+
+    missing = [transaction_id for transaction_id in transaction_ids if transaction_id not in schedules]
+    if missing:
+        splits = list(Splitwise.objects.filter(transaction_id__in=missing).order_by(
+            'transaction_id', 'pk'
+        ).values_list(*SCHEDULE_SPLIT_COLUMNS))
+        built = build_schedules(splits)
+        # Splits come grouped by transaction, so each transaction's rows are contiguous
+        new_schedules = {}
+        row = 0
+        for split in splits:
+            transaction_id = split[0]
+            if transaction_id not in new_schedules:
+                new_schedules[transaction_id] = row
+            row += max(split[-1], 0)
+        boundaries = [*new_schedules.values(), len(built)]
+        for (transaction_id, start), stop in zip(new_schedules.items(), boundaries[1:]):
+            new_schedules[transaction_id] = built[start:stop].tobytes()
+        for transaction_id in missing:
+            # Transactions without splits get an empty schedule, cached too
+            new_schedules.setdefault(transaction_id, b'')
+        cache.set_many(
+            {keys[transaction_id]: schedule for transaction_id, schedule in new_schedules.items()},
+            timeout=settings.SCHEDULE_CACHE_TIMEOUT
+        )
+        schedules.update(new_schedules)
+
+    # Cached as raw row bytes, which pickle much faster than structured arrays
+    return np.frombuffer(b''.join(schedules[transaction_id] for transaction_id in transaction_ids), dtype=SCHEDULE_DTYPE)
+
+
+def invalidate_schedules(transaction_ids):
+    cache.delete_many([SCHEDULE_CACHE_KEY.format(transaction_id=transaction_id) for transaction_id in transaction_ids])
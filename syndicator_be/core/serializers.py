@@ -18,6 +18,16 @@ class RegisterSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer that takes an optional `fields` argument limiting which fields are output"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
 # Updated Splitwise Serializer with Commission Support
 class SplitwiseSerializer(serializers.ModelSerializer):
     syndicator_username = serializers.CharField(source='syndicator_id.username', read_only=True)
@@ -53,10 +63,10 @@ class SplitwiseSerializer(serializers.ModelSerializer):
         return obj.get_commission_deducted()
     
     def get_is_risk_taker(self, obj):
-        return obj.syndicator_id == obj.transaction_id.risk_taker_id
+        return obj.syndicator_id_id == obj.transaction_id.risk_taker_id_id
 
 # Updated Portfolio Serializer with Commission Support
-class PortfolioSerializer(serializers.ModelSerializer):
+class PortfolioSerializer(DynamicFieldsModelSerializer):
     splitwise_entries = SplitwiseSerializer(many=True, read_only=True)
     risk_taker_username = serializers.CharField(source='risk_taker_id.username', read_only=True)
     risk_taker_name = serializers.CharField(source='risk_taker_id.name', read_only=True)
@@ -94,7 +104,9 @@ class PortfolioSerializer(serializers.ModelSerializer):
         
         # Sum up all commission deducted from syndicators (excluding risk taker)
         total_commission = 0
-        for entry in obj.splitwise_entries.exclude(syndicator_id=obj.risk_taker_id):
-            total_commission += entry.get_commission_deducted()
+        # Filter in Python so a prefetched splitwise_entries cache is reused
+        for entry in obj.splitwise_entries.all():
+            if entry.syndicator_id_id != obj.risk_taker_id_id:
+                total_commission += entry.get_commission_deducted()
         
         return total_commission
\ No newline at end of file
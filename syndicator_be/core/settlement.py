@@ -0,0 +1,82 @@
+"""
+Netting of the repayments due in a settlement cycle.
+
+For every installment due in the cycle (see core.schedule), the risk taker owes the
+syndicator the interest after commission plus any principal returned; the
+commission deducted stays with the risk taker. A risk taker's own splits are not
+obligations. Summed per user, these obligations give each user's net balance, and
+the balances are settled with at most one transfer fewer than the number of users
+with a non-zero balance: the largest debtor repeatedly pays the largest creditor
+(greedy, with two heaps).
+
+Amounts are netted in integer cents, so balances sum to exactly zero and the
+transfers settle them exactly.
+"""
+import heapq
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass
+class Settlement:
+    user_ids: np.ndarray  # V16 ids of the users involved, sorted
+    balances: np.ndarray  # cents each user receives (positive) or pays (negative) net
+    receivable: np.ndarray  # cents owed to each user before netting
+    payable: np.ndarray  # cents each user owes before netting
+    obligations: int = 0  # distinct (payer, payee) pairs before netting
+    transfers: list = field(default_factory=list)  # [(payer index, payee index, cents)], into user_ids
+
+
+def schedule_obligations(schedule):
+    """(payer ids, payee ids, cents) of each installment in a SCHEDULE_DTYPE array"""
+    owed = schedule[schedule['syndicator_id'] != schedule['risk_taker_id']]
+    cents = np.rint((owed['interest'] + owed['principal']) * 100).astype(np.int64)
+    owed = owed[cents > 0]
+    return owed['risk_taker_id'], owed['syndicator_id'], cents[cents > 0]
+
+
+def net_balances(payers, payees, cents):
+    """Sorted user ids with the cents each is owed, owes and nets (V16 id arrays)"""
+    user_ids, index = np.unique(np.concatenate([payers, payees]), return_inverse=True)
+    payer_index, payee_index = index[:len(payers)], index[len(payers):]
+    payable = np.zeros(len(user_ids), dtype=np.int64)
+    receivable = np.zeros(len(user_ids), dtype=np.int64)
+    np.add.at(payable, payer_index, cents)
+    np.add.at(receivable, payee_index, cents)
+    pairs = len(np.unique(payer_index * len(user_ids) + payee_index))
+    return user_ids, receivable, payable, pairs
+
+
+def minimal_transfers(balances):
+    """
+    Greedy transfers (payer index, payee index, cents) settling `balances`, which
+    must sum to zero. Each transfer clears the smaller of the largest debt and the
+    largest credit, so at least one of them drops out every round.
+    """
+    debtors = [(balance, index) for index, balance in enumerate(balances.tolist()) if balance < 0]
+    creditors = [(-balance, index) for index, balance in enumerate(balances.tolist()) if balance > 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+
+    transfers = []
+    while debtors and creditors:
+        debt, payer = heapq.heappop(debtors)
+        credit, payee = heapq.heappop(creditors)
+        amount = min(-debt, -credit)
+        transfers.append((payer, payee, amount))
+        if debt + amount < 0:
+            heapq.heappush(debtors, (debt + amount, payer))
+        if credit + amount < 0:
+            heapq.heappush(creditors, (credit + amount, payee))
+    return transfers
+
+
+def settle(schedule):
+    """Settlement of every installment in `schedule` (SCHEDULE_DTYPE rows of one cycle)"""
+    user_ids, receivable, payable, pairs = net_balances(*schedule_obligations(schedule))
+    balances = receivable - payable
+    return Settlement(
+        user_ids=user_ids, balances=balances, receivable=receivable, payable=payable,
+        obligations=pairs, transfers=minimal_transfers(balances),
+    )
@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .coalescing import bump_data_version
+from .models import Splitwise, Transactions
+from .schedule import invalidate_schedules
+from .snapshots import mark_stale
+
+
+def bump_transaction_members(transaction_id, user_ids):
+    """
+    After commit, bump the data version of everyone who sees the transaction: its risk
+    taker and every syndicator (their listings embed all of its splits). Bumping after
+    commit means no request can compute a new version's result from uncommitted data.
+    The transaction's cached repayment schedule is dropped at the same time.
+    """
+    def bump():
+        invalidate_schedules([transaction_id])
+        members = Splitwise.objects.filter(transaction_id=transaction_id).values_list(
+            'syndicator_id', 'transaction_id__risk_taker_id'
+        )
+        bump_data_version([*user_ids, *(user_id for member in members for user_id in member)])
+
+    transaction.on_commit(bump)
+
+
+@receiver([post_save, post_delete], sender=Transactions)
+def transaction_changed(sender, instance, **kwargs):
+    bump_transaction_members(instance.pk, [instance.risk_taker_id_id])
+    # Dates, amounts and commission all feed the members' portfolio snapshots;
+    # marked in the same database transaction as the change
+    mark_stale([
+        instance.risk_taker_id_id,
+        *Splitwise.objects.filter(transaction_id=instance.pk).values_list('syndicator_id', flat=True),
+    ])
+
+
+@receiver([post_save, post_delete], sender=Splitwise)
+def splitwise_changed(sender, instance, **kwargs):
+    user_ids = [instance.syndicator_id_id]
+    if Splitwise.transaction_id.is_cached(instance):
+        user_ids.append(instance.transaction_id.risk_taker_id_id)
+    bump_transaction_members(instance.transaction_id_id, user_ids)
+    if len(user_ids) == 1:
+        user_ids.extend(Transactions.objects.filter(pk=instance.transaction_id_id).values_list('risk_taker_id', flat=True))
+    mark_stale(user_ids)
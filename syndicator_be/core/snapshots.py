@@ -0,0 +1,227 @@
+"""
+Daily PortfolioSnapshot rows for the portfolio history charts.
+
+A user's position on a day is the principal of their splits in loans running that
+day (start_date <= day < end_date), the interest after commission accrued on their
+splits so far and the commission accrued to them as risk taker so far (see
+core.schedule.accrued_periods). Rows are computed for a whole range of days at once
+from the user's splits, as (days x splits) arrays.
+
+Each run of snapshot_portfolios extends every user's rows up to the target date and
+rewrites past rows only for users whose data changed since the previous run: users
+with splits created since (bulk imports included) and users core.signals marked
+stale when one of their transactions or splits was created, edited or deleted. A
+rewritten history starts at the user's earliest loan; users left without splits
+lose their snapshots.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .commission import commission_columns
+from .models import PortfolioSnapshot, Splitwise, StaleSnapshotUser
+from .schedule import accrued_periods
+
+# Days computed per (days x splits) block, to bound memory for long histories
+DAYS_PER_BLOCK = 92
+
+SNAPSHOT_SPLIT_COLUMNS = (
+    'syndicator_id', 'transaction_id__risk_taker_id', 'principal_amount', 'interest_amount',
+    'transaction_id__risk_taker_flag', 'transaction_id__risk_taker_commission',
+    'transaction_id__start_date', 'transaction_id__end_date', 'transaction_id__month_period_of_loan',
+)
+
+
+@dataclass
+class SnapshotResult:
+    users: int = 0
+    rows: int = 0
+
+
+def last_run():
+    return PortfolioSnapshot.objects.aggregate(last=Max('computed_at'))['last']
+
+
+def touched_user_ids(since):
+    """Syndicators and risk takers of splits created after `since` (everyone with splits if None)"""
+    splits = Splitwise.objects.all() if since is None else Splitwise.objects.filter(created_at__gt=since)
+    user_ids = set()
+    for syndicator_id, risk_taker_id in splits.values_list('syndicator_id', 'transaction_id__risk_taker_id'):
+        user_ids.add(syndicator_id)
+        user_ids.add(risk_taker_id)
+    return user_ids
+
+
+def mark_stale(user_ids):
+    """Have the next snapshot run rewrite these users' history"""
+    now = timezone.now()
+    StaleSnapshotUser.objects.bulk_create(
+        [StaleSnapshotUser(user_id_id=user_id, marked_at=now) for user_id in set(user_ids) if user_id is not None],
+        update_conflicts=True, unique_fields=['user_id'], update_fields=['marked_at'],
+    )
+
+
+def clear_stale(stale):
+    """Drop the markers read at the start of a run, unless they were marked again since"""
+    items = list(stale.items())
+    for position in range(0, len(items), 500):
+        condition = Q()
+        for user_id, marked_at in items[position:position + 500]:
+            condition |= Q(user_id=user_id, marked_at=marked_at)
+        StaleSnapshotUser.objects.filter(condition).delete()
+
+
+def position_series(own_splits, arranged_splits, days):
+    """
+    Snapshot columns for each of `days` (datetime64[D] array) from the user's own
+    splits and the splits of loans they are the risk taker of, both lists of
+    SNAPSHOT_SPLIT_COLUMNS tuples
+    """
+    def columns(splits):
+        values = list(zip(*splits)) if splits else [()] * len(SNAPSHOT_SPLIT_COLUMNS)
+        syndicator_ids, risk_taker_ids, principal, interest, flags, rates, starts, ends, months = values
+        is_risk_taker = [syndicator_id == risk_taker_id for syndicator_id, risk_taker_id in zip(syndicator_ids, risk_taker_ids)]
+        amounts = commission_columns(principal, interest, flags, rates, is_risk_taker)
+        return (
+            np.asarray(principal, dtype=np.float64), amounts,
+            np.asarray(starts, dtype='datetime64[D]'), np.asarray(ends, dtype='datetime64[D]'),
+            np.asarray(months, dtype=np.int64),
+        )
+
+    principal, own_amounts, own_starts, own_ends, own_months = columns(own_splits)
+    _, arranged_amounts, arranged_starts, arranged_ends, arranged_months = columns(arranged_splits)
+
+    blocks = []
+    for block in range(0, len(days), DAYS_PER_BLOCK):
+        as_of = days[block:block + DAYS_PER_BLOCK].reshape(-1, 1)
+        active = (own_starts <= as_of) & (as_of < own_ends)
+        own_periods = accrued_periods(own_starts, own_ends, own_months, as_of)
+        arranged_periods = accrued_periods(arranged_starts, arranged_ends, arranged_months, as_of)
+        blocks.append((
+            (active * principal).sum(axis=1),
+            (own_periods * own_amounts.interest_after_commission).sum(axis=1),
+            (arranged_periods * arranged_amounts.commission_deducted).sum(axis=1),
+            active.sum(axis=1),
+        ))
+    names = ('principal_outstanding', 'interest_accrued', 'commission_accrued', 'active_loans')
+    return {
+        name: np.concatenate([block[position] for block in blocks]) if blocks else np.zeros(0)
+        for position, name in enumerate(names)
+    }
+
+
+class SnapshotBuilder:
+    """
+    Write PortfolioSnapshot rows up to `until` (a date). `full` rewrites every user's
+    history; `start_date` is the earliest day written for users without history.
+    """
+
+    def __init__(self, until, full=False, start_date=None, batch_size=200):
+        self.until = until
+        self.full = full
+        self.start_date = start_date
+        self.batch_size = batch_size
+
+    def run(self):
+        started = timezone.now()
+        since = None if self.full else last_run()
+        stale = dict(StaleSnapshotUser.objects.values_list('user_id', 'marked_at'))
+        touched = touched_user_ids(since) | set(stale)
+        if self.full:
+            # Includes users whose splits are all gone since their snapshots were written
+            touched.update(PortfolioSnapshot.objects.values_list('user_id', flat=True).distinct())
+
+        # Users with history that isn't touched only need the days after their last row
+        latest = dict(
+            PortfolioSnapshot.objects.values('user_id').annotate(latest=Max('date')).values_list('user_id', 'latest')
+        )
+        first_days = {}
+        for user_id, latest_date in latest.items():
+            if user_id not in touched and latest_date < self.until:
+                first_days[user_id] = latest_date + timedelta(days=1)
+        touched_user_list = list(touched)
+        for position in range(0, len(touched_user_list), self.batch_size):
+            batch = touched_user_list[position:position + self.batch_size]
+            starts = self.history_start(batch)
+            self.drop_outdated(batch, starts)
+            first_days.update(starts)
+
+        result = SnapshotResult()
+        user_ids = sorted(user_id for user_id, first_day in first_days.items() if first_day <= self.until)
+        for position in range(0, len(user_ids), self.batch_size):
+            batch = user_ids[position:position + self.batch_size]
+            result.rows += self.write_batch({user_id: first_days[user_id] for user_id in batch}, started)
+            result.users += len(batch)
+        clear_stale(stale)
+        return result
+
+    def history_start(self, user_ids):
+        """Earliest loan start of touched users that still have splits"""
+        starts = {}
+        for lookup in ('syndicator_id', 'transaction_id__risk_taker_id'):
+            rows = Splitwise.objects.filter(**{f'{lookup}__in': user_ids}).values(lookup).annotate(
+                first=Min('transaction_id__start_date')
+            ).values_list(lookup, 'first')
+            for user_id, first in rows:
+                starts[user_id] = min(first, starts.get(user_id, first))
+        return starts
+
+    def drop_outdated(self, user_ids, starts):
+        """
+        Delete the rows a rewrite of these users won't overwrite: everything for users
+        without splits, and days before the earliest loan (which may have been
+        edited or deleted) for the others. Then clamp `starts` to --start-date.
+        """
+        outdated = Q(user_id__in=[user_id for user_id in user_ids if user_id not in starts])
+        for user_id, first in starts.items():
+            outdated |= Q(user_id=user_id, date__lt=first)
+        PortfolioSnapshot.objects.filter(outdated).delete()
+        if self.start_date is not None:
+            for user_id, first in starts.items():
+                starts[user_id] = max(first, self.start_date)
+
+    def write_batch(self, first_days, computed_at):
+        user_ids = list(first_days)
+        own_splits = defaultdict(list)
+        arranged_splits = defaultdict(list)
+        splits = Splitwise.objects.filter(
+            Q(syndicator_id__in=user_ids) | Q(transaction_id__risk_taker_id__in=user_ids)
+        ).values_list(*SNAPSHOT_SPLIT_COLUMNS)
+        for split in splits:
+            if split[0] in first_days:
+                own_splits[split[0]].append(split)
+            if split[1] in first_days:
+                arranged_splits[split[1]].append(split)
+
+        written = 0
+        snapshots = []
+        for user_id, first_day in first_days.items():
+            days = np.arange(np.datetime64(first_day, 'D'), np.datetime64(self.until, 'D') + 1)
+            series = position_series(own_splits[user_id], arranged_splits[user_id], days)
+            snapshots.extend(
+                PortfolioSnapshot(
+                    user_id_id=user_id, date=day, principal_outstanding=principal,
+                    interest_accrued=interest, commission_accrued=commission,
+                    active_loans=active_loans, computed_at=computed_at,
+                )
+                for day, principal, interest, commission, active_loans in zip(
+                    days.tolist(), series['principal_outstanding'].tolist(), series['interest_accrued'].tolist(),
+                    series['commission_accrued'].tolist(), series['active_loans'].tolist()
+                )
+            )
+            if len(snapshots) >= 10000:
+                written += self.save(snapshots)
+                snapshots = []
+        return written + self.save(snapshots)
+
+    def save(self, snapshots):
+        # Upsert: rewritten days keep their row and get the new values
+        PortfolioSnapshot.objects.bulk_create(
+            snapshots, batch_size=1000, update_conflicts=True, unique_fields=['user_id', 'date'],
+            update_fields=['principal_outstanding', 'interest_accrued', 'commission_accrued', 'active_loans', 'computed_at'],
+        )
+        return len(snapshots)
@@ -3,8 +3,56 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import CustomUser, Transactions, Splitwise, FriendRequest
-from datetime import date
+from .models import CustomUser, FriendList, Transactions, Splitwise, FriendRequest, IdempotencyKey, PortfolioSnapshot, Repayment, StaleSnapshotUser
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import base64
+import gzip
+import unittest
+from unittest import mock
+import uuid
+import os
+import random
+import numpy as np
+from collections import defaultdict
+import tempfile
+import threading
+from django.conf import settings
+from django.core.management import call_command
+from django.core import signing
+from django.db import connection
+from django.db.models import Prefetch
+import pstats
+from io import StringIO
+import json
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+from .management.commands.benchmark_sqlite import open_connection
+from .utils import uuid7
+from .commission import commission_columns, commission_deducted, interest_after_commission
+from .fast_serializers import PortfolioReader
+from .management.commands.seed_scale_data import add_months
+from .schedule import (
+    SCHEDULE_CACHE_KEY, accrued_periods, add_months as add_months_vectorized, build_schedules, get_schedules, uuid_bytes
+)
+from .ledger import post_repayments, with_balances
+from .settlement import minimal_transfers
+from .serializers import PortfolioSerializer
+from . import metrics
+from .middleware import accepts_encoding, brotli
+from .authentication import TimedJWTAuthentication
+from .idempotency import request_fingerprint
+from .coalescing import CacheSingleFlight, SingleFlight, coalesced, coalescing_key, get_data_version
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 
 class TransactionBusinessLogicTests(APITestCase):
     def setUp(self):
@@ -376,3 +424,2061 @@ class SplitwiseModelTests(TestCase):
         
         self.assertEqual(syndicator_entry.get_interest_after_commission(), expected_interest_after_commission)
         self.assertEqual(syndicator_entry.get_commission_deducted(), expected_commission)
+
+
+class SQLiteProductionProfileTests(TestCase):
+    def test_production_pragmas_applied_on_connect(self):
+        """Test that the production SQLite profile switches to WAL with relaxed fsync"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = open_connection(os.path.join(tmp_dir, 'profile.sqlite3'), settings.SQLITE_PRODUCTION_OPTIONS)
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -65536)
+            conn.close()
+
+        self.assertEqual(settings.SQLITE_PRODUCTION_OPTIONS['transaction_mode'], 'IMMEDIATE')
+
+
+class UUID7Tests(TestCase):
+    def test_uuid7_version_and_variant(self):
+        """Test that generated ids are RFC 9562 version 7 UUIDs"""
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, 'specified in RFC 4122')
+
+    def test_uuid7_is_time_ordered(self):
+        """Test that ids generated in sequence sort in creation order, even within one millisecond"""
+        values = [uuid7() for _ in range(5000)]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(len(set(values)), len(values))
+
+    def test_models_use_uuid7_primary_keys(self):
+        """Test that new rows get time-ordered primary keys"""
+        first = CustomUser.objects.create_user(username='first', email='first@test.com', password='testpass123')
+        second = CustomUser.objects.create_user(username='second', email='second@test.com', password='testpass123')
+        self.assertEqual(first.user_id.version, 7)
+        self.assertLess(first.pk, second.pk)
+        self.assertEqual(list(CustomUser.objects.order_by('-pk')), [second, first])
+
+    def test_listings_order_legacy_uuid4_rows_by_created_at(self):
+        """Test that rows keeping their pre-migration uuid4 keys still list by recency"""
+        user = CustomUser.objects.create_user(username='legacy', email='legacy@test.com', password='testpass123')
+        loan = Transactions.objects.create(
+            risk_taker_id=user, total_principal_amount=200, total_interest=2, month_period_of_loan=1,
+            start_date=date(2024, 1, 1), end_date=date(2024, 2, 1)
+        )
+        # A legacy row with a random key that sorts after every UUIDv7 key
+        legacy = Splitwise.objects.create(
+            splitwise_id=uuid.UUID('ffffffff-ffff-4fff-bfff-ffffffffffff'), transaction_id=loan,
+            syndicator_id=user, principal_amount=100, interest_amount=2
+        )
+        Splitwise.objects.filter(pk=legacy.pk).update(created_at=legacy.created_at - timedelta(days=365))
+        recent = Splitwise.objects.create(transaction_id=loan, syndicator_id=user, principal_amount=100, interest_amount=2)
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        for query in ('', '?fields=splitwise_id,principal_amount'):
+            response = client.get(reverse('user_splitwise') + query)
+            self.assertEqual(
+                [entry['splitwise_id'] for entry in response.data['splitwise_entries']], [str(recent.pk), str(legacy.pk)]
+            )
+
+
+class QueryPlanRegressionTests(APITestCase):
+    """Guard the hot read endpoints against sequential scans and N+1 query regressions"""
+
+    # Maximum number of SQL queries each endpoint may issue, independent of data volume
+    QUERY_BUDGETS = {
+        'portfolio': 3,
+        'syndicate': 2,
+        'check_friend_request_status': 2,
+        'all_transaction': 4,
+        'user_splitwise': 2,
+        'transaction_splitwise': 2,
+        'timeline': 1,
+        'portfolio_history': 1,
+        'exposure': 2,
+        'settlement': 3,
+        'transaction_repayments': 4,
+        'maturity_calendar': 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        cls.users = CustomUser.objects.bulk_create([
+            CustomUser(username=f'user{i}', email=f'user{i}@test.com', password='!')
+            for i in range(300)
+        ])
+
+        friend_requests = []
+        for i, user in enumerate(cls.users):
+            for offset in range(1, 6):
+                friend_requests.append(FriendRequest(
+                    user_id=user,
+                    requested_id=cls.users[(i + offset) % len(cls.users)],
+                    status=rng.choice(['accepted', 'accepted', 'pending', 'rejected'])
+                ))
+        FriendRequest.objects.bulk_create(friend_requests)
+
+        friend_lists = FriendList.objects.bulk_create([FriendList(user_id=user) for user in cls.users])
+        through = FriendList.mutual_friends.through
+        through.objects.bulk_create([
+            through(friendlist_id=friend_list.pk, customuser_id=cls.users[(i + offset) % len(cls.users)].pk)
+            for i, friend_list in enumerate(friend_lists)
+            for offset in range(1, 6)
+        ])
+
+        transactions = []
+        splits = []
+        for i in range(2000):
+            transaction = Transactions(
+                risk_taker_id=rng.choice(cls.users),
+                total_principal_amount=1000,
+                total_interest=2,
+                risk_taker_flag=i % 2 == 0,
+                risk_taker_commission=10 if i % 2 == 0 else 0,
+                month_period_of_loan=12,
+                start_date=date(2024, 1, 1),
+                end_date=date(2025, 1, 1),
+            )
+            transactions.append(transaction)
+            for syndicator in rng.sample(cls.users, rng.randint(1, 5)):
+                splits.append(Splitwise(
+                    transaction_id=transaction,
+                    syndicator_id=syndicator,
+                    principal_amount=200,
+                    interest_amount=2
+                ))
+        Transactions.objects.bulk_create(transactions)
+        Splitwise.objects.bulk_create(splits)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        self.user = self.users[0]
+        self.client.force_authenticate(user=self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Only fall back to a seq scan when no usable index exists
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}")
+                return [row[0] for row in cursor.fetchall()]
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def is_sequential_scan(self, plan_line, derived=()):
+        if connection.vendor == 'postgresql':
+            return 'Seq Scan' in plan_line
+        # Reading back a grouped subquery's own rows is not a table scan
+        if plan_line.startswith('SCAN ') and plan_line.split(' ')[1] in derived:
+            return False
+        return plan_line.startswith('SCAN ') and 'USING' not in plan_line and 'CONSTANT ROW' not in plan_line
+
+    def assert_endpoint_plan(self, name, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertLessEqual(
+            len(queries), self.QUERY_BUDGETS[name],
+            f"{name} issued {len(queries)} queries: " + "\n".join(q['sql'] for q in queries)
+        )
+        for query in queries:
+            plan = self.explain(query['sql'])
+            derived = {line.split(' ')[1] for line in plan if line.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+            scans = [line for line in plan if self.is_sequential_scan(line, derived)]
+            self.assertFalse(scans, f"{name} runs a sequential scan: {query['sql']}\n{plan}")
+
+    def test_portfolio_plan(self):
+        self.assert_endpoint_plan('portfolio', reverse('portfolio'))
+
+    def test_portfolio_history_plan(self):
+        self.assert_endpoint_plan('portfolio_history', reverse('portfolio_history') + '?from=2024-01-01&until=2024-12-31')
+
+    def test_timeline_plan(self):
+        self.assert_endpoint_plan('timeline', reverse('timeline'))
+
+    def test_exposure_plan(self):
+        self.assert_endpoint_plan('exposure', reverse('exposure'))
+        self.assert_endpoint_plan('exposure', reverse('exposure') + '?role=syndicator')
+
+    def test_settlement_plan(self):
+        self.assert_endpoint_plan('settlement', reverse('settlement') + '?from=2024-06-01&until=2024-06-30')
+
+    def test_transaction_repayments_plan(self):
+        split = Splitwise.objects.filter(syndicator_id=self.user).select_related('transaction_id').first()
+        post_repayments(split.transaction_id, [(split.pk, 50, 4)], date(2024, 2, 1))
+        self.assert_endpoint_plan(
+            'transaction_repayments', reverse('transaction_repayments', args=[split.transaction_id_id])
+        )
+
+    def test_maturity_calendar_plan(self):
+        self.assert_endpoint_plan('maturity_calendar', reverse('maturity_calendar') + '?days=365&bucket=month')
+
+    def test_portfolio_as_of_plan(self):
+        self.assert_endpoint_plan('portfolio', reverse('portfolio') + '?as_of=2024-06-01')
+
+    def test_syndicate_plan(self):
+        self.assert_endpoint_plan('syndicate', reverse('syndicate'))
+
+    def test_check_friend_request_status_plan(self):
+        self.assert_endpoint_plan('check_friend_request_status', reverse('check_friend_request_status'))
+
+    def test_all_transaction_plan(self):
+        self.assert_endpoint_plan('all_transaction', reverse('all_transaction'))
+
+    def test_user_splitwise_plan(self):
+        self.assert_endpoint_plan('user_splitwise', reverse('user_splitwise'))
+
+    def test_transaction_splitwise_plan(self):
+        transaction = Transactions.objects.filter(risk_taker_id=self.user).first()
+        self.assert_endpoint_plan(
+            'transaction_splitwise',
+            reverse('transaction_splitwise', args=[transaction.transaction_id])
+        )
+
+
+class SeedScaleDataTests(TestCase):
+    def seed(self):
+        call_command('seed_scale_data', users=60, transactions=300, seed=7,
+                     anchor_date=date(2025, 1, 1), batch_size=100, stdout=StringIO())
+        return (
+            list(CustomUser.objects.order_by('pk').values_list('pk', 'username')),
+            list(FriendRequest.objects.order_by('pk').values_list('pk', 'user_id', 'requested_id', 'status')),
+            list(Transactions.objects.order_by('pk').values_list(
+                'pk', 'risk_taker_id', 'total_principal_amount', 'total_interest',
+                'risk_taker_flag', 'risk_taker_commission', 'start_date', 'end_date'
+            )),
+            list(Splitwise.objects.order_by('pk').values_list('pk', 'transaction_id', 'syndicator_id', 'principal_amount')),
+        )
+
+    def test_seed_is_deterministic(self):
+        """Test that the same seed produces exactly the same dataset"""
+        first = self.seed()
+        CustomUser.objects.all().delete()
+        second = self.seed()
+        self.assertEqual(first, second)
+
+    def test_seeded_data_is_consistent(self):
+        """Test that splits add up and syndicators are accepted friends of the risk taker"""
+        self.seed()
+        self.assertEqual(CustomUser.objects.count(), 60)
+        self.assertEqual(Transactions.objects.count(), 300)
+
+        accepted = set()
+        for sender, recipient in FriendRequest.objects.filter(status='accepted').values_list('user_id', 'requested_id'):
+            accepted.add((sender, recipient))
+            accepted.add((recipient, sender))
+
+        for transaction in Transactions.objects.prefetch_related('splitwise_entries'):
+            splits = transaction.splitwise_entries.all()
+            self.assertAlmostEqual(sum(split.principal_amount for split in splits), transaction.total_principal_amount, places=2)
+            for split in splits:
+                self.assertEqual(split.interest_amount, transaction.total_interest)
+                if split.syndicator_id_id != transaction.risk_taker_id_id:
+                    self.assertIn((transaction.risk_taker_id_id, split.syndicator_id_id), accepted)
+
+
+class BenchmarkEndpointsCommandTests(TestCase):
+    def test_writes_machine_readable_results(self):
+        """Test that the endpoint benchmark covers every route and reports latency and SQL stats"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, 'bench.json')
+            call_command('benchmark_endpoints', sizes='40', iterations=2, warmup=0, output=output,
+                         use_current_database=True, stdout=StringIO())
+            with open(output) as results_file:
+                report = json.load(results_file)
+
+        self.assertIn('git_revision', report['metadata'])
+        endpoints = {result['endpoint']: result for result in report['runs'][0]['endpoints']}
+        self.assertEqual(len(endpoints), 23)
+        for name in ('portfolio', 'all_transaction', 'user_splitwise', 'transaction_splitwise'):
+            self.assertEqual(endpoints[name]['status_codes'], [200])
+            self.assertGreater(endpoints[name]['queries'], 0)
+            self.assertLessEqual(endpoints[name]['p50_ms'], endpoints[name]['p99_ms'])
+        for name in ('portfolio_history', 'upcoming_cash_flows', 'settlement', 'timeline', 'maturity_calendar',
+                     'exposure', 'simulate_commission', 'batch', 'import_transactions', 'transaction_repayments'):
+            self.assertEqual(endpoints[name]['status_codes'], [200], name)
+        self.assertEqual(endpoints['post_transaction_repayments']['status_codes'], [201])
+
+
+@override_settings(REQUEST_TIMING_ENABLED=True)
+class RequestTimingMiddlewareTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='timed', email='timed@test.com', password='testpass123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_server_timing_header_and_log_line(self):
+        """Test that each request reports DB, auth, view and serialization timings"""
+        with self.assertLogs('core.request_timing', level='INFO') as logs:
+            response = self.client.get(reverse('all_transaction'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        server_timing = response['Server-Timing']
+        for metric in ('db;dur=', 'auth;dur=', 'view;dur=', 'serialize;dur=', 'total;dur='):
+            self.assertIn(metric, server_timing)
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], reverse('all_transaction'))
+        self.assertEqual(entry['status'], 200)
+        # JWT user lookup plus the two transaction queries (splits prefetch is skipped when empty)
+        self.assertEqual(entry['db_queries'], 3)
+        self.assertIn(f'queries={entry["db_queries"]}', server_timing)
+        self.assertGreater(entry['auth_ms'], 0)
+
+    @override_settings(REQUEST_TIMING_ENABLED=False)
+    def test_disabled_by_default(self):
+        """Test that no timing header is added when instrumentation is off"""
+        response = self.client.get(reverse('portfolio'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_PROFILER='cprofile')
+class RequestProfilingMiddlewareTests(APITestCase):
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+        self.settings_override = override_settings(REQUEST_PROFILING_DIR=self.output_dir.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.user = CustomUser.objects.create_user(username='profiled', email='profiled@test.com', password='testpass123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_signed_header_profiles_request(self):
+        """Test that a valid signed token saves a pstats file for the request"""
+        token = signing.TimestampSigner(salt='core.request_profiling').sign('profile')
+        response = self.client.get(reverse('portfolio'), HTTP_X_PROFILE_TOKEN=token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        output = os.path.join(self.output_dir.name, response['X-Profile-Output'])
+        stats = pstats.Stats(output)
+        self.assertTrue(any('get' == function[2] for function in stats.stats))
+
+    def test_tampered_header_is_ignored(self):
+        """Test that a bad signature doesn't trigger profiling"""
+        response = self.client.get(reverse('portfolio'), HTTP_X_PROFILE_TOKEN='profile:forged:signature')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('X-Profile-Output'))
+        self.assertEqual(os.listdir(self.output_dir.name), [])
+
+    def test_query_flag_requires_staff(self):
+        """Test that ?profile=1 only profiles requests from staff users"""
+        response = self.client.get(reverse('portfolio') + '?profile=1')
+        self.assertFalse(response.has_header('X-Profile-Output'))
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('portfolio') + '?profile=1')
+        self.assertTrue(response.has_header('X-Profile-Output'))
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='scrape-secret')
+class MetricsTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='metrics', email='metrics@test.com', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test histogram exposition: cumulative buckets, sum and count"""
+        histogram = metrics.Histogram('test_latency_seconds', "test", ('view',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, 'portfolio')
+        samples = list(histogram.samples())
+        self.assertEqual(samples, [
+            'test_latency_seconds_bucket{view="portfolio",le="0.1"} 2',
+            'test_latency_seconds_bucket{view="portfolio",le="1"} 3',
+            'test_latency_seconds_bucket{view="portfolio",le="+Inf"} 4',
+            'test_latency_seconds_sum{view="portfolio"} 3.65',
+            'test_latency_seconds_count{view="portfolio"} 4',
+        ])
+
+    def test_counter_is_thread_safe(self):
+        """Test that concurrent increments from many threads are not lost"""
+        counter = metrics.Counter('test_total', "test", ('view',))
+
+        def work():
+            for _ in range(10000):
+                counter.inc('portfolio')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.value('portfolio'), 80000)
+
+    def test_metrics_endpoint_reports_requests(self):
+        """Test that handled requests show up in the Prometheus endpoint"""
+        before = metrics.http_requests.value('portfolio', 'GET', '200')
+        queries_before = metrics.db_queries_per_request.count('portfolio')
+        self.client.get(reverse('portfolio'))
+        self.client.get(reverse('portfolio'))
+        metrics.record_cache_lookup('test_cache', hit=True)
+        metrics.record_cache_lookup('test_cache', hit=False)
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn(f'http_requests_total{{view="portfolio",method="GET",status="200"}} {before + 2}', body)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertEqual(metrics.db_queries_per_request.count('portfolio'), queries_before + 2)
+        self.assertIn('cache_hit_ratio{cache="test_cache"}', body)
+
+    def test_metrics_token(self):
+        """Test that a configured scrape token is enforced"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_require_a_token(self):
+        """Test that metrics are never served unauthenticated"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_metrics_disabled(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 404)
+
+
+class ORJSONRendererTests(TestCase):
+    def test_output_matches_drf_json_renderer(self):
+        """Test that orjson output matches DRF's JSONRenderer byte for byte for the usual API payload types"""
+        payload = {
+            "transaction_id": uuid.uuid4(),
+            "start_date": date(2025, 1, 31),
+            "created_at": datetime(2025, 1, 31, 12, 30, 5, 123456, tzinfo=dt_timezone.utc),
+            "amount": 1234.5,
+            "rate": 0.1,
+            "decimal": Decimal("2.50"),
+            "flag": True,
+            "lender_name": "Zoë & Co",
+            "nested": [{"value": None}, {"value": 3}],
+        }
+        self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_non_str_keys_and_big_integers_match_drf(self):
+        """Test payloads orjson rejects by default: non-str dict keys and integers beyond 64 bits"""
+        for payload in ({1: 2}, {2.5: "a"}, {True: None}, {None: 1}, {"value": 2 ** 70}, [-(2 ** 64)]):
+            self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_documented_float_differences(self):
+        """Test that exponent floats only differ in spelling, and that non-finite floats render as null"""
+        payload = {"big": 1e16, "small": 1e-7, "negative": -2.5e-12}
+        rendered = ORJSONRenderer().render(payload)
+        self.assertEqual(rendered, b'{"big":1e16,"small":1e-7,"negative":-2.5e-12}')
+        self.assertNotEqual(rendered, JSONRenderer().render(payload))
+        self.assertEqual(json.loads(rendered), json.loads(JSONRenderer().render(payload)))
+
+        self.assertEqual(ORJSONRenderer().render({"value": float("nan"), "limit": float("inf")}), b'{"value":null,"limit":null}')
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({"value": float("nan")})
+
+    def test_parser_round_trip(self):
+        """Test that the orjson parser reads request bodies and rejects malformed JSON"""
+        self.assertEqual(ORJSONParser().parse(StringIO('{"a": [1, 2.5]}')), {"a": [1, 2.5]})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(StringIO('{"a": '))
+
+
+@override_settings(COMPRESSION_MIN_BYTES=1024)
+class CompressionMiddlewareTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='compress', email='compress@test.com', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        transactions = Transactions.objects.bulk_create([
+            Transactions(
+                risk_taker_id=self.user, total_principal_amount=1000, total_interest=2,
+                month_period_of_loan=12, start_date=date(2025, 1, 1), end_date=date(2026, 1, 1)
+            )
+            for _ in range(50)
+        ])
+        Splitwise.objects.bulk_create([
+            Splitwise(transaction_id=transaction, syndicator_id=self.user, principal_amount=1000, interest_amount=2)
+            for transaction in transactions
+        ])
+
+    def test_gzip_when_only_gzip_accepted(self):
+        """Test that large responses are gzipped for gzip-only clients"""
+        response = self.client.get(reverse('all_transaction'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        body = json.loads(gzip.decompress(response.content))
+        self.assertEqual(body['transaction_counts']['total'], 50)
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_brotli_preferred_when_accepted(self):
+        """Test that brotli wins over gzip when the client accepts both"""
+        response = self.client.get(reverse('all_transaction'), HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        body = json.loads(brotli.decompress(response.content))
+        self.assertEqual(body['transaction_counts']['total'], 50)
+
+        response = self.client.get(reverse('all_transaction'), HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_small_and_unnegotiated_responses_untouched(self):
+        """Test that small payloads and clients without Accept-Encoding get identity responses"""
+        response = self.client.get(reverse('portfolio'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self.client.get(reverse('all_transaction'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_unusual_accept_encoding_parameters(self):
+        """Test that q is found among other parameters in any case, and a q that won't parse refuses the coding"""
+        factory = APIRequestFactory()
+        for header, accepted in [
+            ('gzip; q=0.5; x=1', True),
+            ('gzip;x=1;q=0', False),
+            ('GZIP;Q=1', True),
+            ('gzip ; q = 0.8', True),
+            ('gzip;q=abc', False),
+            ('gzip;q=', False),
+            ('br, gzip;level=9', True),
+        ]:
+            request = factory.get('/', HTTP_ACCEPT_ENCODING=header)
+            self.assertEqual(accepts_encoding(request, 'gzip'), accepted, header)
+
+        for header in ('br;q=abc', 'gzip; q=0.5; x=1', 'br;Q=1'):
+            response = self.client.get(reverse('all_transaction'), HTTP_ACCEPT_ENCODING=header)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, header)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.risk_taker = CustomUser.objects.create_user(username='sparse_rt', email='sparse_rt@test.com', password='testpass123')
+        self.syndicator = CustomUser.objects.create_user(username='sparse_syn', email='sparse_syn@test.com', password='testpass123')
+        self.client.force_authenticate(user=self.risk_taker)
+        transactions = Transactions.objects.bulk_create([
+            Transactions(
+                risk_taker_id=self.risk_taker, total_principal_amount=1000, total_interest=2,
+                risk_taker_flag=True, risk_taker_commission=10, lender_name='Lender',
+                month_period_of_loan=12, start_date=date(2025, 1, 1), end_date=date(2026, 1, 1)
+            )
+            for _ in range(5)
+        ])
+        Splitwise.objects.bulk_create([
+            Splitwise(transaction_id=transaction, syndicator_id=syndicator, principal_amount=500, interest_amount=2)
+            for transaction in transactions
+            for syndicator in (self.risk_taker, self.syndicator)
+        ])
+
+    def test_all_transaction_fields_trim_output_and_query(self):
+        """Test that fields= limits the serialized fields, the selected columns and skips the prefetch"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('all_transaction'), {'fields': 'transaction_id,total_principal_amount,end_date'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['transactions']), 5)
+        for transaction in response.data['transactions']:
+            self.assertEqual(list(transaction), ['transaction_id', 'total_principal_amount', 'end_date'])
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertNotIn('lender_name', query['sql'])
+            self.assertNotIn('core_splitwise"."principal_amount', query['sql'])
+
+    def test_all_transaction_include_and_commission(self):
+        """Test that include= adds nested splits and commission totals match the full representation"""
+        full = self.client.get(reverse('all_transaction')).data['transactions']
+        response = self.client.get(
+            reverse('all_transaction'), {'fields': 'transaction_id,total_commission_earned', 'include': 'splitwise_entries'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for sparse, complete in zip(response.data['transactions'], full):
+            self.assertEqual(list(sparse), ['transaction_id', 'total_commission_earned', 'splitwise_entries'])
+            self.assertEqual(sparse['total_commission_earned'], complete['total_commission_earned'])
+            self.assertEqual(sparse['splitwise_entries'], complete['splitwise_entries'])
+        self.assertAlmostEqual(full[0]['total_commission_earned'], 1.0)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('all_transaction'), {'fields': 'total_commission_earned'})
+        self.assertEqual([t['total_commission_earned'] for t in response.data['transactions']],
+                         [t['total_commission_earned'] for t in full])
+        self.assertEqual(len(queries), 3)
+
+    def test_user_splitwise_fields(self):
+        """Test that fields= trims splitwise entries while the summary stays complete"""
+        full = self.client.get(reverse('user_splitwise')).data
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user_splitwise'), {'fields': 'splitwise_id,principal_amount'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['summary'], full['summary'])
+        self.assertEqual(
+            response.data['splitwise_entries'],
+            [{'splitwise_id': e['splitwise_id'], 'principal_amount': e['principal_amount']} for e in full['splitwise_entries']]
+        )
+        self.assertTrue(all('lender_name' not in query['sql'] for query in queries))
+
+        response = self.client.get(reverse('user_splitwise'), {'fields': 'splitwise_id', 'include': 'risk_taker'})
+        self.assertEqual(response.data['splitwise_entries'][0]['risk_taker']['username'], 'sparse_rt')
+
+    def test_unknown_fields_rejected(self):
+        """Test that unknown field or include names are a 400"""
+        response = self.client.get(reverse('all_transaction'), {'fields': 'transaction_id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', response.data['error'])
+        response = self.client.get(reverse('user_splitwise'), {'fields': 'splitwise_id', 'include': 'syndicators'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FastSerializerParityTests(APITestCase):
+    """PortfolioReader must render byte-identical output to PortfolioSerializer"""
+
+    def setUp(self):
+        self.risk_taker = CustomUser.objects.create_user(
+            username='parity_rt', email='parity_rt@test.com', password='testpass123', name='Risk Taker'
+        )
+        self.syndicators = [
+            CustomUser.objects.create_user(username=f'parity_{i}', email=f'parity_{i}@test.com', password='testpass123')
+            for i in range(3)
+        ]
+        rng = random.Random(7)
+        # Commission off, ordinary rates, and 100% (which yields int 0 after max(0, ...))
+        for flag, rate in [(False, 0), (True, 10), (True, 12.5), (True, 100), (True, 0)]:
+            for _ in range(3):
+                transaction = Transactions.objects.create(
+                    risk_taker_id=self.risk_taker, total_principal_amount=rng.choice([1000, 1234.5]),
+                    total_interest=rng.choice([2, 1.75]), risk_taker_flag=flag, risk_taker_commission=rate,
+                    syndicators=[str(user.pk) for user in self.syndicators[:2]],
+                    lender_name=rng.choice([None, 'Lender']), month_period_of_loan=12,
+                    start_date=date(2025, 1, 1), end_date=date(2026, 1, 1)
+                )
+                members = [self.risk_taker] + self.syndicators if rng.random() < 0.5 else self.syndicators
+                for syndicator in members:
+                    Splitwise.objects.create(
+                        transaction_id=transaction, syndicator_id=syndicator,
+                        principal_amount=rng.choice([100, 333.33]), interest_amount=rng.choice([2, 1.1])
+                    )
+        Transactions.objects.create(
+            risk_taker_id=self.syndicators[0], total_principal_amount=50, total_interest=1, month_period_of_loan=1,
+            start_date=date(2025, 1, 1), end_date=date(2025, 2, 1)
+        )
+
+    def render_both(self, fields=None):
+        queryset = Transactions.objects.order_by('pk')
+        instances = queryset.select_related('risk_taker_id').prefetch_related(
+            Prefetch('splitwise_entries', queryset=Splitwise.objects.select_related('syndicator_id').order_by('pk'))
+        )
+        expected = ORJSONRenderer().render(PortfolioSerializer(instances, many=True, fields=fields).data)
+        reader = PortfolioReader(fields=fields)
+        actual = ORJSONRenderer().render(reader.serialize(reader.fetch(queryset)))
+        return expected, actual
+
+    def test_full_representation_is_byte_identical(self):
+        expected, actual = self.render_both()
+        self.assertEqual(actual, expected)
+        self.assertIn(b'"splitwise_entries":[]', actual)
+        self.assertIn(b'"interest_after_commission":0,', actual)
+
+    def test_field_subsets_are_byte_identical(self):
+        for fields in [
+            {'transaction_id', 'total_principal_amount', 'end_date'},
+            {'total_commission_earned'},
+            {'risk_taker_name', 'splitwise_entries'},
+            {'lender_name', 'syndicators', 'created_at', 'commission_rate', 'total_commission_earned'},
+        ]:
+            with self.subTest(fields=fields):
+                expected, actual = self.render_both(fields)
+                self.assertEqual(actual, expected)
+
+    def test_all_transaction_uses_reader(self):
+        self.client.force_authenticate(user=self.risk_taker)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('all_transaction'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 3)
+        instances = Transactions.objects.filter(risk_taker_id=self.risk_taker).prefetch_related(
+            Prefetch('splitwise_entries', queryset=Splitwise.objects.order_by('pk'))
+        )
+        expected = {str(t['transaction_id']): t for t in PortfolioSerializer(instances, many=True).data}
+        self.assertEqual(len(response.data['transactions']), len(expected))
+        for transaction in response.data['transactions']:
+            self.assertEqual(
+                ORJSONRenderer().render(transaction),
+                ORJSONRenderer().render(expected[transaction['transaction_id']])
+            )
+
+
+class CommissionColumnsTests(APITestCase):
+    """commission_columns() must agree exactly with the per-entry commission functions"""
+
+    def random_entry(self, rng):
+        return (
+            rng.choice([0, 100, rng.randint(1, 10 ** 7), rng.uniform(0, 10 ** 7), 333.33]),
+            rng.choice([0, 2, 1.1, rng.uniform(0, 40)]),
+            rng.random() < 0.7,
+            rng.choice([0, 10, 12.5, 100, rng.uniform(0, 100), rng.uniform(100, 150)]),
+            rng.random() < 0.2,
+        )
+
+    def assert_same_values(self, actual, expected):
+        # Compare types as well, so int 0 and 0.0 render the same way
+        self.assertEqual([(type(value), value) for value in actual], [(type(value), value) for value in expected])
+
+    def test_matches_scalar_functions(self):
+        rng = random.Random(41)
+        for _ in range(50):
+            entries = [self.random_entry(rng) for _ in range(rng.randint(1, 200))]
+            interest_after, deducted = commission_columns(*zip(*entries)).tolist()
+            self.assert_same_values(interest_after, [interest_after_commission(*entry) for entry in entries])
+            self.assert_same_values(deducted, [commission_deducted(*entry) for entry in entries])
+
+    def test_edge_cases(self):
+        columns = commission_columns(
+            [1000, 1000, 1000, 1000, 0], [2, 2, 2, 2, 2], [True, True, True, False, True],
+            [100, 150, 10, 10, 10], [False, False, True, False, False]
+        )
+        interest_after, deducted = columns.tolist()
+        self.assertEqual(interest_after, [0, 0, 20.0, 20.0, 0])
+        self.assertEqual([type(value) for value in interest_after], [int, int, float, float, int])
+        self.assertEqual(deducted, [20.0, 30.0, 0, 0, 0.0])
+        self.assertEqual([type(value) for value in deducted], [float, float, int, int, float])
+        self.assertEqual(len(columns), 5)
+
+    def test_scalars_broadcast(self):
+        interest_after, deducted = commission_columns([100, 200], [2, 3], True, 50, False).tolist()
+        self.assertEqual(interest_after, [1.0, 3.0])
+        self.assertEqual(deducted, [1.0, 3.0])
+
+    def test_matches_model_methods(self):
+        rng = random.Random(5)
+        users = [
+            CustomUser.objects.create_user(username=f'engine_{i}', email=f'engine_{i}@test.com', password='testpass123')
+            for i in range(4)
+        ]
+        for _ in range(20):
+            principal, interest, flag, rate, _ = self.random_entry(rng)
+            transaction = Transactions.objects.create(
+                risk_taker_id=rng.choice(users), total_principal_amount=principal, total_interest=interest,
+                risk_taker_flag=flag, risk_taker_commission=rate, month_period_of_loan=12,
+                start_date=date(2025, 1, 1), end_date=date(2026, 1, 1)
+            )
+            for syndicator in rng.sample(users, rng.randint(1, 4)):
+                Splitwise.objects.create(
+                    transaction_id=transaction, syndicator_id=syndicator,
+                    principal_amount=rng.uniform(0, 5000), interest_amount=interest
+                )
+
+        entries = list(Splitwise.objects.select_related('transaction_id').order_by('pk'))
+        interest_after, deducted = commission_columns(
+            [entry.principal_amount for entry in entries],
+            [entry.interest_amount for entry in entries],
+            [entry.transaction_id.risk_taker_flag for entry in entries],
+            [entry.transaction_id.risk_taker_commission for entry in entries],
+            [entry.syndicator_id_id == entry.transaction_id.risk_taker_id_id for entry in entries]
+        ).tolist()
+        self.assert_same_values(interest_after, [entry.get_interest_after_commission() for entry in entries])
+        self.assert_same_values(deducted, [entry.get_commission_deducted() for entry in entries])
+
+        # The reporting endpoints sum the same values in the same order as the model methods
+        for user in users:
+            self.client.force_authenticate(user=user)
+            response = self.client.get(reverse('portfolio'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            own_entries = [entry for entry in entries if entry.syndicator_id_id == user.pk]
+            commission_earned = 0
+            for transaction in Transactions.objects.filter(risk_taker_id=user).prefetch_related('splitwise_entries'):
+                if transaction.risk_taker_flag:
+                    for entry in transaction.splitwise_entries.all():
+                        if entry.syndicator_id_id != user.pk:
+                            commission_earned += entry.get_commission_deducted()
+            breakdown = response.data['breakdown']
+            self.assertEqual(
+                breakdown['as_syndicate_member']['interest_after_commission'],
+                sum(entry.get_interest_after_commission() for entry in own_entries)
+            )
+            self.assertEqual(breakdown['as_risk_taker']['commission_earned'], commission_earned)
+
+            response = self.client.get(reverse('user_splitwise'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            if own_entries:
+                self.assertEqual(
+                    response.data['summary']['total_commission_paid'],
+                    sum(entry.get_commission_deducted() for entry in sorted(own_entries, key=lambda e: e.pk, reverse=True))
+                )
+
+
+class CommissionSimulationTests(APITestCase):
+    def setUp(self):
+        self.risk_taker = CustomUser.objects.create_user(username='sim_rt', email='sim_rt@test.com', password='testpass123')
+        for username in ('alice', 'bob'):
+            CustomUser.objects.create_user(username=username, email=f'{username}@test.com', password='testpass123')
+        self.client.force_authenticate(user=self.risk_taker)
+        self.payload = {
+            'total_principal_amount': 10000,
+            'total_interest_amount': 2,
+            'syndicate_details': {
+                'sim_rt': {'principal_amount': 2000, 'interest': 2},
+                'alice': {'principal_amount': 5000, 'interest': 2},
+                'bob': {'principal_amount': 3000, 'interest': 2},
+            },
+        }
+
+    def simulate(self, **data):
+        return self.client.post(reverse('simulate_commission'), {**self.payload, **data}, format='json')
+
+    def test_curves_match_commission_rules(self):
+        rates = [0, 5, 12.5, 100]
+        # Only the syndicator lookup; nothing is written
+        with self.assertNumQueries(1):
+            response = self.simulate(commission_rates=rates)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['commission_rates'], rates)
+
+        syndicators = {entry['username']: entry for entry in response.data['syndicators']}
+        for username, details in self.payload['syndicate_details'].items():
+            entry = syndicators[username]
+            self.assertEqual(entry['is_risk_taker'], username == 'sim_rt')
+            arguments = [
+                (details['principal_amount'], details['interest'], rate > 0, rate, username == 'sim_rt')
+                for rate in rates
+            ]
+            self.assertEqual(entry['interest_after_commission'], [interest_after_commission(*a) for a in arguments])
+            self.assertEqual(entry['commission_deducted'], [commission_deducted(*a) for a in arguments])
+
+        risk_taker = response.data['risk_taker']
+        self.assertEqual(risk_taker['principal_amount'], 2000)
+        self.assertEqual(risk_taker['commission_earned'], [0, 8.0, 20.0, 160.0])
+        self.assertEqual(risk_taker['net_interest'], [40.0, 48.0, 60.0, 200.0])
+        self.assertEqual(risk_taker['net_yield_percentage'], [2.0, 2.4, 3.0, 10.0])
+        for actual, expected in zip(syndicators['alice']['net_yield_percentage'], [2.0, 1.9, 1.75, 0.0]):
+            self.assertAlmostEqual(actual, expected)
+
+    def test_rate_range_includes_stop(self):
+        response = self.simulate(rate_range={'start': 0, 'stop': 1, 'step': 0.1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['commission_rates'], [round(0.1 * i, 1) for i in range(11)])
+        self.assertEqual(len(response.data['syndicators'][0]['interest_after_commission']), 11)
+
+    def test_risk_taker_outside_syndicate_has_no_yield(self):
+        details = {name: value for name, value in self.payload['syndicate_details'].items() if name != 'sim_rt'}
+        response = self.simulate(
+            total_principal_amount=8000, syndicate_details=details, commission_rates=[10]
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['risk_taker']['commission_earned'], [16.0])
+        self.assertIsNone(response.data['risk_taker']['net_yield_percentage'])
+
+    @override_settings(COMMISSION_SIMULATION_MAX_RATES=500)
+    def test_invalid_requests(self):
+        for data, message in [
+            ({}, 'commission_rates or rate_range is required'),
+            ({'commission_rates': []}, 'non-empty list'),
+            ({'commission_rates': [10, 'x']}, 'non-empty list'),
+            ({'commission_rates': [101]}, 'between 0 and 100'),
+            ({'rate_range': {'start': 0, 'stop': 10}}, 'numeric start, stop and step'),
+            ({'rate_range': {'start': 5, 'stop': 1, 'step': 1}}, 'stop >= start'),
+            ({'rate_range': {'start': 0, 'stop': 100, 'step': 0.1}}, 'At most 500'),
+            ({'rate_range': {'start': 0, 'stop': 100, 'step': 5e-324}}, 'At most 500'),
+            ({'rate_range': {'start': 0, 'stop': 'inf', 'step': 1}}, 'numeric start, stop and step'),
+            ({'rate_range': {'start': 'nan', 'stop': 10, 'step': 1}}, 'numeric start, stop and step'),
+            ({'commission_rates': [1] * 501}, 'At most 500'),
+            ({'commission_rates': [10], 'total_principal_amount': 9000}, 'does not match'),
+            ({'commission_rates': [10], 'total_interest_amount': 3}, 'must equal total_interest_amount'),
+            ({'commission_rates': [10], 'syndicate_details': {
+                'sim_rt': {'principal_amount': 2000, 'interest': 2},
+                'alcie': {'principal_amount': 5000, 'interest': 2},
+                'bob': {'principal_amount': 3000, 'interest': 2},
+            }}, 'Users not found: alcie'),
+        ]:
+            with self.subTest(data=data):
+                response = self.simulate(**data)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(message, response.data['error'])
+
+    def test_solo_transaction(self):
+        response = self.client.post(reverse('simulate_commission'), {
+            'total_principal_amount': 1000, 'total_interest_amount': 2, 'commission_rates': [10, 20]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['risk_taker']['net_interest'], [20.0, 20.0])
+        self.assertEqual(response.data['syndicators'][0]['username'], 'sim_rt')
+
+
+class RepaymentScheduleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.risk_taker = CustomUser.objects.create_user(username='sched_rt', email='sched_rt@test.com', password='testpass123')
+        self.syndicator = CustomUser.objects.create_user(username='sched_s', email='sched_s@test.com', password='testpass123')
+        self.transaction = Transactions.objects.create(
+            risk_taker_id=self.risk_taker, total_principal_amount=3000, total_interest=2, risk_taker_flag=True,
+            risk_taker_commission=10, month_period_of_loan=3, start_date=date(2024, 1, 31), end_date=date(2024, 4, 30)
+        )
+        self.own_split = Splitwise.objects.create(
+            transaction_id=self.transaction, syndicator_id=self.risk_taker, principal_amount=1000, interest_amount=2
+        )
+        self.split = Splitwise.objects.create(
+            transaction_id=self.transaction, syndicator_id=self.syndicator, principal_amount=2000, interest_amount=2
+        )
+
+    def test_add_months_matches_scalar_version(self):
+        rng = random.Random(3)
+        starts = [date(2020, 1, 1) + timedelta(days=rng.randrange(3000)) for _ in range(500)]
+        months = [rng.randrange(0, 40) for _ in starts]
+        self.assertEqual(
+            add_months_vectorized(starts, months).tolist(),
+            [add_months(start, count) for start, count in zip(starts, months)]
+        )
+
+    def test_schedule_rows(self):
+        schedule = get_schedules([self.transaction.pk])
+        self.assertEqual(len(schedule), 6)
+        rows = schedule[schedule['splitwise_id'] == uuid_bytes(self.split.pk)]
+        self.assertEqual(rows['due_date'].astype(str).tolist(), ['2024-02-29', '2024-03-31', '2024-04-30'])
+        self.assertEqual(rows['installment'].tolist(), [1, 2, 3])
+        self.assertEqual(rows['interest'].tolist(), [self.split.get_interest_after_commission()] * 3)
+        self.assertEqual(rows['commission'].tolist(), [self.split.get_commission_deducted()] * 3)
+        self.assertEqual(rows['principal'].tolist(), [0.0, 0.0, 2000.0])
+        own = schedule[schedule['splitwise_id'] == uuid_bytes(self.own_split.pk)]
+        self.assertEqual(own['interest'].tolist(), [20.0] * 3)
+        self.assertEqual(own['commission'].tolist(), [0.0] * 3)
+        self.assertEqual(len(build_schedules([])), 0)
+        self.assertEqual(len(get_schedules([])), 0)
+
+    def test_schedules_are_cached_per_transaction(self):
+        get_schedules([self.transaction.pk])
+        self.assertIsNotNone(cache.get(SCHEDULE_CACHE_KEY.format(transaction_id=self.transaction.pk)))
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_schedules([self.transaction.pk])), 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Splitwise.objects.filter(pk=self.split.pk).first().delete()
+        self.assertIsNone(cache.get(SCHEDULE_CACHE_KEY.format(transaction_id=self.transaction.pk)))
+        self.assertEqual(len(get_schedules([self.transaction.pk])), 3)
+
+    def test_upcoming_cash_flows(self):
+        self.client.force_authenticate(user=self.syndicator)
+        response = self.client.get(reverse('upcoming_cash_flows') + '?from=2024-03-01&until=2024-12-31')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual([flow['due_date'] for flow in response.data['cash_flows']], ['2024-03-31', '2024-04-30'])
+        last = response.data['cash_flows'][-1]
+        self.assertEqual(last['role'], 'syndicator')
+        self.assertEqual((last['installment'], last['installments']), (3, 3))
+        self.assertEqual(last['amount'], 2000 + 36.0)
+        self.assertEqual(response.data['totals']['principal'], 2000.0)
+        self.assertEqual(response.data['totals']['interest'], 72.0)
+        self.assertEqual([month['month'] for month in response.data['by_month']], ['2024-03', '2024-04'])
+
+        self.client.force_authenticate(user=self.risk_taker)
+        response = self.client.get(reverse('upcoming_cash_flows') + '?from=2024-01-01&until=2024-02-29')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(
+            [(flow['role'], flow['amount']) for flow in response.data['cash_flows']],
+            [('syndicator', 20.0), ('risk_taker', 4.0)]
+        )
+        self.assertEqual(response.data['totals']['commission_earned'], 4.0)
+
+    def test_accrued_periods(self):
+        as_of = [date(2024, 1, 1), date(2024, 1, 31), date(2024, 2, 14), date(2024, 2, 29), date(2024, 3, 15), date(2025, 1, 1)]
+        periods = [
+            accrued_periods([date(2024, 1, 31)], [date(2024, 4, 30)], [3], day)[0] for day in as_of
+        ]
+        for actual, expected in zip(periods, [0, 0, 14 / 29, 1, 1 + 15 / 31, 3]):
+            self.assertAlmostEqual(actual, expected)
+        # Accrual stops at end_date even if month_period_of_loan runs longer
+        self.assertEqual(accrued_periods([date(2024, 1, 31)], [date(2024, 2, 29)], [3], date(2025, 1, 1)).tolist(), [1.0])
+        self.assertEqual(accrued_periods([], [], [], date(2025, 1, 1)).tolist(), [])
+
+    def test_portfolio_accrued_interest(self):
+        self.client.force_authenticate(user=self.syndicator)
+        response = self.client.get(reverse('portfolio'))
+        self.assertNotIn('accrued', response.data)
+
+        response = self.client.get(reverse('portfolio') + '?as_of=2024-02-29')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        accrued = response.data['accrued']
+        self.assertEqual(accrued['as_of'], '2024-02-29')
+        self.assertEqual(accrued['as_syndicate_member'], {
+            'original_interest': 40.0, 'interest_after_commission': 36.0, 'commission_paid': 4.0
+        })
+        self.assertEqual(accrued['as_risk_taker']['commission_earned'], 0.0)
+
+        self.client.force_authenticate(user=self.risk_taker)
+        response = self.client.get(reverse('portfolio') + '?as_of=2024-03-15')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        accrued = response.data['accrued']
+        self.assertAlmostEqual(accrued['as_risk_taker']['commission_earned'], 4 * (1 + 15 / 31))
+        self.assertAlmostEqual(accrued['as_syndicate_member']['interest_after_commission'], 20 * (1 + 15 / 31))
+        self.assertAlmostEqual(accrued['total_interest_after_commission'], 24 * (1 + 15 / 31))
+
+        over_term = accrued['over_term']
+        self.assertAlmostEqual(over_term['as_risk_taker']['commission_earned'], 4 * 3)
+        self.assertAlmostEqual(over_term['as_syndicate_member']['interest_after_commission'], 20 * 3)
+        self.assertAlmostEqual(over_term['total_interest_after_commission'], 24 * 3)
+
+        # Top-level interest is one monthly period; at maturity all three periods have accrued
+        response = self.client.get(reverse('portfolio') + '?as_of=today')
+        monthly = response.data['breakdown']['as_syndicate_member']['interest_after_commission']
+        self.assertEqual(monthly, 20.0)
+        accrued = response.data['accrued']
+        self.assertEqual(accrued['as_syndicate_member']['interest_after_commission'], monthly * 3)
+        self.assertEqual(accrued['as_syndicate_member'], accrued['over_term']['as_syndicate_member'])
+        self.assertEqual(accrued['total_interest_after_commission'], accrued['over_term']['total_interest_after_commission'])
+        response = self.client.get(reverse('portfolio') + '?as_of=yesterday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_portfolio_accrues_risk_taker_interest(self):
+        """Test that a loan the risk taker holds no split of accrues its transaction interest"""
+        lender = CustomUser.objects.create_user(username='sched_lender', email='sched_lender@test.com', password='testpass123')
+        loan = Transactions.objects.create(
+            risk_taker_id=lender, total_principal_amount=1000, total_interest=30, risk_taker_flag=True,
+            risk_taker_commission=10, month_period_of_loan=3, start_date=date(2024, 1, 31), end_date=date(2024, 4, 30)
+        )
+        Splitwise.objects.create(transaction_id=loan, syndicator_id=self.syndicator, principal_amount=1000, interest_amount=2)
+        self.client.force_authenticate(user=lender)
+
+        response = self.client.get(reverse('portfolio') + '?as_of=2024-03-15')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        monthly = response.data['breakdown']['as_risk_taker']
+        self.assertEqual((monthly['interest'], monthly['commission_earned']), (30, 2.0))
+        self.assertEqual(response.data['total_interest_after_commission'], 32.0)
+
+        accrued = response.data['accrued']
+        self.assertAlmostEqual(accrued['as_risk_taker']['interest'], 30 * (1 + 15 / 31))
+        self.assertAlmostEqual(accrued['total_interest_after_commission'], 32 * (1 + 15 / 31))
+        over_term = accrued['over_term']
+        self.assertAlmostEqual(over_term['as_risk_taker']['interest'], 30 * 3)
+        self.assertAlmostEqual(over_term['total_interest_after_commission'], response.data['total_interest_after_commission'] * 3)
+
+    def test_upcoming_cash_flows_defaults_and_errors(self):
+        self.client.force_authenticate(user=self.syndicator)
+        response = self.client.get(reverse('upcoming_cash_flows'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['from'], date.today().isoformat())
+        self.assertEqual(response.data['cash_flows'], [])
+        for query in ('?from=2024-13-01', '?from=2024-05-01&until=2024-04-01'):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('upcoming_cash_flows') + query)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SettlementTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            CustomUser.objects.create_user(username=f'st_user{i}', email=f'st_user{i}@test.com', password='testpass123')
+            for i in range(5)
+        ]
+        rng = random.Random(8)
+        for _ in range(10):
+            flag = rng.random() < 0.7
+            transaction = Transactions.objects.create(
+                risk_taker_id=rng.choice(self.users), total_principal_amount=3000, total_interest=2,
+                risk_taker_flag=flag, risk_taker_commission=rng.choice([10, 12.5, 100]) if flag else 0,
+                month_period_of_loan=rng.choice([1, 2, 6]), start_date=date(2024, 5, rng.randint(1, 28)),
+                end_date=date(2024, 12, 1)
+            )
+            for syndicator in rng.sample(self.users, rng.randint(1, 3)):
+                Splitwise.objects.create(
+                    transaction_id=transaction, syndicator_id=syndicator,
+                    principal_amount=rng.choice([500, 1234.5]), interest_amount=rng.choice([1.5, 2])
+                )
+        self.client.force_authenticate(user=self.users[0])
+
+    def test_minimal_transfers(self):
+        transfers = minimal_transfers(np.array([-500, 300, -100, 200, 100]))
+        self.assertEqual(transfers, [(0, 1, 300), (0, 3, 200), (2, 4, 100)])
+        self.assertEqual(minimal_transfers(np.array([0, 0])), [])
+
+    def test_transfers_settle_random_balances(self):
+        rng = random.Random(2)
+        for _ in range(50):
+            balances = [rng.randint(-10_000, 10_000) for _ in range(rng.randint(1, 60))]
+            balances.append(-sum(balances))
+            transfers = minimal_transfers(np.array(balances))
+            remaining = list(balances)
+            for payer, payee, amount in transfers:
+                self.assertGreater(amount, 0)
+                self.assertLess(balances[payer], 0)
+                self.assertGreater(balances[payee], 0)
+                remaining[payer] += amount
+                remaining[payee] -= amount
+            self.assertEqual(remaining, [0] * len(balances))
+            self.assertLess(len(transfers), max(sum(1 for balance in balances if balance), 1))
+
+    def test_balances_match_model_methods(self):
+        response = self.client.get(reverse('settlement') + '?from=2024-06-01&until=2024-07-31')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['until'], '2024-07-31')
+
+        involved = set(Transactions.objects.filter(risk_taker_id=self.users[0]).values_list('pk', flat=True))
+        involved.update(Splitwise.objects.filter(syndicator_id=self.users[0]).values_list('transaction_id', flat=True))
+        expected = defaultdict(float)
+        pairs = set()
+        for split in Splitwise.objects.filter(transaction_id__in=involved).select_related('transaction_id'):
+            loan = split.transaction_id
+            if split.syndicator_id_id == loan.risk_taker_id_id:
+                continue
+            for installment in range(1, loan.month_period_of_loan + 1):
+                due_date = add_months(loan.start_date, installment)
+                if not date(2024, 6, 1) <= due_date <= date(2024, 7, 31):
+                    continue
+                amount = split.get_interest_after_commission()
+                if installment == loan.month_period_of_loan:
+                    amount += split.principal_amount
+                if round(amount * 100) > 0:
+                    expected[str(split.syndicator_id_id)] += round(amount * 100) / 100
+                    expected[str(loan.risk_taker_id_id)] -= round(amount * 100) / 100
+                    pairs.add((loan.risk_taker_id_id, split.syndicator_id_id))
+
+        balances = {row['user_id']: row for row in response.data['balances']}
+        self.assertEqual(set(balances), set(expected))
+        for user_id, balance in expected.items():
+            self.assertAlmostEqual(balances[user_id]['balance'], balance)
+            self.assertAlmostEqual(
+                balances[user_id]['receivable'] - balances[user_id]['payable'], balances[user_id]['balance']
+            )
+        self.assertAlmostEqual(response.data['balance'], expected.get(str(self.users[0].pk), 0))
+        self.assertEqual(response.data['obligations'], len(pairs))
+
+        remaining = {user_id: row['balance'] for user_id, row in balances.items()}
+        self.assertTrue(response.data['transfers'])
+        for transfer in response.data['transfers']:
+            remaining[transfer['from_user_id']] += transfer['amount']
+            remaining[transfer['to_user_id']] -= transfer['amount']
+            self.assertIsNotNone(transfer['to_username'])
+        for balance in remaining.values():
+            self.assertAlmostEqual(balance, 0)
+
+    def test_empty_cycle(self):
+        response = self.client.get(reverse('settlement') + '?from=2030-01-01')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['until'], '2030-01-31')
+        self.assertEqual(response.data['transfers'], [])
+        self.assertEqual(response.data['balance'], 0)
+
+    def test_invalid_dates(self):
+        for query in ('from=2024-13-01', 'from=2024-06-01&until=2024-05-01'):
+            response = self.client.get(reverse('settlement') + f'?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+class RepaymentLedgerTests(APITestCase):
+    def setUp(self):
+        self.risk_taker = CustomUser.objects.create_user(username='rp_rt', email='rp_rt@test.com', password='testpass123')
+        self.syndicator = CustomUser.objects.create_user(username='rp_s', email='rp_s@test.com', password='testpass123')
+        self.outsider = CustomUser.objects.create_user(username='rp_out', email='rp_out@test.com', password='testpass123')
+        self.transaction = Transactions.objects.create(
+            risk_taker_id=self.risk_taker, total_principal_amount=3000, total_interest=2, month_period_of_loan=6,
+            start_date=date(2024, 1, 1), end_date=date(2024, 7, 1)
+        )
+        self.own_split = Splitwise.objects.create(
+            transaction_id=self.transaction, syndicator_id=self.risk_taker, principal_amount=1000, interest_amount=2
+        )
+        self.split = Splitwise.objects.create(
+            transaction_id=self.transaction, syndicator_id=self.syndicator, principal_amount=2000, interest_amount=2
+        )
+        self.url = reverse('transaction_repayments', args=[self.transaction.pk])
+        self.client.force_authenticate(user=self.risk_taker)
+
+    def post(self, *entries, paid_on='2024-02-01'):
+        return self.client.post(self.url, {
+            "paid_on": paid_on,
+            "repayments": [
+                {"splitwise_id": str(split.pk), "principal_amount": principal, "interest_amount": interest}
+                for split, principal, interest in entries
+            ],
+        }, format='json')
+
+    def test_running_balances(self):
+        response = self.post((self.split, 500, 40), (self.own_split, 0, 20))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        response = self.post((self.split, 1500, 40), paid_on='2024-03-01')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+        rows = list(self.split.repayments.order_by('sequence').values_list(
+            'sequence', 'principal_paid', 'outstanding_principal', 'interest_paid_total'
+        ))
+        self.assertEqual(rows, [(1, 500, 1500, 40), (2, 1500, 0, 80)])
+        self.assertEqual(self.split.get_outstanding_principal(), 0)
+        self.assertEqual(self.own_split.get_outstanding_principal(), 1000)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['outstanding_principal'], 1000)
+        splits = {split['splitwise_id']: split for split in response.data['splits']}
+        self.assertEqual(splits[str(self.split.pk)]['principal_repaid'], 2000)
+        self.assertEqual(splits[str(self.split.pk)]['interest_paid_total'], 80)
+        self.assertEqual(splits[str(self.own_split.pk)]['repayments'], 1)
+        self.assertEqual(
+            [(row['paid_on'], row['sequence']) for row in response.data['repayments']],
+            [('2024-02-01', 1), ('2024-02-01', 1), ('2024-03-01', 2)]
+        )
+
+    def test_balances_match_history(self):
+        rng = random.Random(4)
+        for day in range(1, 20):
+            self.assertEqual(self.post((self.split, rng.choice([0, 10, 55.5]), 1), paid_on=f'2024-03-{day:02d}').status_code,
+                             status.HTTP_201_CREATED)
+        balances = with_balances(Splitwise.objects.filter(pk=self.split.pk)).get()
+        history = self.split.repayments.all()
+        self.assertEqual(balances.last_sequence, len(history))
+        self.assertAlmostEqual(balances.outstanding_principal, 2000 - sum(row.principal_paid for row in history))
+        self.assertAlmostEqual(balances.interest_paid_total, sum(row.interest_paid for row in history))
+
+    def test_posting_is_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            post_repayments(self.transaction, [(self.split.pk, 100, 1), (self.own_split.pk, 100, 1)], date(2024, 2, 1))
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "core_repayment"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_invalid_postings_write_nothing(self):
+        other = Transactions.objects.create(
+            risk_taker_id=self.risk_taker, total_principal_amount=10, total_interest=2, month_period_of_loan=1,
+            start_date=date(2024, 1, 1), end_date=date(2024, 2, 1)
+        )
+        foreign_split = Splitwise.objects.create(
+            transaction_id=other, syndicator_id=self.risk_taker, principal_amount=10, interest_amount=2
+        )
+        for entries in (
+            [(self.split, 2000.5, 0)],
+            [(self.split, -1, 0)],
+            [(self.split, 0, 0)],
+            [(self.split, 10, 0), (self.split, 10, 0)],
+            [(self.own_split, 10, 0), (foreign_split, 10, 0)],
+            # float() parses these, and NaN passes every comparison check
+            [(self.split, "NaN", 0)],
+            [(self.split, 10, "inf")],
+            [(self.split, "-Infinity", 0)],
+        ):
+            response = self.post(*entries)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, entries)
+        response = self.client.post(self.url, {"repayments": [{"principal_amount": 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Repayment.objects.exists())
+
+    def test_permissions(self):
+        self.client.force_authenticate(user=self.syndicator)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.post((self.split, 10, 0)).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        missing = reverse('transaction_repayments', args=[uuid.uuid4()])
+        self.assertEqual(self.client.get(missing).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MaturityCalendarTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='mc_user', email='mc_user@test.com', password='testpass123')
+        self.other = CustomUser.objects.create_user(username='mc_other', email='mc_other@test.com', password='testpass123')
+        self.today = date.today()
+        rng = random.Random(6)
+        for offset in (-3, 0, 2, 9, 30, 45, 89, 120):
+            for risk_taker in (self.user, self.other):
+                flag = rng.random() < 0.7
+                transaction = Transactions.objects.create(
+                    risk_taker_id=risk_taker, total_principal_amount=3000, total_interest=2, risk_taker_flag=flag,
+                    risk_taker_commission=rng.choice([10, 12.5, 100]) if flag else 0, month_period_of_loan=6,
+                    start_date=self.today - timedelta(days=180), end_date=self.today + timedelta(days=offset)
+                )
+                for syndicator in rng.sample([self.user, self.other], rng.randint(1, 2)):
+                    Splitwise.objects.create(
+                        transaction_id=transaction, syndicator_id=syndicator,
+                        principal_amount=rng.choice([500, 1234.5]), interest_amount=rng.choice([1.5, 2])
+                    )
+        self.client.force_authenticate(user=self.user)
+
+    def test_buckets_match_model_methods(self):
+        for bucket in ('week', 'month'):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('maturity_calendar') + f'?bucket={bucket}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+            self.assertEqual(response.data['until'], (self.today + timedelta(days=90)).isoformat())
+
+            def period_start(day):
+                if bucket == 'week':
+                    return day - timedelta(days=day.weekday())
+                return day.replace(day=1)
+
+            splits = Splitwise.objects.filter(
+                transaction_id__end_date__range=(self.today, self.today + timedelta(days=90))
+            ).select_related('transaction_id')
+            periods = sorted({period_start(split.transaction_id.end_date) for split in splits})
+            self.assertEqual([item['period_start'] for item in response.data['buckets']], [p.isoformat() for p in periods])
+
+            for item, period in zip(response.data['buckets'], periods):
+                in_period = [split for split in splits if period_start(split.transaction_id.end_date) == period]
+                own = [split for split in in_period if split.syndicator_id_id == self.user.pk]
+                arranged = [split for split in in_period if split.transaction_id.risk_taker_id_id == self.user.pk]
+                syndicate = item['as_syndicate_member']
+                self.assertAlmostEqual(syndicate['principal'], sum(split.principal_amount for split in own))
+                self.assertAlmostEqual(
+                    syndicate['interest_after_commission'], sum(split.get_interest_after_commission() for split in own)
+                )
+                self.assertAlmostEqual(syndicate['commission_paid'], sum(split.get_commission_deducted() for split in own))
+                self.assertAlmostEqual(
+                    syndicate['amount_due'],
+                    sum(split.principal_amount + split.get_interest_after_commission() for split in own)
+                )
+                self.assertEqual(syndicate['loans'], len({split.transaction_id_id for split in own}))
+                self.assertAlmostEqual(
+                    item['as_risk_taker']['commission_earned'], sum(split.get_commission_deducted() for split in arranged)
+                )
+                self.assertEqual(item['as_risk_taker']['loans'], len({split.transaction_id_id for split in arranged}))
+
+    def test_days_window(self):
+        response = self.client.get(reverse('maturity_calendar') + '?days=0&bucket=month')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        loans = sum(
+            item['as_syndicate_member']['loans'] + item['as_risk_taker']['loans'] for item in response.data['buckets']
+        )
+        maturing_today = Transactions.objects.filter(end_date=self.today)
+        self.assertGreater(loans, 0)
+        self.assertEqual(
+            loans,
+            maturing_today.filter(splitwise_entries__syndicator_id=self.user).distinct().count()
+            + maturing_today.filter(risk_taker_id=self.user).count()
+        )
+
+    def test_invalid_parameters(self):
+        for query in ('bucket=day', 'days=-1', 'days=abc', 'days=100000'):
+            response = self.client.get(reverse('maturity_calendar') + f'?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+class TimelineTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='tl_user', email='tl_user@test.com', password='testpass123')
+        self.other = CustomUser.objects.create_user(username='tl_other', email='tl_other@test.com', password='testpass123')
+        rng = random.Random(11)
+        for month in (1, 1, 3, 6):
+            for risk_taker in (self.user, self.other):
+                flag = rng.random() < 0.7
+                transaction = Transactions.objects.create(
+                    risk_taker_id=risk_taker, total_principal_amount=3000, total_interest=2, risk_taker_flag=flag,
+                    risk_taker_commission=rng.choice([10, 12.5, 100]) if flag else 0, month_period_of_loan=6,
+                    start_date=date(2024, month, rng.randint(1, 28)), end_date=date(2024, 12, 1)
+                )
+                for syndicator in rng.sample([self.user, self.other], rng.randint(1, 2)):
+                    Splitwise.objects.create(
+                        transaction_id=transaction, syndicator_id=syndicator,
+                        principal_amount=rng.choice([500, 1234.5]), interest_amount=rng.choice([1.5, 2])
+                    )
+        self.client.force_authenticate(user=self.user)
+
+    def test_series_match_model_methods(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('timeline'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['months'], ['2024-01', '2024-03', '2024-06'])
+
+        for position, month in enumerate((1, 3, 6)):
+            splits = Splitwise.objects.filter(transaction_id__start_date__month=month).select_related('transaction_id')
+            own = [split for split in splits if split.syndicator_id_id == self.user.pk]
+            arranged = [split for split in splits if split.transaction_id.risk_taker_id_id == self.user.pk]
+            syndicate = response.data['as_syndicate_member']
+            risk_taker = response.data['as_risk_taker']
+            self.assertAlmostEqual(syndicate['principal'][position], sum(split.principal_amount for split in own))
+            self.assertAlmostEqual(
+                syndicate['interest'][position], sum(split.principal_amount * split.interest_amount / 100 for split in own)
+            )
+            self.assertAlmostEqual(
+                syndicate['interest_after_commission'][position], sum(split.get_interest_after_commission() for split in own)
+            )
+            self.assertAlmostEqual(
+                syndicate['commission_paid'][position], sum(split.get_commission_deducted() for split in own)
+            )
+            self.assertEqual(syndicate['loans'][position], len({split.transaction_id_id for split in own}))
+            self.assertAlmostEqual(risk_taker['principal'][position], sum(split.principal_amount for split in arranged))
+            self.assertAlmostEqual(
+                risk_taker['commission_earned'][position], sum(split.get_commission_deducted() for split in arranged)
+            )
+            self.assertEqual(risk_taker['loans'][position], len({split.transaction_id_id for split in arranged}))
+
+    def test_empty_timeline(self):
+        newcomer = CustomUser.objects.create_user(username='tl_new', email='tl_new@test.com', password='testpass123')
+        self.client.force_authenticate(user=newcomer)
+        response = self.client.get(reverse('timeline'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['months'], [])
+        self.assertEqual(response.data['as_risk_taker']['commission_earned'], [])
+
+
+class CounterpartyExposureTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ex_user', email='ex_user@test.com', password='testpass123')
+        self.others = [
+            CustomUser.objects.create_user(username=f'ex_other{i}', email=f'ex_other{i}@test.com', password='testpass123')
+            for i in range(4)
+        ]
+        rng = random.Random(5)
+        members = [self.user, *self.others]
+        for _ in range(12):
+            flag = rng.random() < 0.7
+            transaction = Transactions.objects.create(
+                risk_taker_id=rng.choice(members), total_principal_amount=3000, total_interest=2, risk_taker_flag=flag,
+                risk_taker_commission=rng.choice([10, 12.5, 100]) if flag else 0, month_period_of_loan=6,
+                start_date=date(2024, 1, 1), end_date=date(2024, 7, 1)
+            )
+            for syndicator in rng.sample(members, rng.randint(1, 3)):
+                Splitwise.objects.create(
+                    transaction_id=transaction, syndicator_id=syndicator,
+                    principal_amount=rng.choice([500, 1234.5, 2000]), interest_amount=rng.choice([1.5, 2])
+                )
+        self.client.force_authenticate(user=self.user)
+
+    def expected(self, role):
+        """Per counterparty id: the splits behind its exposure, from the model methods"""
+        groups = defaultdict(list)
+        for split in Splitwise.objects.select_related('transaction_id'):
+            risk_taker_id = split.transaction_id.risk_taker_id_id
+            if split.syndicator_id_id == risk_taker_id:
+                continue
+            if role == 'risk_taker' and risk_taker_id == self.user.pk:
+                groups[str(split.syndicator_id_id)].append(split)
+            if role == 'syndicator' and split.syndicator_id_id == self.user.pk:
+                groups[str(risk_taker_id)].append(split)
+        return groups
+
+    def get_all_pages(self, role, page_size):
+        counterparties = []
+        url = reverse('exposure') + f'?role={role}&page_size={page_size}'
+        response = self.client.get(url)
+        first_page = response.data
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+            counterparties.extend(response.data['counterparties'])
+            if response.data['next_cursor'] is None:
+                return first_page, counterparties
+            response = self.client.get(url + f"&cursor={response.data['next_cursor']}")
+            # Concentration covers every counterparty, so only the first page has it
+            self.assertNotIn('concentration', response.data)
+
+    def test_exposure_matches_model_methods(self):
+        for role in ('risk_taker', 'syndicator'):
+            expected = self.expected(role)
+            first_page, counterparties = self.get_all_pages(role, page_size=1)
+            self.assertEqual(first_page['role'], role)
+            self.assertEqual(sorted(row['user_id'] for row in counterparties), sorted(expected))
+
+            principals = [row['principal'] for row in counterparties]
+            self.assertEqual(principals, sorted(principals, reverse=True))
+            for row in counterparties:
+                splits = expected[row['user_id']]
+                self.assertEqual(row['username'], splits[0].syndicator_id.username if role == 'risk_taker'
+                                 else splits[0].transaction_id.risk_taker_id.username)
+                self.assertEqual(row['loans'], len({split.transaction_id_id for split in splits}))
+                self.assertAlmostEqual(row['principal'], sum(split.principal_amount for split in splits))
+                self.assertAlmostEqual(
+                    row['interest'], sum(split.principal_amount * split.interest_amount / 100 for split in splits)
+                )
+                self.assertAlmostEqual(
+                    row['interest_after_commission'], sum(split.get_interest_after_commission() for split in splits)
+                )
+                self.assertAlmostEqual(row['commission'], sum(split.get_commission_deducted() for split in splits))
+
+            totals = [sum(split.principal_amount for split in splits) for splits in expected.values()]
+            shares = [principal / sum(totals) for principal in sorted(totals, reverse=True)]
+            concentration = first_page['concentration']
+            self.assertEqual(concentration['counterparties'], len(totals))
+            self.assertAlmostEqual(concentration['total_principal'], sum(totals))
+            self.assertAlmostEqual(concentration['top_share'], sum(shares[:5]))
+            self.assertAlmostEqual(concentration['herfindahl_index'], sum(share ** 2 for share in shares))
+
+    def test_top_share(self):
+        response = self.client.get(reverse('exposure') + '?top=1')
+        concentration = response.data['concentration']
+        self.assertAlmostEqual(
+            concentration['top_share'], response.data['counterparties'][0]['principal'] / concentration['total_principal']
+        )
+
+    def test_no_exposure(self):
+        newcomer = CustomUser.objects.create_user(username='ex_new', email='ex_new@test.com', password='testpass123')
+        self.client.force_authenticate(user=newcomer)
+        response = self.client.get(reverse('exposure'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['counterparties'], [])
+        self.assertIsNone(response.data['next_cursor'])
+        self.assertEqual(response.data['concentration']['herfindahl_index'], 0)
+
+    def test_equal_principals_page_without_skips(self):
+        # 0.1 + 0.2 and 0.3 differ as float sums but are the same number of cents
+        newcomer = CustomUser.objects.create_user(username='ex_tie', email='ex_tie@test.com', password='testpass123')
+        transaction = Transactions.objects.create(
+            risk_taker_id=newcomer, total_principal_amount=1, total_interest=2, risk_taker_flag=False,
+            risk_taker_commission=0, month_period_of_loan=6, start_date=date(2024, 1, 1), end_date=date(2024, 7, 1)
+        )
+        for syndicator, amounts in zip(self.others, [[0.1, 0.2], [0.3], [0.15, 0.15], [0.3]]):
+            for amount in amounts:
+                Splitwise.objects.create(
+                    transaction_id=transaction, syndicator_id=syndicator, principal_amount=amount, interest_amount=2
+                )
+        self.client.force_authenticate(user=newcomer)
+        first_page, counterparties = self.get_all_pages('risk_taker', page_size=1)
+        user_ids = [row['user_id'] for row in counterparties]
+        self.assertEqual(user_ids, sorted(str(other.pk) for other in self.others))
+
+        # The top counterparties run past the first page
+        response = self.client.get(reverse('exposure') + '?page_size=1&top=3')
+        self.assertAlmostEqual(response.data['concentration']['top_share'], 0.75)
+
+    def test_invalid_parameters(self):
+        other_id = str(self.others[0].pk)
+        float_cursor = base64.urlsafe_b64encode(json.dumps([1234.5, other_id]).encode()).decode()
+        for query in ('role=lender', 'page_size=0', 'page_size=1000', 'top=0', 'cursor=abc', 'cursor=WzFd',
+                      f'cursor={float_cursor}'):
+            response = self.client.get(reverse('exposure') + f'?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+class PortfolioSnapshotTests(APITestCase):
+    def setUp(self):
+        self.risk_taker = CustomUser.objects.create_user(username='snap_rt', email='snap_rt@test.com', password='testpass123')
+        self.syndicator = CustomUser.objects.create_user(username='snap_s', email='snap_s@test.com', password='testpass123')
+        self.create_loan(date(2024, 1, 31), 3, [(self.risk_taker, 1000), (self.syndicator, 2000)])
+
+    def create_loan(self, start_date, months, members):
+        transaction = Transactions.objects.create(
+            risk_taker_id=self.risk_taker, total_principal_amount=sum(amount for _, amount in members), total_interest=2,
+            risk_taker_flag=True, risk_taker_commission=10, month_period_of_loan=months, start_date=start_date,
+            end_date=add_months(start_date, months)
+        )
+        for user, amount in members:
+            Splitwise.objects.create(transaction_id=transaction, syndicator_id=user, principal_amount=amount, interest_amount=2)
+
+    def snapshot(self, until, *args):
+        call_command('snapshot_portfolios', f'--date={until}', *args, stdout=StringIO())
+
+    def test_snapshots_match_accrued_portfolio(self):
+        self.snapshot('2024-05-15')
+        days = (date(2024, 5, 15) - date(2024, 1, 31)).days + 1
+        self.assertEqual(PortfolioSnapshot.objects.filter(user_id=self.syndicator).count(), days)
+        self.assertEqual(PortfolioSnapshot.objects.filter(user_id=self.risk_taker).count(), days)
+
+        for user in (self.risk_taker, self.syndicator):
+            self.client.force_authenticate(user=user)
+            for day in ('2024-01-31', '2024-02-14', '2024-03-31', '2024-04-29', '2024-04-30', '2024-05-15'):
+                snapshot = PortfolioSnapshot.objects.get(user_id=user, date=day)
+                accrued = self.client.get(reverse('portfolio') + f'?as_of={day}').data['accrued']
+                self.assertAlmostEqual(snapshot.interest_accrued, accrued['as_syndicate_member']['interest_after_commission'])
+                self.assertAlmostEqual(snapshot.commission_accrued, accrued['as_risk_taker']['commission_earned'])
+
+        snapshot = PortfolioSnapshot.objects.get(user_id=self.syndicator, date='2024-04-29')
+        self.assertEqual((snapshot.principal_outstanding, snapshot.active_loans), (2000, 1))
+        snapshot = PortfolioSnapshot.objects.get(user_id=self.syndicator, date='2024-04-30')
+        self.assertEqual((snapshot.principal_outstanding, snapshot.active_loans), (0, 0))
+        self.assertAlmostEqual(snapshot.net_position, 108.0)
+
+    def test_incremental_runs(self):
+        self.snapshot('2024-03-01')
+        first_run = PortfolioSnapshot.objects.get(user_id=self.syndicator, date='2024-02-01').computed_at
+
+        # Untouched users only get the new days
+        self.snapshot('2024-03-05')
+        self.assertEqual(PortfolioSnapshot.objects.get(user_id=self.syndicator, date='2024-02-01').computed_at, first_run)
+        self.assertEqual(PortfolioSnapshot.objects.filter(user_id=self.syndicator).count(), 35)
+
+        # A backdated loan rewrites the history of everyone in it
+        outsider = CustomUser.objects.create_user(username='snap_o', email='snap_o@test.com', password='testpass123')
+        self.create_loan(date(2023, 12, 1), 6, [(outsider, 500), (self.risk_taker, 500)])
+        self.snapshot('2024-03-05')
+        self.assertEqual(PortfolioSnapshot.objects.filter(user_id=self.syndicator, date__gt='2024-03-05').count(), 0)
+        self.assertEqual(PortfolioSnapshot.objects.get(user_id=self.syndicator, date='2024-02-01').computed_at, first_run)
+        self.assertEqual(PortfolioSnapshot.objects.filter(user_id=self.risk_taker).earliest('date').date, date(2023, 12, 1))
+        self.assertEqual(PortfolioSnapshot.objects.filter(user_id=outsider).count(), 96)
+        self.assertEqual(
+            PortfolioSnapshot.objects.get(user_id=self.risk_taker, date='2024-02-01').principal_outstanding, 1500
+        )
+
+        self.snapshot('2024-03-05', '--full')
+        self.assertGreater(PortfolioSnapshot.objects.get(user_id=self.syndicator, date='2024-02-01').computed_at, first_run)
+
+    def test_edits_and_deletes_rewrite_history(self):
+        self.snapshot('2024-03-05')
+        self.assertFalse(StaleSnapshotUser.objects.exists())
+        split = Splitwise.objects.get(syndicator_id=self.syndicator)
+
+        # Editing a split rewrites the history of its syndicator and risk taker
+        split.principal_amount = 2500
+        split.save()
+        self.assertEqual(set(StaleSnapshotUser.objects.values_list('user_id', flat=True)), {self.syndicator.pk, self.risk_taker.pk})
+        self.snapshot('2024-03-05')
+        self.assertEqual(PortfolioSnapshot.objects.get(user_id=self.syndicator, date='2024-02-01').principal_outstanding, 2500)
+        self.assertEqual(PortfolioSnapshot.objects.get(user_id=self.risk_taker, date='2024-02-01').principal_outstanding, 1000)
+        self.assertFalse(StaleSnapshotUser.objects.exists())
+
+        # Moving the loan's start later drops the days before it
+        transaction = split.transaction_id
+        transaction.start_date = date(2024, 2, 15)
+        transaction.save()
+        self.snapshot('2024-03-05')
+        self.assertEqual(PortfolioSnapshot.objects.filter(user_id=self.syndicator).earliest('date').date, date(2024, 2, 15))
+
+        # Deleting it leaves both users without splits, and without snapshots
+        transaction.delete()
+        self.snapshot('2024-03-05')
+        self.assertFalse(PortfolioSnapshot.objects.exists())
+
+    def test_full_run_drops_users_without_splits(self):
+        self.snapshot('2024-03-05')
+        Splitwise.objects.filter(syndicator_id=self.syndicator).delete()
+        StaleSnapshotUser.objects.all().delete()  # As if the change bypassed the signals
+
+        self.snapshot('2024-03-05')
+        self.assertTrue(PortfolioSnapshot.objects.filter(user_id=self.syndicator).exists())
+        self.snapshot('2024-03-05', '--full')
+        self.assertFalse(PortfolioSnapshot.objects.filter(user_id=self.syndicator).exists())
+        self.assertTrue(PortfolioSnapshot.objects.filter(user_id=self.risk_taker).exists())
+
+    def test_history_endpoint(self):
+        self.snapshot('2024-03-31')
+        self.client.force_authenticate(user=self.syndicator)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('portfolio_history') + '?from=2024-02-28&until=2024-03-01')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['dates'], ['2024-02-28', '2024-02-29', '2024-03-01'])
+        self.assertEqual(response.data['principal_outstanding'], [2000, 2000, 2000])
+        self.assertAlmostEqual(response.data['interest_accrued'][1], 36.0)
+        self.assertAlmostEqual(response.data['net_position'][1], 2036.0)
+
+        response = self.client.get(reverse('portfolio_history') + '?until=2024-03-31')
+        self.assertEqual(response.data['from'], '2024-01-01')
+        self.assertEqual(response.data['dates'][0], '2024-01-31')
+        response = self.client.get(reverse('portfolio_history') + '?from=2024-04-01&until=2024-03-01')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchViewTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='batch', email='batch@test.com', password='testpass123')
+        self.friend = CustomUser.objects.create_user(username='batch_friend', email='batch_friend@test.com', password='testpass123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        FriendRequest.objects.create(user_id=self.user, requested_id=self.friend, status='pending')
+        transaction = Transactions.objects.create(
+            risk_taker_id=self.user, total_principal_amount=1000, total_interest=2, month_period_of_loan=12,
+            start_date=date(2025, 1, 1), end_date=date(2026, 1, 1)
+        )
+        Splitwise.objects.create(transaction_id=transaction, syndicator_id=self.user, principal_amount=1000, interest_amount=2)
+
+    def test_dashboard_batch_matches_individual_calls(self):
+        """Test that a batch returns the same bodies as separate calls while authenticating once"""
+        paths = ['portfolio/', 'syndicate/', 'my_splitwise/', '/api/check_friend_request_status/']
+        with mock.patch.object(
+            TimedJWTAuthentication, 'authenticate', autospec=True, side_effect=TimedJWTAuthentication.authenticate
+        ) as authenticate:
+            response = self.client.post(reverse('batch'), {
+                'requests': [{'id': path, 'method': 'GET', 'path': path} for path in paths]
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(authenticate.call_count, 1)
+
+        results = response.json()['responses']
+        self.assertEqual([result['id'] for result in results], paths)
+        for path, result in zip(paths, results):
+            expected = self.client.get('/api/' + path.removeprefix('/api/'))
+            self.assertEqual(result['status'], expected.status_code)
+            self.assertEqual(result['body'], expected.json())
+
+    def test_writes_and_query_strings(self):
+        """Test that sub-requests carry JSON bodies and query strings"""
+        response = self.client.post(reverse('batch'), {'requests': [
+            {'method': 'POST', 'path': 'create_transaction/', 'body': {
+                'total_principal_amount': 500, 'total_interest_amount': 2, 'start_date': '2025-01-01',
+                'end_date': '2025-12-01', 'month_period_of_loan': 11
+            }},
+            {'method': 'GET', 'path': 'all_transaction/?fields=total_principal_amount'},
+        ]}, format='json')
+        created, listed = response.json()['responses']
+        self.assertEqual(created['status'], status.HTTP_201_CREATED, created)
+        self.assertEqual(listed['status'], status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(t['total_principal_amount'] for t in listed['body']['transactions']), [500.0, 1000.0]
+        )
+
+    def test_idempotency_key_is_derived_per_sub_request(self):
+        """Test that sub-requests don't share the batch's Idempotency-Key, and that a retried batch replays"""
+        batch = {'requests': [
+            {'method': 'POST', 'path': 'create_transaction/', 'body': {
+                'total_principal_amount': principal, 'total_interest_amount': 2, 'start_date': '2025-01-01',
+                'end_date': '2025-12-01', 'month_period_of_loan': 11
+            }}
+            for principal in (500, 700)
+        ]}
+        for _ in range(2):
+            response = self.client.post(reverse('batch'), batch, format='json', HTTP_IDEMPOTENCY_KEY='batch-key')
+            self.assertEqual([result['status'] for result in response.json()['responses']], [201, 201])
+        self.assertEqual(
+            sorted(Transactions.objects.filter(risk_taker_id=self.user).values_list('total_principal_amount', flat=True)),
+            [500.0, 700.0, 1000.0]
+        )
+        self.assertEqual(
+            sorted(IdempotencyKey.objects.values_list('key', flat=True)), ['batch-key:0', 'batch-key:1']
+        )
+
+    def test_invalid_sub_requests(self):
+        """Test that bad sub-requests fail on their own and bad batches are rejected"""
+        response = self.client.post(reverse('batch'), {'requests': [
+            {'path': 'no_such_route/'},
+            {'method': 'POST', 'path': 'batch/', 'body': {'requests': []}},
+            {'method': 'DELETE', 'path': 'portfolio/'},
+            'portfolio/',
+            {'path': 'portfolio/'},
+        ]}, format='json')
+        self.assertEqual([result['status'] for result in response.json()['responses']], [404, 400, 405, 400, 200])
+
+        response = self.client.post(reverse('batch'), {'requests': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(BATCH_MAX_REQUESTS=2):
+            response = self.client.post(reverse('batch'), {'requests': [{'path': 'portfolio/'}] * 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.credentials()
+        response = self.client.post(reverse('batch'), {'requests': [{'path': 'portfolio/'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RequestCoalescingTests(APITestCase):
+    def run_concurrently(self, count, target):
+        results = [None] * count
+        threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, target())) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_single_flight_shares_one_execution(self):
+        """Test that concurrent callers with the same key wait for the first computation"""
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'total': 42}
+
+        leader, leader_result = self.run_concurrently(1, lambda: flight.do('key', compute))
+        started.wait(5)
+        followers, follower_results = self.run_concurrently(4, lambda: flight.do('key', compute))
+        # Give the followers time to join the in-flight call
+        threading.Event().wait(0.2)
+        release.set()
+        for thread in leader + followers:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(leader_result, [({'total': 42}, False)])
+        self.assertEqual(follower_results, [({'total': 42}, True)] * 4)
+        self.assertEqual(flight._calls, {})
+        # Once finished, the next call computes again
+        self.assertEqual(flight.do('key', compute), ({'total': 42}, False))
+        self.assertEqual(len(calls), 2)
+
+    def test_single_flight_propagates_errors(self):
+        flight = SingleFlight()
+        with self.assertRaises(ZeroDivisionError):
+            flight.do('key', lambda: 1 / 0)
+        self.assertEqual(flight._calls, {})
+
+    def test_cache_single_flight_waits_for_other_process(self):
+        """Test that a caller finding another process's lock polls for its published result"""
+        flight = CacheSingleFlight(timeout=5, result_ttl=5)
+        key = f'test:{uuid.uuid4()}'
+        cache.add(f'{key}:lock', 1, timeout=5)
+        publisher = threading.Timer(0.1, lambda: cache.set(f'{key}:result', ({'total': 1}, 200), timeout=5))
+        publisher.start()
+        self.assertEqual(flight.do(key, lambda: self.fail("computed while another process held the lock")),
+                         (({'total': 1}, 200), True))
+        publisher.join()
+
+        other_key = f'test:{uuid.uuid4()}'
+        self.assertEqual(flight.do(other_key, lambda: 'fresh', publish=lambda result: False), ('fresh', False))
+        self.assertIsNone(cache.get(f'{other_key}:result'))
+        self.assertIsNone(cache.get(f'{other_key}:lock'))
+
+    def test_coalesced_view_shares_response_across_threads(self):
+        """Test that concurrent identical requests run the view once and get separate Responses"""
+        release = threading.Event()
+        calls = []
+
+        class SlowView(APIView):
+            @coalesced
+            def get(self, request):
+                calls.append(1)
+                release.wait(5)
+                return Response({'value': len(calls)})
+
+        user = CustomUser(username='coalesce')
+        view = SlowView.as_view()
+
+        def send():
+            request = APIRequestFactory().get('/api/portfolio/')
+            force_authenticate(request, user=user)
+            return view(request)
+
+        shared = metrics.coalesced_requests.value('unmatched', 'shared')
+        threads, responses = self.run_concurrently(5, send)
+        threading.Event().wait(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([response.data for response in responses], [{'value': 1}] * 5)
+        self.assertEqual(len({id(response) for response in responses}), 5)
+        self.assertEqual(metrics.coalesced_requests.value('unmatched', 'shared'), shared + 4)
+
+    def test_data_version_bumped_after_commit(self):
+        """Test that committed writes change the coalescing key of everyone in the transaction"""
+        risk_taker = CustomUser.objects.create_user(username='coal_rt', email='coal_rt@test.com', password='testpass123')
+        member = CustomUser.objects.create_user(username='coal_m', email='coal_m@test.com', password='testpass123')
+        bystander = CustomUser.objects.create_user(username='coal_b', email='coal_b@test.com', password='testpass123')
+        transaction = Transactions.objects.create(
+            risk_taker_id=risk_taker, total_principal_amount=100, total_interest=2, month_period_of_loan=1,
+            start_date=date(2025, 1, 1), end_date=date(2025, 2, 1)
+        )
+        Splitwise.objects.create(transaction_id=transaction, syndicator_id=member, principal_amount=100, interest_amount=2)
+
+        before = {user.pk: get_data_version(user.pk) for user in (risk_taker, member, bystander)}
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Splitwise.objects.get(syndicator_id=member).save()
+            self.assertEqual(get_data_version(member.pk), before[member.pk])
+        for callback in callbacks:
+            callback()
+
+        self.assertGreater(get_data_version(risk_taker.pk), before[risk_taker.pk])
+        self.assertGreater(get_data_version(member.pk), before[member.pk])
+        self.assertEqual(get_data_version(bystander.pk), before[bystander.pk])
+
+        request = APIRequestFactory().get('/api/portfolio/')
+        request.user = member
+        key = coalescing_key(request)
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.delete()
+        self.assertNotEqual(coalescing_key(request), key)
+
+    def test_endpoints_still_respond(self):
+        user = CustomUser.objects.create_user(username='coal_view', email='coal_view@test.com', password='testpass123')
+        self.client.force_authenticate(user=user)
+        computed = metrics.coalesced_requests.value('portfolio', 'computed')
+        self.assertEqual(self.client.get(reverse('portfolio')).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('all_transaction')).status_code, status.HTTP_200_OK)
+        self.assertEqual(metrics.coalesced_requests.value('portfolio', 'computed'), computed + 1)
+
+
+class IdempotencyKeyTests(APITestCase):
+    PAYLOAD = {
+        'total_principal_amount': 1000, 'total_interest_amount': 2, 'start_date': '2025-01-01',
+        'end_date': '2025-12-01', 'month_period_of_loan': 11, 'lender_name': 'Retry lender'
+    }
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='idem', email='idem@test.com', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def create(self, key, payload=None):
+        return self.client.post(
+            reverse('create_transaction'), payload or self.PAYLOAD, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_stored_response(self):
+        """Test that a retry returns the first response and writes nothing"""
+        first = self.create('key-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.create('key-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertFalse([q for q in queries if q['sql'].startswith(('INSERT INTO "core_transactions"', 'UPDATE'))])
+        self.assertEqual(Transactions.objects.count(), 1)
+        self.assertEqual(Splitwise.objects.count(), 1)
+
+        # A new key, or no key at all, creates another transaction
+        self.assertEqual(self.create('key-2').status_code, status.HTTP_201_CREATED)
+        self.client.post(reverse('create_transaction'), self.PAYLOAD, format='json')
+        self.assertEqual(Transactions.objects.count(), 3)
+
+    def test_key_reused_with_different_payload(self):
+        self.create('key-1')
+        response = self.create('key-1', {**self.PAYLOAD, 'total_principal_amount': 2000})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Transactions.objects.count(), 1)
+
+    def test_validation_errors_are_replayed_and_keys_are_per_user(self):
+        invalid = {**self.PAYLOAD, 'total_interest_amount': None}
+        self.assertEqual(self.create('key-1', invalid).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.create('key-1', invalid)['Idempotent-Replayed'], 'true')
+
+        other = CustomUser.objects.create_user(username='idem2', email='idem2@test.com', password='testpass123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.create('key-1').status_code, status.HTTP_201_CREATED)
+
+    def test_duplicate_waits_for_in_flight_request(self):
+        """Test that a duplicate arriving mid-flight waits and replays the first response"""
+        record = IdempotencyKey.objects.create(
+            user_id=self.user, key='key-1', fingerprint=self.fingerprint(),
+            expires_at=datetime.now(dt_timezone.utc) + timedelta(hours=1)
+        )
+
+        def first_request_finishes(seconds):
+            IdempotencyKey.objects.filter(pk=record.pk).update(response_status=201, response_body={'done': True})
+
+        with mock.patch('core.idempotency.time.sleep', side_effect=first_request_finishes) as sleep:
+            response = self.create('key-1')
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json(), {'done': True})
+        self.assertEqual(Transactions.objects.count(), 0)
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(response_status=None, response_body=None, key='key-2')
+        with override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0):
+            self.assertEqual(self.create('key-2').status_code, status.HTTP_409_CONFLICT)
+
+    def test_expired_and_failed_keys_are_reusable(self):
+        self.create('key-1')
+        IdempotencyKey.objects.update(expires_at=datetime.now(dt_timezone.utc) - timedelta(seconds=1))
+        response = self.create('key-1')
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Transactions.objects.count(), 2)
+
+        with mock.patch.object(Transactions.objects, 'create', side_effect=RuntimeError('database went away')):
+            self.assertEqual(self.create('key-3').status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(IdempotencyKey.objects.filter(key='key-3').exists())
+        self.assertEqual(self.create('key-3').status_code, status.HTTP_201_CREATED)
+
+        IdempotencyKey.objects.filter(key='key-1').update(expires_at=datetime.now(dt_timezone.utc) - timedelta(seconds=1))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['key-3'])
+
+    def fingerprint(self):
+        request = APIRequestFactory().post(reverse('create_transaction'), self.PAYLOAD, format='json')
+        force_authenticate(request, user=self.user)
+        return request_fingerprint(APIView().initialize_request(request))
+
+
+class TransactionImportTests(APITestCase):
+    def setUp(self):
+        self.risk_taker = CustomUser.objects.create_user(username='importer', email='importer@test.com', password='testpass123')
+        self.friends = [
+            CustomUser.objects.create_user(username=f'imp_friend{i}', email=f'imp_friend{i}@test.com', password='testpass123')
+            for i in range(3)
+        ]
+        self.stranger = CustomUser.objects.create_user(username='imp_stranger', email='imp_stranger@test.com', password='testpass123')
+        FriendRequest.objects.bulk_create(
+            [FriendRequest(user_id=self.risk_taker, requested_id=friend, status='accepted') for friend in self.friends[:2]]
+            + [FriendRequest(user_id=self.friends[2], requested_id=self.risk_taker, status='accepted')]
+        )
+        self.client.force_authenticate(user=self.risk_taker)
+
+    def loan(self, **overrides):
+        return {
+            'total_principal_amount': 1000, 'total_interest_amount': 2, 'start_date': '2023-01-01',
+            'end_date': '2024-01-01', 'month_period_of_loan': 12, 'lender_name': 'Old lender',
+            'risk_taker_flag': True, 'risk_taker_commission': 10,
+            'syndicate_details': {
+                'imp_friend0': {'principal_amount': 600, 'interest': 2},
+                'imp_friend2': {'principal_amount': 400, 'interest': 2},
+            },
+            **overrides
+        }
+
+    def upload(self, name, content, **data):
+        return self.client.post(reverse('import_transactions'), {
+            'file': SimpleUploadedFile(name, content.encode()), **data
+        }, format='multipart')
+
+    def jsonl(self, rows):
+        return '\n'.join(json.dumps(row) for row in rows) + '\n'
+
+    def test_jsonl_import_with_row_errors(self):
+        """Test that valid rows are imported and invalid ones are reported by line"""
+        rows = [
+            self.loan(),
+            self.loan(syndicate_details={'imp_stranger': {'principal_amount': 1000, 'interest': 2}}),
+            self.loan(syndicate_details={'nobody': {'principal_amount': 1000, 'interest': 2}}),
+            self.loan(syndicate_details={'imp_friend1': {'principal_amount': 1000, 'interest': 3}}),
+            self.loan(risk_taker='imp_friend0'),
+            self.loan(syndicate_details={}, risk_taker_flag=False, lender_name=None),
+        ]
+        response = self.upload('loans.jsonl', self.jsonl(rows) + 'not json\n')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rows'], 7)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['splitwise_entries_created'], 3)
+        errors = {error['line']: error['error'] for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [2, 3, 4, 5, 7])
+        self.assertEqual(errors[2], 'Syndicator(s) imp_stranger are not accepted friends.')
+        self.assertEqual(errors[3], 'Users not found: nobody')
+        self.assertIn('must equal total_interest_amount', errors[4])
+        self.assertIn('Invalid JSON', errors[7])
+
+        syndicated = Transactions.objects.get(risk_taker_flag=True)
+        self.assertEqual(syndicated.risk_taker_id, self.risk_taker)
+        self.assertEqual([entry['username'] for entry in syndicated.syndicators], ['imp_friend0', 'imp_friend2'])
+        self.assertAlmostEqual(
+            sum(entry.get_commission_deducted() for entry in syndicated.splitwise_entries.all()), 2.0
+        )
+        solo = Transactions.objects.get(risk_taker_flag=False)
+        self.assertEqual(solo.risk_taker_commission, 0)
+        self.assertEqual(list(solo.splitwise_entries.values_list('syndicator_id', 'principal_amount')),
+                         [(self.risk_taker.pk, 1000.0)])
+
+    def test_non_finite_amounts_are_row_errors(self):
+        rows = [
+            self.loan(),
+            self.loan(total_principal_amount='nan'),
+            self.loan(risk_taker_commission='inf'),
+            self.loan(syndicate_details={
+                'imp_friend0': {'principal_amount': '1e999', 'interest': 2},
+                'imp_friend2': {'principal_amount': 400, 'interest': 2},
+            }),
+            self.loan(),
+        ]
+        response = self.upload('loans.jsonl', self.jsonl(rows))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        errors = {error['line']: error['error'] for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [2, 3, 4])
+        self.assertEqual(errors[2], 'total_principal_amount must be a finite number')
+        self.assertEqual(errors[3], 'risk_taker_commission must be a finite number')
+        self.assertEqual(Transactions.objects.count(), 2)
+
+    def test_csv_import_and_dry_run(self):
+        content = (
+            'total_principal_amount,total_interest_amount,start_date,end_date,month_period_of_loan,'
+            'risk_taker_flag,risk_taker_commission,syndicate_details\n'
+            '900,2,2023-01-01,2023-07-01,6,false,,imp_friend0:450:2;imp_friend1:450:2\n'
+            '500,2,2023-01-01,not-a-date,6,false,,\n'
+        )
+        response = self.upload('loans.csv', content, dry_run='true')
+        self.assertEqual((response.data['created'], response.data['error_count']), (1, 1))
+        self.assertEqual(response.data['errors'][0], {'line': 3, 'error': 'end_date must be a YYYY-MM-DD date'})
+        self.assertEqual(Transactions.objects.count(), 0)
+
+        response = self.upload('loans.csv', content)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Splitwise.objects.count(), 2)
+
+        self.assertEqual(self.upload('loans.xlsx', content).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def import_queries(count):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.upload('loans.jsonl', self.jsonl([self.loan()] * count))
+            self.assertEqual(response.data['created'], count)
+            return len(queries)
+
+        self.assertEqual(import_queries(3), import_queries(60))
+
+    def test_management_command_uses_risk_taker_column(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as file:
+            file.write(self.jsonl([
+                self.loan(risk_taker='importer'),
+                self.loan(risk_taker='imp_friend0', syndicate_details={}),
+                self.loan(risk_taker='ghost'),
+            ]))
+        self.addCleanup(os.remove, file.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_transactions', file.name, batch_size=2, stdout=stdout, stderr=stderr)
+        self.assertIn('Imported 2 of 3 transactions', stdout.getvalue())
+        self.assertIn('line 3: Risk taker not found: ghost', stderr.getvalue())
+        self.assertEqual(Transactions.objects.filter(risk_taker_id=self.friends[0]).count(), 1)
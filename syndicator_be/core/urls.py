@@ -1,33 +1,55 @@
 from django.urls import path
 from .views import (
     AllTransactionView, 
+    BatchView,
     CheckFriendRequestStatusView, 
+    CommissionSimulationView,
+    CounterpartyExposureView,
     CreateTransactionView, 
+    ImportTransactionsView,
+    MaturityCalendarView,
+    PortfolioHistoryView,
     PortfolioView, 
     RegisterView, 
     LoginView, 
     SyndicateView, 
+    SettlementView,
+    TimelineView,
     AddMutualFriendView, 
     UpdateFriendRequestStatusView,
     UserSplitwiseView,
+    TransactionRepaymentsView,
     TransactionSplitwiseView,
-    db_health_check
+    UpcomingCashFlowsView,
+    db_health_check,
+    metrics_view
 )
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name="register"),
     path('login/', LoginView.as_view(), name="login"),
     path('portfolio/', PortfolioView.as_view(), name="portfolio"),
+    path('portfolio/history/', PortfolioHistoryView.as_view(), name="portfolio_history"),
     path("syndicate/", SyndicateView.as_view(), name="syndicate"),
     path("create_friend/", AddMutualFriendView.as_view(), name="create_friend_list"),
     path("check_friend_request_status/", CheckFriendRequestStatusView.as_view(), name="check_friend_request_status"),
     path("update_friend_request_status/", UpdateFriendRequestStatusView.as_view(), name="update_friend_request_status"),
     path("all_transaction/", AllTransactionView.as_view(), name="all_transaction"),
     path("create_transaction/", CreateTransactionView.as_view(), name="create_transaction"),
+    path("simulate_commission/", CommissionSimulationView.as_view(), name="simulate_commission"),
+    path("import_transactions/", ImportTransactionsView.as_view(), name="import_transactions"),
     
     # New Splitwise endpoints
     path("my_splitwise/", UserSplitwiseView.as_view(), name="user_splitwise"),
+    path("exposure/", CounterpartyExposureView.as_view(), name="exposure"),
+    path("maturity_calendar/", MaturityCalendarView.as_view(), name="maturity_calendar"),
+    path("settlement/", SettlementView.as_view(), name="settlement"),
+    path("timeline/", TimelineView.as_view(), name="timeline"),
+    path("upcoming_cash_flows/", UpcomingCashFlowsView.as_view(), name="upcoming_cash_flows"),
     path("transaction/<uuid:transaction_id>/splitwise/", TransactionSplitwiseView.as_view(), name="transaction_splitwise"),
+    path("transaction/<uuid:transaction_id>/repayments/", TransactionRepaymentsView.as_view(), name="transaction_repayments"),
     path("health/db/", db_health_check, name="db_health_check"),
+    path("metrics/", metrics_view, name="metrics"),
+    path("batch/", BatchView.as_view(), name="batch"),
 
 ]
\ No newline at end of file
@@ -0,0 +1,45 @@
+import os
+import threading
+import time
+import uuid
+
+_uuid7_lock = threading.Lock()
+_uuid7_last_ms = 0
+_uuid7_counter = 0
+
+
+def uuid7():
+    """
+    Generate a time-ordered UUID (RFC 9562 version 7).
+
+    The first 48 bits are the Unix timestamp in milliseconds, so new primary keys
+    land on the right edge of the B-tree index instead of scattering like uuid4.
+    The 12-bit rand_a field is used as a counter so ids generated within the same
+    millisecond in this process still sort in creation order.
+    """
+    global _uuid7_last_ms, _uuid7_counter
+
+    with _uuid7_lock:
+        timestamp_ms = time.time_ns() // 1_000_000
+        if timestamp_ms > _uuid7_last_ms:
+            _uuid7_last_ms = timestamp_ms
+            # Start each millisecond at a random point in the lower half of the
+            # counter space to leave room for increments
+            _uuid7_counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            _uuid7_counter += 1
+            if _uuid7_counter > 0xFFF:
+                # Counter exhausted: borrow the next millisecond
+                _uuid7_last_ms += 1
+                _uuid7_counter = 0
+        timestamp_ms = _uuid7_last_ms
+        counter = _uuid7_counter
+
+    rand_b = int.from_bytes(os.urandom(8), 'big') & 0x3FFFFFFFFFFFFFFF
+
+    value = (timestamp_ms & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76
+    value |= counter << 64
+    value |= 0b10 << 62
+    value |= rand_b
+    return uuid.UUID(int=value)
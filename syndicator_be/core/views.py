@@ -1,8 +1,17 @@
-from datetime import date
+from datetime import date, timedelta
 from django.db.models.base import transaction
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
-from .models import CustomUser, FriendList, FriendRequest, Splitwise, Transactions
+from .coalescing import coalesced
+from .commission import commission_columns, commission_expressions, commission_scenarios
+from .fast_serializers import PortfolioReader
+from .idempotency import IDEMPOTENCY_HEADER, idempotent
+from .importing import FORMATS as IMPORT_FORMATS, TransactionImporter, detect_format, read_rows
+from .instrumentation import timed
+from .ledger import PostingError, post_repayments, with_balances
+from .models import CustomUser, FriendList, FriendRequest, PortfolioSnapshot, Splitwise, Transactions
+from .schedule import accrued_periods, add_months, get_schedules, to_uuids, uuid_bytes
+from .settlement import settle
 
 from .serializers import PortfolioSerializer, RegisterSerializer, UserSerializer
 from rest_framework.response import Response
@@ -14,13 +23,26 @@ from rest_framework_simplejwt.tokens import RefreshToken
 # from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import authenticate
 from django.conf import settings
-from django.db.models import Q
+from django.db.models import BigIntegerField, Count, F, Max, Q, Sum
+from django.db.models.functions import Cast, Round, TruncMonth, TruncWeek
 # Create your views here.
 
 # views.py
-from django.http import JsonResponse
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import HttpResponse, JsonResponse
+from django.urls import Resolver404, resolve
 from django.db import connection, OperationalError
+from django.utils.crypto import constant_time_compare
+from collections import defaultdict
+from io import BytesIO
+import base64
+import csv
+import json
+import math
 import os
+import uuid
+import numpy as np
+from . import metrics
 
 
 def db_health_check(request):
@@ -41,6 +63,101 @@ def db_health_check(request):
             "db_name": os.getenv("DB_NAME")
         }, status=500)
 
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        return HttpResponse("Not Found", status=404, content_type="text/plain")
+    token = settings.METRICS_TOKEN
+    # Per-view latencies and query counts aren't public: no token, no metrics
+    if not token:
+        return HttpResponse("METRICS_TOKEN is not configured", status=403, content_type="text/plain")
+    if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+
+    return HttpResponse(
+        metrics.registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+def get_sparse_fieldset(request, available_fields, expandable_fields):
+    """
+    Read the `fields` / `include` query params of a listing endpoint.
+
+    `fields` is a comma-separated list of top-level fields to return and `include`
+    names nested objects to add to them. Returns the selected field names, or None
+    when `fields` is absent and the full representation should be used. Raises
+    ValueError for unknown names.
+    """
+    def parse(param):
+        return [name.strip() for name in request.query_params.get(param, "").split(",") if name.strip()]
+
+    fields = parse("fields")
+    include = parse("include")
+
+    unknown = [name for name in fields if name not in available_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available_fields)}")
+    unknown = [name for name in include if name not in expandable_fields]
+    if unknown:
+        raise ValueError(f"Unknown include: {', '.join(unknown)}. Available: {', '.join(expandable_fields)}")
+
+    if "fields" not in request.query_params:
+        return None
+    return set(fields) | set(include)
+
+
+def get_commission_rates(data):
+    """
+    Commission rates to simulate: either `commission_rates`, a list of percentages,
+    or `rate_range`, {"start": .., "stop": .., "step": ..} with `stop` included.
+    Raises ValueError for invalid or too many rates.
+    """
+    max_rates = settings.COMMISSION_SIMULATION_MAX_RATES
+    if data.get("commission_rates") is not None:
+        rates = data["commission_rates"]
+        if not isinstance(rates, list) or not rates:
+            raise ValueError("commission_rates must be a non-empty list of numbers")
+        try:
+            rates = [float(rate) for rate in rates]
+        except (TypeError, ValueError):
+            raise ValueError("commission_rates must be a non-empty list of numbers")
+    elif data.get("rate_range") is not None:
+        rate_range = data["rate_range"]
+        try:
+            start, stop, step = (float(rate_range[name]) for name in ("start", "stop", "step"))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("rate_range must have numeric start, stop and step")
+        if not all(math.isfinite(value) for value in (start, stop, step)):
+            raise ValueError("rate_range must have numeric start, stop and step")
+        if step <= 0 or stop < start:
+            raise ValueError("rate_range needs step > 0 and stop >= start")
+        # Checked before int(): a tiny step makes the quotient overflow to inf
+        steps = (stop - start) / step + 1e-9
+        if steps >= max_rates:
+            raise ValueError(f"At most {max_rates} commission rates can be simulated at once")
+        count = int(steps) + 1
+        # Rounded so a step of 0.1 gives 0.3 rather than 0.30000000000000004
+        rates = np.round(start + step * np.arange(count), 10).tolist()
+    else:
+        raise ValueError("commission_rates or rate_range is required")
+
+    if len(rates) > max_rates:
+        raise ValueError(f"At most {max_rates} commission rates can be simulated at once")
+    if any(not 0 <= rate <= 100 for rate in rates):
+        raise ValueError("Commission rates must be between 0 and 100")
+    return rates
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Values of a keyset pagination cursor from encode_cursor(); ValueError if it's malformed"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
 class RegisterView(APIView):
 
     def post(self, request):
@@ -90,64 +207,125 @@ class LoginView(APIView):
 
 # Updated PortfolioView with Commission Logic
 class PortfolioView(APIView):
+    """
+    Totals of the authenticated user's loans. Interest computed from the splits
+    (interest after commission, commission earned and paid) is per monthly period,
+    not over the loan's life: interest_amount is a monthly rate, so each split earns
+    principal_amount * interest_amount / 100 (less commission) every month of
+    month_period_of_loan. With `as_of`, the "accrued" block adds the cumulative
+    interest up to that date, and "over_term" the cumulative interest over the
+    loans' whole terms, in the same model (see core.schedule.accrued_periods). The
+    transaction interest of loans the risk taker holds no split of accrues on the
+    risk taker side; a risk taker's own split accrues once, on the syndicate side.
+    """
     permission_classes = [IsAuthenticated]
     
+    @coalesced
     def get(self, request):
+        # Optional: also report interest accrued as of this date ("today" or YYYY-MM-DD)
+        as_of = request.query_params.get("as_of")
+        if as_of is not None:
+            try:
+                as_of = date.today() if as_of == "today" else date.fromisoformat(as_of)
+            except ValueError:
+                return Response({"error": "as_of must be a YYYY-MM-DD date or \"today\""}, status=status.HTTP_400_BAD_REQUEST)
+        
         try:
             user = request.user
             
             # Get all splitwise entries where user is a syndicate member
-            splitwise_entries = Splitwise.objects.filter(syndicator_id=user)
+            splitwise_entries = list(Splitwise.objects.filter(syndicator_id=user).values_list(
+                'principal_amount', 'interest_amount', 'transaction_id__risk_taker_flag',
+                'transaction_id__risk_taker_commission', 'transaction_id__risk_taker_id',
+                'transaction_id__start_date', 'transaction_id__end_date', 'transaction_id__month_period_of_loan'
+            ))
             
-            # Get transactions where user is risk taker
-            risk_taker_transactions = Transactions.objects.filter(risk_taker_id=user)
+            # Get transactions where user is risk taker, and their splits in one extra query
+            risk_taker_transactions = list(Transactions.objects.filter(risk_taker_id=user).values_list(
+                'transaction_id', 'total_principal_amount', 'total_interest',
+                'risk_taker_flag', 'risk_taker_commission', 'start_date', 'end_date', 'month_period_of_loan'
+            ))
+            transaction_splits = defaultdict(list)
+            if risk_taker_transactions:
+                for split in Splitwise.objects.filter(
+                    transaction_id__in=[row[0] for row in risk_taker_transactions]
+                ).values_list('transaction_id', 'syndicator_id', 'principal_amount', 'interest_amount'):
+                    transaction_splits[split[0]].append(split)
             
             # Calculate amounts for syndicate member role
-            syndicate_principal = 0
-            syndicate_original_interest = 0
-            syndicate_interest_after_commission = 0
+            syndicate_principal = sum(entry[0] for entry in splitwise_entries)
+            syndicate_original_interest = sum(entry[1] for entry in splitwise_entries)
+            syndicate_columns = commission_columns(
+                [entry[0] for entry in splitwise_entries],
+                [entry[1] for entry in splitwise_entries],
+                [entry[2] for entry in splitwise_entries],
+                [entry[3] for entry in splitwise_entries],
+                [entry[4] == user.pk for entry in splitwise_entries]
+            )
+            syndicate_amounts, _ = syndicate_columns.tolist()
+            syndicate_interest_after_commission = sum(syndicate_amounts)
             
-            for entry in splitwise_entries:
-                syndicate_principal += entry.principal_amount
-                syndicate_original_interest += entry.interest_amount
-                syndicate_interest_after_commission += entry.get_interest_after_commission()
+            # Commission figures for every split of the user's risk taker transactions at once
+            risk_taker_splits = []
+            for transaction_id, _, _, commission_flag, commission_rate, *loan_terms in risk_taker_transactions:
+                for split in transaction_splits[transaction_id]:
+                    risk_taker_splits.append(
+                        (split[1] == user.pk, split[2], split[3], commission_flag, commission_rate, *loan_terms)
+                    )
+            risk_taker_columns = commission_columns(
+                [split[1] for split in risk_taker_splits],
+                [split[2] for split in risk_taker_splits],
+                [split[3] for split in risk_taker_splits],
+                [split[4] for split in risk_taker_splits],
+                [split[0] for split in risk_taker_splits]
+            )
+            split_interest, split_commission = risk_taker_columns.tolist()
             
             # Calculate amounts for risk taker role
             risk_taker_principal = 0
             risk_taker_interest = 0
             total_commission_earned = 0
+            # (monthly interest, start_date, end_date, month_period_of_loan) of loans without the risk taker's split
+            risk_taker_only_loans = []
             
-            for transaction in risk_taker_transactions:
+            position = 0
+            for transaction_id, principal_amount, total_interest, commission_flag, _, *loan_terms in risk_taker_transactions:
                 # For risk taker transactions, the total_interest is already the absolute amount
                 # We need to calculate how much interest the risk taker actually gets
                 # This depends on whether they're also a syndicator in the same transaction
                 
+                # Positions of this transaction's splits in the commission columns
+                split_positions = range(position, position + len(transaction_splits[transaction_id]))
+                position = split_positions.stop
+                
                 # Get the risk taker's splitwise entry for this transaction (if any)
-                risk_taker_splitwise = Splitwise.objects.filter(
-                    transaction_id=transaction,
-                    syndicator_id=user
-                ).first()
+                risk_taker_splitwise = next(
+                    (index for index in split_positions if risk_taker_splits[index][0]),
+                    None
+                )
                 
-                if risk_taker_splitwise:
+                if risk_taker_splitwise is not None:
                     # Risk taker is also a syndicator - they get their splitwise interest
-                    risk_taker_interest += risk_taker_splitwise.get_interest_after_commission()
+                    risk_taker_interest += split_interest[risk_taker_splitwise]
                     # Don't add principal here as it's already counted in syndicate_principal
                 else:
                     # Risk taker is not a syndicator - they get the full transaction interest
-                    risk_taker_interest += transaction.total_interest
-                    risk_taker_principal += transaction.total_principal_amount
+                    risk_taker_interest += total_interest
+                    risk_taker_principal += principal_amount
+                    risk_taker_only_loans.append((total_interest, *loan_terms))
                 
                 # Calculate commission earned by summing up commission deducted from syndicators
-                if transaction.risk_taker_flag:
-                    for entry in transaction.splitwise_entries.exclude(syndicator_id=user):
-                        total_commission_earned += entry.get_commission_deducted()
+                if commission_flag:
+                    for index in split_positions:
+                        if not risk_taker_splits[index][0]:
+                            total_commission_earned += split_commission[index]
             
             # Calculate totals
             total_principal = syndicate_principal + risk_taker_principal
             total_original_interest = syndicate_original_interest + risk_taker_interest
             total_final_interest = syndicate_interest_after_commission + risk_taker_interest + total_commission_earned
             
-            return Response({
+            response_data = {
                 "total_principal_amount": total_principal,
                 "total_original_interest": total_original_interest,
                 "total_interest_after_commission": total_final_interest,
@@ -165,7 +343,56 @@ class PortfolioView(APIView):
                         "commission_paid": syndicate_original_interest - syndicate_interest_after_commission
                     }
                 }
-            }, status=status.HTTP_200_OK)
+            }
+            
+            if as_of is not None:
+                syndicate_starts = [entry[5] for entry in splitwise_entries]
+                syndicate_ends = [entry[6] for entry in splitwise_entries]
+                syndicate_months = [entry[7] for entry in splitwise_entries]
+                syndicate_monthly_interest = (
+                    np.array([entry[0] for entry in splitwise_entries], dtype=np.float64)
+                    * np.array([entry[1] for entry in splitwise_entries], dtype=np.float64) / 100
+                )
+                risk_taker_starts = [split[5] for split in risk_taker_splits]
+                risk_taker_ends = [split[6] for split in risk_taker_splits]
+                risk_taker_months = [split[7] for split in risk_taker_splits]
+                own_loan_interest = np.array([loan[0] for loan in risk_taker_only_loans], dtype=np.float64)
+                own_loan_starts = [loan[1] for loan in risk_taker_only_loans]
+                own_loan_ends = [loan[2] for loan in risk_taker_only_loans]
+                own_loan_months = [loan[3] for loan in risk_taker_only_loans]
+                
+                def accrued_interest(syndicate_as_of, risk_taker_as_of, own_loan_as_of):
+                    # Monthly interest (principal * rate / 100) times the periods each loan has accrued
+                    syndicate_periods = accrued_periods(syndicate_starts, syndicate_ends, syndicate_months, syndicate_as_of)
+                    accrued_original = float((syndicate_monthly_interest * syndicate_periods).sum())
+                    accrued_after_commission = float((syndicate_columns.interest_after_commission * syndicate_periods).sum())
+                    # Commission is earned on every installment of the other syndicators' splits
+                    risk_taker_periods = accrued_periods(risk_taker_starts, risk_taker_ends, risk_taker_months, risk_taker_as_of)
+                    accrued_commission = float((risk_taker_columns.commission_deducted * risk_taker_periods).sum())
+                    # Transaction interest of the loans the risk taker holds no split of
+                    own_loan_periods = accrued_periods(own_loan_starts, own_loan_ends, own_loan_months, own_loan_as_of)
+                    accrued_risk_taker = float((own_loan_interest * own_loan_periods).sum())
+                    return {
+                        "total_interest_after_commission": accrued_after_commission + accrued_risk_taker + accrued_commission,
+                        "as_risk_taker": {
+                            "interest": accrued_risk_taker,
+                            "commission_earned": accrued_commission
+                        },
+                        "as_syndicate_member": {
+                            "original_interest": accrued_original,
+                            "interest_after_commission": accrued_after_commission,
+                            "commission_paid": accrued_original - accrued_after_commission
+                        }
+                    }
+                
+                response_data["accrued"] = {
+                    "as_of": as_of.isoformat(),
+                    **accrued_interest(as_of, as_of, as_of),
+                    # Same figures at each loan's maturity: what "accrued" grows to, never exceeds
+                    "over_term": accrued_interest(syndicate_ends, risk_taker_ends, own_loan_ends),
+                }
+            
+            return Response(response_data, status=status.HTTP_200_OK)
             
         except Exception as e:
             return Response({
@@ -301,7 +528,7 @@ class CheckFriendRequestStatusView(APIView):
             # Find ALL friend requests involving the authenticated user (sender OR receiver)
             friend_requests = FriendRequest.objects.filter(
                 Q(user_id=authenticated_user) | Q(requested_id=authenticated_user)
-            ).order_by('-created_at')  # Order by most recent first
+            ).select_related('user_id', 'requested_id').order_by('-created_at', '-pk')  # Order by most recent first
             
             if not friend_requests.exists():
                 return Response({
@@ -331,7 +558,7 @@ class CheckFriendRequestStatusView(APIView):
                 }
                 
                 # Determine if this request was sent by or received by the authenticated user
-                if friend_request.user_id == authenticated_user:
+                if friend_request.user_id_id == authenticated_user.pk:
                     request_info["request_type"] = "sent"
                     request_info["other_user"] = {
                         "user_id": str(friend_request.requested_id.user_id),
@@ -514,16 +741,27 @@ class UpdateFriendRequestStatusView(APIView):
 class AllTransactionView(APIView):
     permission_classes = [IsAuthenticated]
     
+    @coalesced
     def get(self, request):
+        try:
+            selected_fields = get_sparse_fieldset(
+                request, PortfolioSerializer.Meta.fields, ('splitwise_entries',)
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
         try:
             # Get all transactions where user is either risk taker or syndicate member
             # First get transactions where user is risk taker
-            risk_taker_transactions = Transactions.objects.filter(risk_taker_id=request.user)
+            # Rows come from values() and are serialized by PortfolioReader, which matches
+            # PortfolioSerializer's output without building model instances
+            reader = PortfolioReader(fields=selected_fields)
+            risk_taker_transactions = reader.fetch(Transactions.objects.filter(risk_taker_id=request.user))
             
             # Then get transactions where user is syndicate member
             splitwise_entries = Splitwise.objects.filter(syndicator_id=request.user)
-            syndicate_transactions = Transactions.objects.filter(
-                transaction_id__in=splitwise_entries.values('transaction_id')
+            syndicate_transactions = reader.fetch(
+                Transactions.objects.filter(transaction_id__in=splitwise_entries.values('transaction_id'))
             )
             
             # Combine both sets of transactions
@@ -534,12 +772,14 @@ class AllTransactionView(APIView):
             seen_transaction_ids = set()
             
             for transaction in all_transactions:
-                if transaction.transaction_id not in seen_transaction_ids:
+                # Reader rows start with the transaction pk
+                if transaction[0] not in seen_transaction_ids:
                     unique_transactions.append(transaction)
-                    seen_transaction_ids.add(transaction.transaction_id)
+                    seen_transaction_ids.add(transaction[0])
             
             # Serialize the data
-            serializer = PortfolioSerializer(unique_transactions, many=True)
+            with timed('serialize'):
+                serialized_transactions = reader.serialize(unique_transactions)
             
             # Count transactions where user is risk taker vs syndicate member
             risk_taker_count = len(risk_taker_transactions)
@@ -557,7 +797,7 @@ class AllTransactionView(APIView):
                     "as_risk_taker": risk_taker_count,
                     "as_syndicate_member": syndicate_count
                 },
-                "transactions": serializer.data
+                "transactions": serialized_transactions
             }
             
             return Response(response_data, status=status.HTTP_200_OK)
@@ -571,6 +811,7 @@ class AllTransactionView(APIView):
 class CreateTransactionView(APIView):
     permission_classes = [IsAuthenticated]
     
+    @idempotent
     def post(self, request):
         # Get user directly from authenticated token
         risk_taker = request.user
@@ -792,19 +1033,709 @@ class CreateTransactionView(APIView):
 
 
 
+class CommissionSimulationView(APIView):
+    """
+    What-if for risk_taker_commission before creating a transaction.
+
+    Takes the create_transaction amounts (total_principal_amount, total_interest_amount,
+    syndicate_details) and a set of commission rates (see get_commission_rates), and
+    returns, per rate, the risk taker's commission and net yield and each syndicator's
+    interest after commission. All rates are evaluated in one vectorized computation
+    with the same commission rules as the stored transactions.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        risk_taker = request.user
+        
+        try:
+            rates = get_commission_rates(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        total_principal_amount = request.data.get("total_principal_amount")
+        total_interest_amount = request.data.get("total_interest_amount")
+        syndicate_details = request.data.get("syndicate_details") or {}
+        if total_principal_amount is None or total_interest_amount is None:
+            return Response({
+                "error": "total_principal_amount and total_interest_amount are required"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(syndicate_details, dict):
+            return Response({
+                "error": "syndicate_details must be an object keyed by username"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            total_principal_amount = float(total_principal_amount)
+            total_interest_amount = float(total_interest_amount)
+            if syndicate_details:
+                members = [
+                    (username, float(details.get('principal_amount', 0)), float(details.get('interest', 0)))
+                    for username, details in syndicate_details.items()
+                ]
+            else:
+                # Same as a solo create_transaction: one split for the risk taker
+                members = [(risk_taker.username, total_principal_amount, total_interest_amount)]
+        except (AttributeError, TypeError, ValueError):
+            return Response({
+                "error": "Amounts must be numbers and syndicate_details entries objects"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Same checks as create_transaction
+        for username, _, interest_amount in members:
+            if abs(total_interest_amount - interest_amount) > 0.01:
+                return Response({
+                    "error": f"Interest amount for {username} ({interest_amount}) must equal total_interest_amount ({total_interest_amount}). All syndicators must have the same interest amount."
+                }, status=status.HTTP_400_BAD_REQUEST)
+        total_splitwise_principal = sum(principal_amount for _, principal_amount, _ in members)
+        if abs(total_principal_amount - total_splitwise_principal) > 0.01:
+            return Response({
+                "error": f"Total principal amount ({total_principal_amount}) does not match sum of splitwise principal amounts ({total_splitwise_principal})"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if syndicate_details:
+            existing_usernames = set(
+                CustomUser.objects.filter(username__in=list(syndicate_details)).values_list('username', flat=True)
+            )
+            missing_usernames = [username for username, _, _ in members if username not in existing_usernames]
+            if missing_usernames:
+                return Response({
+                    "error": f"Users not found: {', '.join(missing_usernames)}"
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            principal = np.array([principal_amount for _, principal_amount, _ in members])
+            is_risk_taker = np.array([username == risk_taker.username for username, _, _ in members])
+            scenarios = commission_scenarios(
+                principal, [interest_amount for _, _, interest_amount in members], is_risk_taker, rates
+            )
+            interest_after, deducted = scenarios.tolist()
+            
+            # Risk taker: commission from the others plus the interest on their own split
+            commission_earned = scenarios.commission_deducted.sum(axis=0)
+            net_interest = commission_earned + scenarios.interest_after_commission[is_risk_taker].sum(axis=0)
+            own_principal = float(principal[is_risk_taker].sum())
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                split_yield = scenarios.interest_after_commission / principal.reshape(-1, 1) * 100
+            
+            syndicators = []
+            for position, (username, principal_amount, interest_amount) in enumerate(members):
+                syndicators.append({
+                    "username": username,
+                    "is_risk_taker": bool(is_risk_taker[position]),
+                    "principal_amount": principal_amount,
+                    "original_interest": interest_amount,
+                    "interest_after_commission": interest_after[position],
+                    "commission_deducted": deducted[position],
+                    "net_yield_percentage": split_yield[position].tolist() if principal_amount > 0 else None,
+                })
+            
+            return Response({
+                "commission_rates": rates,
+                "total_principal_amount": total_principal_amount,
+                "total_interest_amount": total_interest_amount,
+                "risk_taker": {
+                    "username": risk_taker.username,
+                    "principal_amount": own_principal,
+                    "commission_earned": commission_earned.tolist(),
+                    "net_interest": net_interest.tolist(),
+                    "net_yield_percentage": (net_interest / own_principal * 100).tolist() if own_principal > 0 else None,
+                },
+                "syndicators": syndicators,
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return Response({
+                "error": f"An unexpected error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class UpcomingCashFlowsView(APIView):
+    """
+    Repayments the authenticated user receives between `from` (default today) and
+    `until` (default 12 months later), both YYYY-MM-DD and inclusive: interest after
+    commission and principal on their own splits, and the commission deducted from
+    the other splits of transactions they are the risk taker of. See core.schedule.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @coalesced
+    def get(self, request):
+        try:
+            from_date = date.fromisoformat(request.query_params.get("from") or date.today().isoformat())
+            until = request.query_params.get("until")
+            until = date.fromisoformat(until) if until else add_months([from_date], [12])[0].item()
+        except ValueError:
+            return Response({"error": "from and until must be YYYY-MM-DD dates"}, status=status.HTTP_400_BAD_REQUEST)
+        if until < from_date:
+            return Response({"error": "until can't be before from"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            user = request.user
+            transaction_ids = Transactions.objects.filter(risk_taker_id=user).values_list('transaction_id').union(
+                Splitwise.objects.filter(syndicator_id=user).values_list('transaction_id')
+            )
+            schedule = get_schedules(transaction_id for (transaction_id,) in transaction_ids)
+            
+            user_id = uuid_bytes(user.pk)
+            in_window = (schedule['due_date'] >= np.datetime64(from_date)) & (schedule['due_date'] <= np.datetime64(until))
+            as_syndicator = in_window & (schedule['syndicator_id'] == user_id)
+            as_risk_taker = in_window & (schedule['risk_taker_id'] == user_id) & (schedule['commission'] > 0)
+            
+            # One row per installment: the user's own splits, then commission they collect
+            flows = np.concatenate([schedule[as_syndicator], schedule[as_risk_taker]])
+            role = np.repeat(np.array(["syndicator", "risk_taker"]), [as_syndicator.sum(), as_risk_taker.sum()])
+            interest = np.where(role == "syndicator", flows['interest'], 0.0)
+            principal = np.where(role == "syndicator", flows['principal'], 0.0)
+            commission_earned = np.where(role == "risk_taker", flows['commission'], 0.0)
+            amount = interest + principal + commission_earned
+            order = np.argsort(flows['due_date'], kind='stable')
+            ordered = flows[order]
+            
+            cash_flows = [
+                {
+                    "due_date": due_date,
+                    "transaction_id": str(transaction_id),
+                    "splitwise_id": str(splitwise_id),
+                    "role": row_role,
+                    "installment": installment,
+                    "installments": installments,
+                    "interest": row_interest,
+                    "principal": row_principal,
+                    "commission_earned": row_commission,
+                    "amount": row_amount,
+                }
+                for (due_date, transaction_id, splitwise_id, row_role, installment, installments,
+                     row_interest, row_principal, row_commission, row_amount) in zip(
+                    ordered['due_date'].astype(str).tolist(), to_uuids(ordered['transaction_id']),
+                    to_uuids(ordered['splitwise_id']), role[order].tolist(),
+                    ordered['installment'].tolist(), ordered['installments'].tolist(),
+                    interest[order].tolist(), principal[order].tolist(),
+                    commission_earned[order].tolist(), amount[order].tolist()
+                )
+            ]
+            
+            # Totals per calendar month of the window
+            months, month_index = np.unique(flows['due_date'].astype('datetime64[M]'), return_inverse=True)
+            by_month = [
+                {
+                    "month": month,
+                    "interest": month_interest,
+                    "principal": month_principal,
+                    "commission_earned": month_commission,
+                    "amount": month_amount,
+                }
+                for month, month_interest, month_principal, month_commission, month_amount in zip(
+                    months.astype(str).tolist(),
+                    np.bincount(month_index, interest, len(months)).tolist(),
+                    np.bincount(month_index, principal, len(months)).tolist(),
+                    np.bincount(month_index, commission_earned, len(months)).tolist(),
+                    np.bincount(month_index, amount, len(months)).tolist()
+                )
+            ]
+            
+            return Response({
+                "from": from_date.isoformat(),
+                "until": until.isoformat(),
+                "totals": {
+                    "interest": float(interest.sum()),
+                    "principal": float(principal.sum()),
+                    "commission_earned": float(commission_earned.sum()),
+                    "amount": float(amount.sum()),
+                    "cash_flow_count": len(cash_flows),
+                },
+                "by_month": by_month,
+                "cash_flows": cash_flows,
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return Response({
+                "error": f"An unexpected error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class SettlementView(APIView):
+    """
+    Net settlement of the repayments due between `from` and `until` (YYYY-MM-DD,
+    inclusive; default the current calendar month) on every transaction the
+    authenticated user is part of. Pairwise obligations from risk takers to
+    syndicators are netted per user and settled with the fewest transfers the greedy
+    algorithm finds; see core.settlement.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @coalesced
+    def get(self, request):
+        try:
+            today = date.today()
+            from_date = request.query_params.get("from")
+            from_date = date.fromisoformat(from_date) if from_date else today.replace(day=1)
+            until = request.query_params.get("until")
+            until = date.fromisoformat(until) if until else add_months([from_date], [1])[0].item() - timedelta(days=1)
+        except ValueError:
+            return Response({"error": "from and until must be YYYY-MM-DD dates"}, status=status.HTTP_400_BAD_REQUEST)
+        if until < from_date:
+            return Response({"error": "until can't be before from"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            user = request.user
+            transaction_ids = Transactions.objects.filter(risk_taker_id=user).values_list('transaction_id').union(
+                Splitwise.objects.filter(syndicator_id=user).values_list('transaction_id')
+            )
+            schedule = get_schedules(transaction_id for (transaction_id,) in transaction_ids)
+            in_cycle = (schedule['due_date'] >= np.datetime64(from_date)) & (schedule['due_date'] <= np.datetime64(until))
+            settlement = settle(schedule[in_cycle])
+            
+            user_ids = to_uuids(settlement.user_ids)
+            usernames = dict(CustomUser.objects.filter(user_id__in=user_ids).values_list('user_id', 'username'))
+            balances = [
+                {
+                    "user_id": str(user_id),
+                    "username": usernames.get(user_id),
+                    "receivable": receivable / 100,
+                    "payable": payable / 100,
+                    "balance": balance / 100,
+                }
+                for user_id, receivable, payable, balance in zip(
+                    user_ids, settlement.receivable.tolist(), settlement.payable.tolist(), settlement.balances.tolist()
+                )
+            ]
+            transfers = [
+                {
+                    "from_user_id": str(user_ids[payer]),
+                    "from_username": usernames.get(user_ids[payer]),
+                    "to_user_id": str(user_ids[payee]),
+                    "to_username": usernames.get(user_ids[payee]),
+                    "amount": amount / 100,
+                }
+                for payer, payee, amount in settlement.transfers
+            ]
+            own = balances[user_ids.index(user.pk)]["balance"] if user.pk in user_ids else 0.0
+            
+            return Response({
+                "from": from_date.isoformat(),
+                "until": until.isoformat(),
+                "balance": own,
+                "obligations": settlement.obligations,
+                "balances": balances,
+                "transfers": transfers,
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return Response({
+                "error": f"An unexpected error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class TimelineView(APIView):
+    """
+    Monthly series for the authenticated user's charts, by the month the loans
+    started: principal, interest and commission as a syndicate member and as a risk
+    taker. Computed in one aggregate query with commission applied in SQL.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @coalesced
+    def get(self, request):
+        try:
+            user = request.user
+            interest, commission, after_commission = commission_expressions()
+            as_syndicator = Q(syndicator_id=user)
+            as_risk_taker = Q(transaction_id__risk_taker_id=user)
+            
+            # Both conditions on Splitwise columns, so each can use an index
+            rows = Splitwise.objects.filter(
+                as_syndicator | Q(transaction_id__in=Transactions.objects.filter(risk_taker_id=user).values('pk'))
+            ).annotate(
+                month=TruncMonth('transaction_id__start_date')
+            ).values('month').annotate(
+                syndicate_principal=Sum('principal_amount', filter=as_syndicator),
+                syndicate_interest=Sum(interest, filter=as_syndicator),
+                syndicate_interest_after_commission=Sum(after_commission, filter=as_syndicator),
+                syndicate_commission_paid=Sum(commission, filter=as_syndicator),
+                syndicate_loans=Count('transaction_id', filter=as_syndicator, distinct=True),
+                risk_taker_principal=Sum('principal_amount', filter=as_risk_taker),
+                risk_taker_commission_earned=Sum(commission, filter=as_risk_taker),
+                risk_taker_loans=Count('transaction_id', filter=as_risk_taker, distinct=True),
+            ).order_by('month')
+            
+            series = {column: [] for column in (
+                "syndicate_principal", "syndicate_interest", "syndicate_interest_after_commission",
+                "syndicate_commission_paid", "syndicate_loans", "risk_taker_principal",
+                "risk_taker_commission_earned", "risk_taker_loans",
+            )}
+            months = []
+            for row in rows:
+                months.append(row["month"].strftime("%Y-%m"))
+                for column, values in series.items():
+                    values.append(row[column] or 0)
+            
+            return Response({
+                "months": months,
+                "as_syndicate_member": {
+                    "principal": series["syndicate_principal"],
+                    "interest": series["syndicate_interest"],
+                    "interest_after_commission": series["syndicate_interest_after_commission"],
+                    "commission_paid": series["syndicate_commission_paid"],
+                    "loans": series["syndicate_loans"],
+                },
+                "as_risk_taker": {
+                    "principal": series["risk_taker_principal"],
+                    "commission_earned": series["risk_taker_commission_earned"],
+                    "loans": series["risk_taker_loans"],
+                },
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return Response({
+                "error": f"An unexpected error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class MaturityCalendarView(APIView):
+    """
+    Loans of the authenticated user maturing in the next `days` days (default 90,
+    from today), bucketed by the `bucket` (week or month) of their end_date: the
+    principal returned, the last period's interest before and after commission and
+    the commission, as a syndicate member and as a risk taker. Computed in one
+    aggregate query with commission applied in SQL.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    BUCKETS = {"week": TruncWeek, "month": TruncMonth}
+    DEFAULT_DAYS = 90
+    MAX_DAYS = 3660
+    
+    @coalesced
+    def get(self, request):
+        bucket = request.query_params.get("bucket", "week")
+        if bucket not in self.BUCKETS:
+            return Response({"error": f"bucket must be one of: {', '.join(self.BUCKETS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            days = int(request.query_params.get("days", self.DEFAULT_DAYS))
+            if not 0 <= days <= self.MAX_DAYS:
+                raise ValueError
+        except ValueError:
+            return Response({"error": f"days must be between 0 and {self.MAX_DAYS}"}, status=status.HTTP_400_BAD_REQUEST)
+        from_date = date.today()
+        until = from_date + timedelta(days=days)
+        
+        try:
+            user = request.user
+            interest, commission, after_commission = commission_expressions()
+            as_syndicator = Q(syndicator_id=user)
+            as_risk_taker = Q(transaction_id__risk_taker_id=user)
+            
+            # The risk taker's loans come from the (risk_taker_id, end_date) index
+            maturing = Transactions.objects.filter(risk_taker_id=user, end_date__range=(from_date, until))
+            rows = Splitwise.objects.filter(
+                as_syndicator | Q(transaction_id__in=maturing.values('pk')),
+                transaction_id__end_date__range=(from_date, until),
+            ).annotate(
+                period=self.BUCKETS[bucket]('transaction_id__end_date')
+            ).values('period').annotate(
+                syndicate_principal=Sum('principal_amount', filter=as_syndicator),
+                syndicate_interest=Sum(interest, filter=as_syndicator),
+                syndicate_interest_after_commission=Sum(after_commission, filter=as_syndicator),
+                syndicate_commission_paid=Sum(commission, filter=as_syndicator),
+                syndicate_loans=Count('transaction_id', filter=as_syndicator, distinct=True),
+                risk_taker_principal=Sum('principal_amount', filter=as_risk_taker),
+                risk_taker_commission_earned=Sum(commission, filter=as_risk_taker),
+                risk_taker_loans=Count('transaction_id', filter=as_risk_taker, distinct=True),
+            ).order_by('period')
+            
+            buckets = []
+            for row in rows:
+                principal = row["syndicate_principal"] or 0
+                interest_after_commission = row["syndicate_interest_after_commission"] or 0
+                buckets.append({
+                    "period_start": row["period"].isoformat(),
+                    "as_syndicate_member": {
+                        "principal": principal,
+                        "interest": row["syndicate_interest"] or 0,
+                        "interest_after_commission": interest_after_commission,
+                        "commission_paid": row["syndicate_commission_paid"] or 0,
+                        # Principal back plus the last period's interest
+                        "amount_due": principal + interest_after_commission,
+                        "loans": row["syndicate_loans"],
+                    },
+                    "as_risk_taker": {
+                        "principal": row["risk_taker_principal"] or 0,
+                        "commission_earned": row["risk_taker_commission_earned"] or 0,
+                        "loans": row["risk_taker_loans"],
+                    },
+                })
+            
+            return Response({
+                "from": from_date.isoformat(),
+                "until": until.isoformat(),
+                "bucket": bucket,
+                "buckets": buckets,
+                "totals": {
+                    "amount_due": sum(item["as_syndicate_member"]["amount_due"] for item in buckets),
+                    "commission_earned": sum(item["as_risk_taker"]["commission_earned"] for item in buckets),
+                },
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return Response({
+                "error": f"An unexpected error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class PortfolioHistoryView(APIView):
+    """
+    Daily net position of the authenticated user between `from` (default 90 days
+    ago) and `until` (default today), YYYY-MM-DD and inclusive, read from the
+    PortfolioSnapshot rows written by the snapshot_portfolios command. Days without
+    a snapshot are left out.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        try:
+            until = request.query_params.get("until")
+            until = date.fromisoformat(until) if until else date.today()
+            from_date = request.query_params.get("from")
+            from_date = date.fromisoformat(from_date) if from_date else until - timedelta(days=90)
+        except ValueError:
+            return Response({"error": "from and until must be YYYY-MM-DD dates"}, status=status.HTTP_400_BAD_REQUEST)
+        if until < from_date:
+            return Response({"error": "until can't be before from"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            rows = PortfolioSnapshot.objects.filter(
+                user_id=request.user, date__range=(from_date, until)
+            ).order_by('date').values_list(
+                'date', 'principal_outstanding', 'interest_accrued', 'commission_accrued', 'active_loans'
+            )
+            
+            series = {
+                "dates": [], "principal_outstanding": [], "interest_accrued": [],
+                "commission_accrued": [], "net_position": [], "active_loans": [],
+            }
+            for day, principal, interest, commission, active_loans in rows:
+                series["dates"].append(day.isoformat())
+                series["principal_outstanding"].append(principal)
+                series["interest_accrued"].append(interest)
+                series["commission_accrued"].append(commission)
+                series["net_position"].append(principal + interest + commission)
+                series["active_loans"].append(active_loans)
+            
+            return Response({
+                "from": from_date.isoformat(),
+                "until": until.isoformat(),
+                **series,
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return Response({
+                "error": f"An unexpected error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class CounterpartyExposureView(APIView):
+    """
+    Exposure of the authenticated user to each counterparty, largest principal first.
+
+    `role=risk_taker` (default) groups the splits of the user's own loans by
+    syndicator; `role=syndicator` groups the user's splits by the loans' risk taker.
+    Each counterparty gets its principal, monthly interest before and after
+    commission and the commission flowing between the two. Pages of `page_size`
+    counterparties follow `next_cursor`, a keyset on the principal in whole cents
+    and the user id, so equal principals compare exactly however SUM adds them up.
+    Keyset pages over aggregates still group all of the user's splits for each page.
+    The first page also reports concentration over all counterparties from a single
+    aggregate over the groups: the `top` largest ones' share of principal and the
+    Herfindahl index of principal shares.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    ROLES = {
+        # role -> (rows to group, counterparty column, the user's own rows to leave out)
+        "risk_taker": ("transaction_id__risk_taker_id", "syndicator_id", "syndicator_id"),
+        "syndicator": ("syndicator_id", "transaction_id__risk_taker_id", "transaction_id__risk_taker_id"),
+    }
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+    
+    @coalesced
+    def get(self, request):
+        role = request.query_params.get("role", "risk_taker")
+        if role not in self.ROLES:
+            return Response({"error": f"role must be one of: {', '.join(self.ROLES)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page_size = int(request.query_params.get("page_size", self.DEFAULT_PAGE_SIZE))
+            top = int(request.query_params.get("top", 5))
+            if not 1 <= page_size <= self.MAX_PAGE_SIZE or top < 1:
+                raise ValueError
+        except ValueError:
+            return Response({
+                "error": f"page_size must be between 1 and {self.MAX_PAGE_SIZE} and top a positive integer"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        cursor = request.query_params.get("cursor")
+        if cursor is not None:
+            try:
+                after_cents, after_id = decode_cursor(cursor)
+                if not isinstance(after_cents, int) or isinstance(after_cents, bool):
+                    raise ValueError
+                after_id = uuid.UUID(after_id)
+            except (TypeError, ValueError, AttributeError):
+                return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            user = request.user
+            member_column, counterparty, own_column = self.ROLES[role]
+            interest, commission, after_commission = commission_expressions()
+            # Grouped on the counterparty's id so keyset pages and the concentration query agree
+            groups = Splitwise.objects.filter(**{member_column: user}).exclude(**{own_column: user}).values(
+                counterparty_id=F(counterparty)
+            ).annotate(principal=Sum('principal_amount'))
+            # The cursor's sort key, exact where the float sum may differ in its last bits
+            principal_cents = Cast(Round(F('principal') * 100), BigIntegerField())
+            
+            page = groups.annotate(
+                username=Max(f"{counterparty}__username"),
+                name=Max(f"{counterparty}__name"),
+                loans=Count('transaction_id', distinct=True),
+                interest=Sum(interest),
+                interest_after_commission=Sum(after_commission),
+                commission=Sum(commission),
+                principal_cents=principal_cents,
+            ).order_by('-principal_cents', 'counterparty_id')
+            if cursor is not None:
+                page = page.filter(
+                    Q(principal_cents__lt=after_cents) | Q(principal_cents=after_cents, counterparty_id__gt=after_id)
+                )
+            rows = list(page[:page_size + 1])
+            
+            counterparties = [
+                {
+                    "user_id": str(row["counterparty_id"]),
+                    "username": row["username"],
+                    "name": row["name"],
+                    "loans": row["loans"],
+                    "principal": row["principal"],
+                    "interest": row["interest"],
+                    "interest_after_commission": row["interest_after_commission"],
+                    # Paid to the user as risk taker, or by the user as syndicator
+                    "commission": row["commission"],
+                }
+                for row in rows[:page_size]
+            ]
+            next_cursor = None
+            if len(rows) > page_size:
+                last = rows[page_size - 1]
+                next_cursor = encode_cursor([last["principal_cents"], str(last["counterparty_id"])])
+            
+            response_data = {
+                "role": role,
+                "counterparties": counterparties,
+                "next_cursor": next_cursor,
+            }
+            
+            if cursor is None:
+                # Sums over the groups in one query instead of loading every group's principal
+                totals = groups.aggregate(
+                    total=Sum('principal'),
+                    squares=Sum(F('principal') * F('principal')),
+                    counterparties=Count('counterparty_id'),
+                )
+                total = totals["total"] or 0.0
+                # The largest counterparties are on this page unless `top` runs past it
+                if top <= page_size or next_cursor is None:
+                    largest = [row["principal"] for row in rows[:top]]
+                else:
+                    largest = list(page.values_list('principal', flat=True)[:top])
+                herfindahl = (totals["squares"] or 0.0) / total ** 2 if total > 0 else 0.0
+                response_data["concentration"] = {
+                    "counterparties": totals["counterparties"],
+                    "total_principal": total,
+                    "top": top,
+                    "top_share": sum(largest) / total if total > 0 else 0.0,
+                    "herfindahl_index": herfindahl,
+                    # Number of equal-sized counterparties with the same concentration
+                    "effective_counterparties": 1 / herfindahl if herfindahl > 0 else 0,
+                }
+            
+            return Response(response_data, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return Response({
+                "error": f"An unexpected error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # Updated UserSplitwiseView with Commission Support
 class UserSplitwiseView(APIView):
     """Get all splitwise entries for the authenticated user"""
     permission_classes = [IsAuthenticated]
     
+    # Output field -> (model columns it reads, how it is rendered from the entry and
+    # its (interest_after_commission, commission_deducted) pair)
+    ENTRY_FIELDS = {
+        "splitwise_id": (["splitwise_id"], lambda entry, amounts: str(entry.splitwise_id)),
+        "transaction_id": ([], lambda entry, amounts: str(entry.transaction_id_id)),
+        "risk_taker": (
+            ["transaction_id__risk_taker_id__user_id", "transaction_id__risk_taker_id__username",
+             "transaction_id__risk_taker_id__name"],
+            lambda entry, amounts: {
+                "user_id": str(entry.transaction_id.risk_taker_id.user_id),
+                "username": entry.transaction_id.risk_taker_id.username,
+                "name": entry.transaction_id.risk_taker_id.name
+            }
+        ),
+        "principal_amount": ([], lambda entry, amounts: entry.principal_amount),
+        "original_interest": ([], lambda entry, amounts: entry.interest_amount),
+        "interest_after_commission": ([], lambda entry, amounts: amounts[0]),
+        "commission_deducted": ([], lambda entry, amounts: amounts[1]),
+        "commission_flag": ([], lambda entry, amounts: entry.transaction_id.risk_taker_flag),
+        "transaction_start_date": (
+            ["transaction_id__start_date"], lambda entry, amounts: entry.transaction_id.start_date.isoformat()
+        ),
+        "transaction_end_date": (
+            ["transaction_id__end_date"], lambda entry, amounts: entry.transaction_id.end_date.isoformat()
+        ),
+        "month_period_of_loan": (
+            ["transaction_id__month_period_of_loan"], lambda entry, amounts: entry.transaction_id.month_period_of_loan
+        ),
+        "lender_name": (["transaction_id__lender_name"], lambda entry, amounts: entry.transaction_id.lender_name),
+        "splitwise_created_at": (["created_at"], lambda entry, amounts: entry.created_at.isoformat()),
+    }
+    
+    # Columns the summary totals always need
+    SUMMARY_COLUMNS = [
+        "transaction_id", "syndicator_id", "principal_amount", "interest_amount",
+        "transaction_id__risk_taker_flag", "transaction_id__risk_taker_commission",
+        "transaction_id__risk_taker_id",
+    ]
+    
     def get(self, request):
+        try:
+            selected_fields = get_sparse_fieldset(request, list(self.ENTRY_FIELDS), ("risk_taker",))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
         try:
             user = request.user
             
-            splitwise_entries = Splitwise.objects.filter(syndicator_id=user).select_related(
-                'transaction_id', 
-                'transaction_id__risk_taker_id'
-            ).order_by('-created_at')
+            if selected_fields is None:
+                output_fields = list(self.ENTRY_FIELDS)
+                splitwise_entries = Splitwise.objects.filter(syndicator_id=user).select_related(
+                    'transaction_id', 
+                    'transaction_id__risk_taker_id'
+                ).order_by('-created_at', '-pk')
+            else:
+                output_fields = [name for name in self.ENTRY_FIELDS if name in selected_fields]
+                columns = set(self.SUMMARY_COLUMNS)
+                for name in output_fields:
+                    columns.update(self.ENTRY_FIELDS[name][0])
+                related = ['transaction_id']
+                if "risk_taker" in selected_fields:
+                    related.append('transaction_id__risk_taker_id')
+                splitwise_entries = Splitwise.objects.filter(syndicator_id=user).select_related(
+                    *related
+                ).only(*columns).order_by('-created_at', '-pk')
             
             if not splitwise_entries.exists():
                 return Response({
@@ -823,36 +1754,23 @@ class UserSplitwiseView(APIView):
             total_original_interest = 0
             total_interest_after_commission = 0
             total_commission_paid = 0
+            renderers = [(name, self.ENTRY_FIELDS[name][1]) for name in output_fields]
             
-            for entry in splitwise_entries:
+            splitwise_entries = list(splitwise_entries)
+            interest_after_commission, commission_deducted = commission_columns(
+                [entry.principal_amount for entry in splitwise_entries],
+                [entry.interest_amount for entry in splitwise_entries],
+                [entry.transaction_id.risk_taker_flag for entry in splitwise_entries],
+                [entry.transaction_id.risk_taker_commission for entry in splitwise_entries],
+                [entry.syndicator_id_id == entry.transaction_id.risk_taker_id_id for entry in splitwise_entries]
+            ).tolist()
+            
+            for entry, amounts in zip(splitwise_entries, zip(interest_after_commission, commission_deducted)):
                 total_principal_committed += entry.principal_amount
                 total_original_interest += entry.interest_amount
-                
-                interest_after_commission = entry.get_interest_after_commission()
-                total_interest_after_commission += interest_after_commission
-                
-                commission_deducted = entry.get_commission_deducted()
-                total_commission_paid += commission_deducted
-                
-                serialized_entries.append({
-                    "splitwise_id": str(entry.splitwise_id),
-                    "transaction_id": str(entry.transaction_id.transaction_id),
-                    "risk_taker": {
-                        "user_id": str(entry.transaction_id.risk_taker_id.user_id),
-                        "username": entry.transaction_id.risk_taker_id.username,
-                        "name": entry.transaction_id.risk_taker_id.name
-                    },
-                    "principal_amount": entry.principal_amount,
-                    "original_interest": entry.interest_amount,
-                    "interest_after_commission": interest_after_commission,
-                    "commission_deducted": commission_deducted,
-                    "commission_flag": entry.transaction_id.risk_taker_flag,
-                    "transaction_start_date": entry.transaction_id.start_date.isoformat(),
-                    "transaction_end_date": entry.transaction_id.end_date.isoformat(),
-                    "month_period_of_loan": entry.transaction_id.month_period_of_loan,
-                    "lender_name": entry.transaction_id.lender_name,
-                    "splitwise_created_at": entry.created_at.isoformat()
-                })
+                total_interest_after_commission += amounts[0]
+                total_commission_paid += amounts[1]
+                serialized_entries.append({name: render(entry, amounts) for name, render in renderers})
             
             response_data = {
                 "message": f"Splitwise entries retrieved for {user.username}",
@@ -879,6 +1797,124 @@ class UserSplitwiseView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class TransactionRepaymentsView(APIView):
+    """
+    Repayment ledger of a transaction. GET (risk taker or syndicators) lists every
+    repayment and each split's current balances; POST (risk taker only) posts
+    repayments to several splits at once:
+    {"paid_on": "YYYY-MM-DD", "repayments": [{"splitwise_id": ..., "principal_amount": ..., "interest_amount": ...}]}
+    paid_on defaults to today. See core.ledger.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get_transaction(self, request, transaction_id):
+        """(transaction, None), or (None, error response)"""
+        try:
+            loan = Transactions.objects.get(transaction_id=transaction_id)
+        except Transactions.DoesNotExist:
+            return None, Response({"error": "Transaction not found"}, status=status.HTTP_404_NOT_FOUND)
+        if loan.risk_taker_id_id == request.user.pk:
+            return loan, None
+        if request.method == 'GET' and Splitwise.objects.filter(transaction_id=loan, syndicator_id=request.user).exists():
+            return loan, None
+        return None, Response({
+            "error": "You don't have permission to view this transaction" if request.method == 'GET'
+            else "Only the risk taker can post repayments"
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    def serialize_repayment(self, repayment):
+        return {
+            "repayment_id": str(repayment.repayment_id),
+            "splitwise_id": str(repayment.splitwise_id_id),
+            "sequence": repayment.sequence,
+            "paid_on": repayment.paid_on.isoformat(),
+            "principal_paid": repayment.principal_paid,
+            "interest_paid": repayment.interest_paid,
+            "outstanding_principal": repayment.outstanding_principal,
+            "interest_paid_total": repayment.interest_paid_total,
+        }
+    
+    @coalesced
+    def get(self, request, transaction_id):
+        try:
+            loan, error = self.get_transaction(request, transaction_id)
+            if error is not None:
+                return error
+            
+            splits = with_balances(loan.splitwise_entries.order_by('pk')).values_list(
+                'splitwise_id', 'syndicator_id__username', 'principal_amount',
+                'outstanding_principal', 'interest_paid_total', 'last_sequence'
+            )
+            balances = [
+                {
+                    "splitwise_id": str(splitwise_id),
+                    "syndicator": username,
+                    "principal_amount": principal_amount,
+                    "outstanding_principal": outstanding_principal,
+                    "principal_repaid": principal_amount - outstanding_principal,
+                    "interest_paid_total": interest_paid_total,
+                    "repayments": repayments,
+                }
+                for splitwise_id, username, principal_amount, outstanding_principal, interest_paid_total, repayments in splits
+            ]
+            repayments = loan.repayments.order_by('paid_on', 'pk')
+            
+            return Response({
+                "transaction_id": str(loan.transaction_id),
+                "outstanding_principal": sum(split["outstanding_principal"] for split in balances),
+                "splits": balances,
+                "repayments": [self.serialize_repayment(repayment) for repayment in repayments],
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return Response({
+                "error": f"An unexpected error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @idempotent
+    def post(self, request, transaction_id):
+        entries = request.data.get("repayments")
+        if not isinstance(entries, list) or not entries:
+            return Response({"error": "repayments must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            paid_on = request.data.get("paid_on")
+            paid_on = date.fromisoformat(paid_on) if paid_on else date.today()
+        except (TypeError, ValueError):
+            return Response({"error": "paid_on must be a YYYY-MM-DD date"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            entries = [
+                (
+                    uuid.UUID(str(entry["splitwise_id"])),
+                    float(entry.get("principal_amount") or 0),
+                    float(entry.get("interest_amount") or 0),
+                )
+                for entry in entries
+            ]
+        except (TypeError, ValueError, KeyError, AttributeError):
+            return Response({
+                "error": "Each repayment needs a splitwise_id and numeric principal_amount / interest_amount"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            loan, error = self.get_transaction(request, transaction_id)
+            if error is not None:
+                return error
+            try:
+                repayments = post_repayments(loan, entries, paid_on)
+            except PostingError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            return Response({
+                "message": "Repayments posted successfully",
+                "repayments": [self.serialize_repayment(repayment) for repayment in repayments],
+            }, status=status.HTTP_201_CREATED)
+        
+        except Exception as e:
+            return Response({
+                "error": f"An unexpected error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # Updated TransactionSplitwiseView with Commission Support
 class TransactionSplitwiseView(APIView):
     """Get all splitwise entries for a specific transaction"""
@@ -889,7 +1925,7 @@ class TransactionSplitwiseView(APIView):
             user = request.user
             
             try:
-                transaction = Transactions.objects.get(transaction_id=transaction_id)
+                transaction = Transactions.objects.select_related('risk_taker_id').get(transaction_id=transaction_id)
             except Transactions.DoesNotExist:
                 return Response({
                     "error": "Transaction not found"
@@ -898,7 +1934,7 @@ class TransactionSplitwiseView(APIView):
             # Check permissions (same as before)
             user_has_access = False
             
-            if transaction.risk_taker_id == user:
+            if transaction.risk_taker_id_id == user.pk:
                 user_has_access = True
             else:
                 user_splitwise = Splitwise.objects.filter(
@@ -913,25 +1949,25 @@ class TransactionSplitwiseView(APIView):
                     "error": "You don't have permission to view this transaction"
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            # Get splitwise entries with commission calculations
-            splitwise_entries = Splitwise.objects.filter(
-                transaction_id=transaction
-            ).select_related('syndicator_id').order_by('created_at')
+            # Get splitwise entries with commission calculations (the related manager
+            # attaches `transaction` to each entry, so commission math doesn't refetch it)
+            splitwise_entries = transaction.splitwise_entries.select_related('syndicator_id').order_by('created_at', 'pk')
             
             serialized_entries = []
             total_commission_distributed = 0
             
             # Calculate commission per syndicator (excluding risk taker)
             commission_per_syndicator = 0
-            syndicators_excluding_risk_taker = splitwise_entries.exclude(
-                syndicator_id=transaction.risk_taker_id
-            )
-            if transaction.risk_taker_flag and syndicators_excluding_risk_taker.count() > 0:
+            syndicators_excluding_risk_taker = [
+                entry for entry in splitwise_entries
+                if entry.syndicator_id_id != transaction.risk_taker_id_id
+            ]
+            if transaction.risk_taker_flag and len(syndicators_excluding_risk_taker) > 0:
                 # Calculate total interest from syndicators excluding risk taker
                 total_interest_for_commission = sum(entry.interest_amount for entry in syndicators_excluding_risk_taker)
                 # Calculate commission amount as percentage
                 commission_amount = (transaction.risk_taker_commission / 100) * total_interest_for_commission
-                commission_per_syndicator = commission_amount / syndicators_excluding_risk_taker.count()
+                commission_per_syndicator = commission_amount / len(syndicators_excluding_risk_taker)
             
             for entry in splitwise_entries:
                 interest_after_commission = entry.get_interest_after_commission()
@@ -950,7 +1986,7 @@ class TransactionSplitwiseView(APIView):
                     "original_interest": entry.interest_amount,
                     "interest_after_commission": interest_after_commission,
                     "commission_deducted": commission_deducted,
-                    "is_risk_taker": entry.syndicator_id == transaction.risk_taker_id,
+                    "is_risk_taker": entry.syndicator_id_id == transaction.risk_taker_id_id,
                     "created_at": entry.created_at.isoformat()
                 })
             
@@ -969,7 +2005,7 @@ class TransactionSplitwiseView(APIView):
                         "risk_taker_flag": transaction.risk_taker_flag,
                         "risk_taker_commission_percentage": transaction.risk_taker_commission,
                         "commission_per_syndicator": commission_per_syndicator,
-                        "syndicators_paying_commission": syndicators_excluding_risk_taker.count()
+                        "syndicators_paying_commission": len(syndicators_excluding_risk_taker)
                     },
                     "start_date": transaction.start_date.isoformat(),
                     "end_date": transaction.end_date.isoformat(),
@@ -992,4 +2028,130 @@ class TransactionSplitwiseView(APIView):
         except Exception as e:
             return Response({
                 "error": f"An unexpected error occurred: {str(e)}"
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+IDEMPOTENCY_META_KEY = "HTTP_" + IDEMPOTENCY_HEADER.upper().replace("-", "_")
+
+
+class BatchView(APIView):
+    """
+    Run several core API calls in one request.
+
+    Body: {"requests": [{"id": "p", "method": "GET", "path": "portfolio/"}, ...]} where
+    `path` is relative to the API root (or absolute, e.g. "/api/portfolio/?x=1") and
+    `body` is an optional JSON payload. Sub-requests run in order on this request's
+    thread, so they share its DB connection, and reuse its authentication instead of
+    validating the JWT again. A failing sub-request doesn't stop the others.
+    
+    An Idempotency-Key on the batch isn't passed on as is: sub-request n gets
+    "<key>:<n>", so retrying the same batch replays each write on its own.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        sub_requests = request.data.get("requests") if isinstance(request.data, dict) else None
+        if not isinstance(sub_requests, list) or not sub_requests:
+            return Response({
+                "error": "'requests' must be a non-empty list"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(sub_requests) > settings.BATCH_MAX_REQUESTS:
+            return Response({
+                "error": f"A batch can contain at most {settings.BATCH_MAX_REQUESTS} requests"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            "responses": [
+                self.run_sub_request(request, sub_request, position)
+                for position, sub_request in enumerate(sub_requests)
+            ]
+        }, status=status.HTTP_200_OK)
+    
+    def run_sub_request(self, request, sub_request, position):
+        if not isinstance(sub_request, dict):
+            return {"status": status.HTTP_400_BAD_REQUEST, "body": {"error": "Each request must be an object"}}
+        result = {"id": sub_request["id"]} if "id" in sub_request else {}
+        
+        # core.urls is mounted wherever this view's "batch/" route lives
+        api_root = request.path[:-len("batch/")]
+        api_root_info = request.path_info[:-len("batch/")]
+        path, _, query_string = str(sub_request.get("path", "")).partition("?")
+        if path.startswith(api_root):
+            path = path[len(api_root):]
+        path = path.lstrip("/")
+        
+        try:
+            match = resolve("/" + path, urlconf="core.urls")
+        except Resolver404:
+            return {**result, "status": status.HTTP_404_NOT_FOUND, "body": {"error": f"No API route matches '{path}'"}}
+        if getattr(match.func, "view_class", None) is BatchView:
+            return {**result, "status": status.HTTP_400_BAD_REQUEST, "body": {"error": "Batch requests can't be nested"}}
+        
+        body = b"" if sub_request.get("body") is None else json.dumps(sub_request["body"]).encode()
+        environ = dict(
+            request.META,
+            REQUEST_METHOD=str(sub_request.get("method", "GET")).upper(),
+            PATH_INFO=api_root_info + path,
+            QUERY_STRING=query_string,
+            CONTENT_TYPE="application/json",
+            CONTENT_LENGTH=str(len(body)),
+        )
+        environ["wsgi.input"] = BytesIO(body)
+        # Sub-requests to @idempotent views must not share (and replay) one key
+        batch_key = environ.pop(IDEMPOTENCY_META_KEY, None)
+        if batch_key is not None:
+            environ[IDEMPOTENCY_META_KEY] = f"{batch_key}:{position}"
+        sub = WSGIRequest(environ)
+        sub.resolver_match = match
+        # DRF authenticates requests carrying these with ForcedAuthentication
+        sub._force_auth_user = request.user
+        sub._force_auth_token = request.auth
+        
+        try:
+            response = match.func(sub, *match.args, **match.kwargs)
+        except Exception as e:
+            return {**result, "status": status.HTTP_500_INTERNAL_SERVER_ERROR, "body": {"error": str(e)}}
+        
+        if hasattr(response, "data"):
+            response_body = response.data
+        elif response.get("Content-Type", "").startswith("application/json"):
+            response_body = json.loads(response.content)
+        else:
+            response_body = response.content.decode(response.charset)
+        return {**result, "status": response.status_code, "body": response_body}
+
+
+class ImportTransactionsView(APIView):
+    """
+    Bulk-import the authenticated user's historical transactions from a CSV or JSONL
+    upload ("file"); rows use the create_transaction fields. Valid rows are imported,
+    invalid ones are reported by line number. Pass dry_run=true to only validate.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({
+                "error": "Upload the transactions as a 'file' form field"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        file_format = request.data.get("format") or detect_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            return Response({
+                "error": f"Unsupported format; use one of: {', '.join(IMPORT_FORMATS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get("dry_run", False)).lower() in ("true", "1", "yes")
+        
+        try:
+            importer = TransactionImporter(risk_taker=request.user, dry_run=dry_run)
+            result = importer.run(read_rows(upload.file, file_format))
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response({
+                "error": f"Could not read the file: {str(e)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            "message": "Import validated" if dry_run else "Import finished",
+            "dry_run": dry_run,
+            **result.as_dict()
+        }, status=status.HTTP_200_OK)
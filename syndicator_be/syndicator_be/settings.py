@@ -51,11 +51,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.RequestTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RequestProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -98,6 +102,27 @@ DATABASES = {
     }
 }
 
+# Production-grade SQLite profile for on-prem / edge deployments.
+# WAL lets readers keep going while CreateTransactionView writes, and
+# BEGIN IMMEDIATE takes the write lock up front so writers queue on the
+# busy timeout instead of failing mid-transaction with "database is locked".
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA mmap_size=268435456;'  # 256 MiB
+        'PRAGMA cache_size=-65536;'  # 64 MiB (negative value is KiB)
+        'PRAGMA temp_store=MEMORY;'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,  # busy timeout in seconds
+}
+
+SQLITE_PRODUCTION_MODE = os.getenv("SQLITE_PRODUCTION_MODE", "False").lower() in ("true", "1", "yes")
+
+if SQLITE_PRODUCTION_MODE and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = SQLITE_PRODUCTION_OPTIONS
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -120,10 +145,59 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'core.authentication.TimedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
+# Response compression (brotli when the optional `brotli` package is installed, else gzip)
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Per-request SQL/timing instrumentation (Server-Timing headers + structured logs)
+REQUEST_TIMING_ENABLED = os.getenv("REQUEST_TIMING_ENABLED", "False").lower() in ("true", "1", "yes")
+
+# In-process metrics exposed in Prometheus format at /api/metrics/.
+# Scrapes must send "Authorization: Bearer <METRICS_TOKEN>"; without a token the endpoint serves nothing.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False").lower() in ("true", "1", "yes")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# On-demand profiling of single requests (signed X-Profile-Token header or ?profile=1 for staff)
+REQUEST_PROFILING_ENABLED = os.getenv("REQUEST_PROFILING_ENABLED", "False").lower() in ("true", "1", "yes")
+REQUEST_PROFILING_DIR = os.getenv("REQUEST_PROFILING_DIR", str(BASE_DIR / 'profiles'))
+REQUEST_PROFILING_PROFILER = os.getenv("REQUEST_PROFILING_PROFILER", "cprofile")  # or "pyinstrument" (sampling)
+REQUEST_PROFILING_TOKEN_MAX_AGE = int(os.getenv("REQUEST_PROFILING_TOKEN_MAX_AGE", "3600"))  # seconds
+
+# Single-flight coalescing of identical concurrent portfolio / all_transaction requests.
+# "local" shares results between threads of a worker; "cache" also coordinates
+# workers through the default cache (configure a shared cache for that).
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "True").lower() in ("true", "1", "yes")
+REQUEST_COALESCING_BACKEND = os.getenv("REQUEST_COALESCING_BACKEND", "local")
+REQUEST_COALESCING_TIMEOUT = int(os.getenv("REQUEST_COALESCING_TIMEOUT", "30"))  # seconds, "cache" only: lock lifetime / max wait
+REQUEST_COALESCING_RESULT_TTL = int(os.getenv("REQUEST_COALESCING_RESULT_TTL", "2"))  # seconds, "cache" only
+
+# Idempotency-Key handling on create_transaction
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", str(24 * 60 * 60)))  # seconds a response is replayed
+IDEMPOTENCY_WAIT_TIMEOUT = int(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10"))  # seconds a duplicate waits for the first
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "60"))  # seconds before an unfinished claim is abandoned
+
+# Maximum number of sub-requests accepted by /api/batch/
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+
+# Maximum number of commission rates evaluated by one /api/simulate_commission/ call
+COMMISSION_SIMULATION_MAX_RATES = int(os.getenv("COMMISSION_SIMULATION_MAX_RATES", "1001"))
+
+# Seconds a transaction's repayment schedule stays cached (dropped early when it changes)
+SCHEDULE_CACHE_TIMEOUT = int(os.getenv("SCHEDULE_CACHE_TIMEOUT", str(7 * 24 * 60 * 60)))
+
 SIMPLE_JWT = {
     "USER_ID_FIELD": "user_id",  # Make sure this matches your model field
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),